@@ -0,0 +1,153 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from .conditional import add_validators, aget_validators, not_modified
+from .counters import count_read
+from .models import Event, Event_Category, MediaItem, ResourceVersion
+from .pagination import MediaItemCursorPagination
+from .renderers import FastJSONRenderer
+from .search import MediaItemSearchFilter
+from .serializers import MediaItemRowSerializer
+from . import response_cache
+
+
+# Async variants of the public read endpoints, with the same output as their
+# DRF views, for deployments under ASGI where a sync view holds a thread per
+# request. They only read, without authentication, and the media list has no
+# sparse fieldsets, those are served by the sync endpoints
+
+MEDIA_ITEM_RESOURCES = (
+    ResourceVersion.MEDIA_ITEMS,
+    ResourceVersion.EVENTS,
+    ResourceVersion.CATEGORIES,
+    ResourceVersion.TAGS,
+)
+
+date_field = serializers.DateField()
+
+
+def render(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data), content_type="application/json", status=status
+    )
+
+
+def read_only(view):
+    # require_safe() only wraps sync views before Django 5.0
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(["GET", "HEAD"])
+        return await view(request, *args, **kwargs)
+
+    wrapper.__name__ = view.__name__
+    return wrapper
+
+
+async def conditional_response(request, keys, build):
+    etag, last_modified = await aget_validators(request, keys)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = await build()
+    return add_validators(response, etag, last_modified)
+
+
+def get_list_queryset(request):
+    # MediaItemList.get_queryset() and filter_queryset()
+    params = request.query_params
+    queryset = MediaItem.objects.order_by("-upload_date")
+    if params.get("status"):
+        queryset = queryset.filter(status=params["status"])
+    if params.get("sort_by_reader", False):
+        queryset = queryset.order_by("-reader_count")
+    return MediaItemSearchFilter().filter_queryset(request, queryset, None)
+
+
+@read_only
+async def media_list(request):
+    # DRF's Request for query_params, authentication is never touched
+    request = Request(request)
+
+    async def build():
+        data = await response_cache.alookup(request)
+        if data is None:
+            try:
+                data = await build_list(request)
+            except NotFound as e:
+                return render({"detail": str(e.detail)}, status=404)
+            await response_cache.astore(request, data)
+        return render(data)
+
+    return await conditional_response(request, MEDIA_ITEM_RESOURCES, build)
+
+
+async def build_list(request):
+    paginator = MediaItemCursorPagination()
+    queryset = MediaItemRowSerializer.get_rows(get_list_queryset(request))
+
+    page = await paginator.apaginate_queryset(queryset, request)
+    if page is None:
+        limit = request.query_params.get("limit")
+        if limit:
+            try:
+                queryset = queryset[: int(limit)]
+            except ValueError:
+                pass
+        return await MediaItemRowSerializer(queryset, context={"request": request}).adata()
+
+    data = await MediaItemRowSerializer(page, context={"request": request}).adata()
+    return {"next": paginator.get_next_link(), "results": data}
+
+
+@read_only
+async def media_detail(request, pk):
+    etag, last_modified = await aget_validators(request, MEDIA_ITEM_RESOURCES)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        # The client still read the item, from its own copy, if it exists
+        if await MediaItem.objects.filter(id=pk).aexists():
+            await sync_to_async(count_read)(request, pk)
+        return add_validators(response, etag, last_modified)
+
+    rows = MediaItemRowSerializer.get_rows(MediaItem.objects.filter(id=pk))
+    data = await MediaItemRowSerializer(rows, context={"request": request}).adata()
+    if not data:
+        return render({"detail": "Not found."}, status=404)
+
+    item = data[0]
+    # count_read() may reach the session, the cache and the task queue
+    if await sync_to_async(count_read)(request, pk):
+        item["reader_count"] += 1
+    return add_validators(render(item), etag, last_modified)
+
+
+@read_only
+async def event_list(request):
+    async def build():
+        rows = Event.objects.order_by("id").values_list(
+            "id", "category_id", "category__name", "name", "date", "description"
+        )
+        return render([
+            {
+                "id": event_id,
+                "category": {"id": category_id, "name": category_name},
+                "name": name,
+                "date": date_field.to_representation(date),
+                "description": description,
+            }
+            async for event_id, category_id, category_name, name, date, description in rows
+        ])
+
+    return await conditional_response(
+        request, (ResourceVersion.EVENTS, ResourceVersion.CATEGORIES), build
+    )
+
+
+@read_only
+async def category_list(request):
+    async def build():
+        rows = Event_Category.objects.order_by("id").values("id", "name")
+        return render([row async for row in rows])
+
+    return await conditional_response(request, (ResourceVersion.CATEGORIES,), build)
@@ -0,0 +1,47 @@
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def rolled_back():
+    # Run a benchmark against the configured database and discard its writes
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(func, repeat, setup=None):
+    # Call func(i) repeat times, returning the durations in ms and the number
+    # of queries of each call. With a setup, func is called with setup(i)
+    # instead, which is neither timed nor counted
+    durations = []
+    queries = []
+    for i in range(repeat):
+        arg = setup(i) if setup else i
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            func(arg)
+            durations.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+
+    return durations, queries
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(durations):
+    return {
+        "mean": statistics.mean(durations),
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "p99": percentile(durations, 99),
+    }
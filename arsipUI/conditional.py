@@ -0,0 +1,58 @@
+import hashlib
+from functools import wraps
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .models import ResourceVersion
+
+
+def get_validators(request, keys):
+    # ETag and Last-Modified of a response built from the given resources,
+    # read from a single primary key lookup
+    return build_validators(request, ResourceVersion.get_many(keys))
+
+
+async def aget_validators(request, keys):
+    return build_validators(request, await ResourceVersion.aget_many(keys))
+
+
+def build_validators(request, versions):
+    # The same resources render differently per URL and negotiated format
+    parts = [request.get_full_path(), request.META.get("HTTP_ACCEPT", "")]
+    parts += [f"{key}:{versions[key][0]}" for key in sorted(versions)]
+    etag = '"%s"' % hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+    modified = [modified for version, modified in versions.values()]
+    last_modified = int(max(modified).timestamp()) if modified else None
+
+    return etag, last_modified
+
+
+def not_modified(request, etag, last_modified):
+    # A 304 (or 412) response when the client's copy is still current
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        if not response.has_header("ETag"):
+            response.headers["ETag"] = etag
+        if last_modified is not None and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def conditional(*keys):
+    # Decorates a view's get() to answer If-None-Match/If-Modified-Since
+    # before any query or serialization runs
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = get_validators(request, keys)
+            response = not_modified(request, etag, last_modified)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+            return add_validators(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,148 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from .models import MediaItem, MediaItemRollup
+from .tasks import task
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReaderCounter:
+    # Buffers reader_count increments in the worker's memory and hands them
+    # to the task queue, which writes them with a handful of atomic UPDATEs,
+    # instead of saving the item per view. Once started, a timer flushes
+    # counts that no later read came to flush
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.last_flush = time.monotonic()
+        self.started = False
+        self.timer = None
+
+    def start(self):
+        # Called by the server entry points, other processes only flush when
+        # a read finds it due. Flushes the rest on the way out, which in
+        # tests would run after the test database is gone
+        if not self.started:
+            self.started = True
+            atexit.register(self.flush)
+
+    def increment(self, media_item_id):
+        flush_interval = getattr(settings, "READER_COUNT_FLUSH_INTERVAL", 10)
+        flush_size = getattr(settings, "READER_COUNT_FLUSH_SIZE", 500)
+
+        with self.lock:
+            self.pending[media_item_id] += 1
+            due = (
+                time.monotonic() - self.last_flush >= flush_interval
+                or len(self.pending) >= flush_size
+            )
+            if not due and self.started and self.timer is None:
+                self.timer = threading.Timer(flush_interval, self.flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if due:
+            self.flush()
+
+    def flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer's thread ends here
+            connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+            self.cancel_timer()
+
+        if not pending:
+            return 0
+
+        # One INSERT here, the UPDATEs run on the task workers
+        try:
+            add_reader_counts.enqueue(sorted(pending.items()))
+        except DatabaseError:
+            # Keep the counts for the next flush rather than losing them
+            logger.exception("Could not flush reader counts")
+            with self.lock:
+                self.pending.update(pending)
+            return 0
+
+        return len(pending)
+
+    def reset(self):
+        with self.lock:
+            self.pending = Counter()
+            self.last_flush = time.monotonic()
+            self.cancel_timer()
+
+    def cancel_timer(self):
+        # With the lock held
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+@task(priority=20, max_attempts=5, atomic=True)
+def add_reader_counts(counts):
+    # counts is a list of [media_item_id, delta]
+    pending = dict(counts)
+
+    # Items read the same number of times share one UPDATE
+    ids_by_delta = defaultdict(list)
+    for media_item_id, delta in pending.items():
+        ids_by_delta[delta].append(media_item_id)
+
+    with transaction.atomic():
+        for delta, ids in ids_by_delta.items():
+            MediaItem.objects.filter(id__in=ids).update(
+                reader_count=F("reader_count") + delta
+            )
+        # And the readers of their statistics rollups, one UPDATE per bucket
+        rollup_deltas = {}
+        rows = MediaItem.objects.filter(id__in=pending).values_list(
+            "id", "fakultas", "event_id", "upload_date", "status"
+        )
+        for media_item_id, fakultas, event_id, upload_date, status in rows:
+            bucket = MediaItemRollup.bucket(fakultas, event_id, upload_date, status)
+            rollup_deltas.setdefault(bucket, [0, 0])[1] += pending[media_item_id]
+        MediaItemRollup.apply(rollup_deltas)
+    # MediaItems are not bumped: reader counts change with every read, and
+    # validators and cached responses would never outlive a flush. Responses
+    # show the counts as of the item's last change or the cache's expiry
+
+
+reader_counter = ReaderCounter()
+
+
+def get_reader_key(request):
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        return f"session:{session.session_key}"
+    if request.user and request.user.is_authenticated:
+        return f"user:{request.user.id}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def count_read(request, media_item_id):
+    # Count a read of the item, ignoring repeated reads by the same reader
+    # within READER_COUNT_DEDUP_WINDOW seconds when it is set
+    dedup_window = getattr(settings, "READER_COUNT_DEDUP_WINDOW", 0)
+    if dedup_window:
+        key = f"reader-seen:{get_reader_key(request)}:{media_item_id}"
+        if not cache.add(key, True, dedup_window):
+            return False
+
+    reader_counter.increment(media_item_id)
+    return True
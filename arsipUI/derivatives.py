@@ -0,0 +1,94 @@
+import logging
+import os
+from io import BytesIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+from django.core.files.base import ContentFile
+from .models import File
+from .tasks import task
+
+try:
+    # Optional, only used to render the first page of PDFs
+    import fitz
+except ImportError:
+    fitz = None
+
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_SIZE = (1280, 1280)
+WEBP_QUALITY = 80
+
+def derivative_name(name, suffix):
+    # "img/2023/8/photo.jpg" -> "img/2023/8/photo_thumb.webp"
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{suffix}.webp"
+
+
+def can_generate(file_instance):
+    name = file_instance.file.name
+    if not name:
+        return False
+    if file_instance.file_type == "img":
+        # Pillow cannot rasterize vector images
+        return not name.lower().endswith(".svg")
+    return name.lower().endswith(".pdf") and fitz is not None
+
+
+def open_source_image(file_instance):
+    if file_instance.file_type == "img":
+        with file_instance.file.open("rb") as f:
+            image = Image.open(f)
+            image.load()
+        return ImageOps.exif_transpose(image)
+
+    with file_instance.file.open("rb") as f:
+        document = fitz.open(stream=f.read(), filetype="pdf")
+    with document:
+        pixmap = document[0].get_pixmap()
+        return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def render_webp(image, size):
+    image = image.copy()
+    image.thumbnail(size)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    output = BytesIO()
+    image.save(output, "WEBP", quality=WEBP_QUALITY)
+    return ContentFile(output.getvalue())
+
+
+@task(priority=10, concurrency=lambda: getattr(settings, "DERIVATIVE_WORKERS", 2))
+def generate_derivatives(file_id):
+    file_instance = File.objects.get(id=file_id)
+    if not can_generate(file_instance):
+        return False
+
+    try:
+        image = open_source_image(file_instance)
+    except (UnidentifiedImageError, OSError, RuntimeError):
+        logger.warning("Cannot read %s to generate previews", file_instance.file.name)
+        return False
+
+    name = file_instance.file.name
+    file_instance.thumbnail.save(
+        derivative_name(name, "thumb"), render_webp(image, THUMBNAIL_SIZE), save=False
+    )
+    file_instance.preview.save(
+        derivative_name(name, "preview"), render_webp(image, PREVIEW_SIZE), save=False
+    )
+    file_instance.save(update_fields=["thumbnail", "preview"])
+
+    return True
+
+
+def schedule_derivatives(file_instance):
+    # Generate the previews on the task workers, keeping image processing out
+    # of the request
+    if not can_generate(file_instance):
+        return
+
+    generate_derivatives.enqueue(file_instance.id)
@@ -0,0 +1,75 @@
+import csv
+import json
+from .serializers import MediaItemRowSerializer
+
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+COLUMNS = [
+    "id", "title", "description", "fakultas", "status", "upload_date", "reader_count",
+    "event", "event_date", "category", "tags", "files",
+]
+
+
+def to_record(item):
+    # Flattens MediaItemRowSerializer's representation into one catalogue
+    # entry, leaving out contributors and verificators
+    event = item["event"] or {}
+    return {
+        "id": item["id"],
+        "title": item["title"],
+        "description": item["description"],
+        "fakultas": item["fakultas"],
+        "status": item["status"],
+        "upload_date": item["upload_date"],
+        "reader_count": item["reader_count"],
+        "event": event.get("name"),
+        "event_date": event.get("date"),
+        "category": event.get("category", {}).get("name"),
+        "tags": [tag["name"] for tag in item["tags"]],
+        "files": [file["file"] for file in item["file_paths"] if file["file"]],
+    }
+
+
+def iter_records(queryset, chunk_size=500, context=None):
+    # Reads the items in batches of chunk_size by id so memory stays flat for
+    # a full archive dump. iterator() alone would not do, mysqlclient buffers
+    # the whole result set on the client
+    queryset = MediaItemRowSerializer.get_rows(queryset.order_by("id"))
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+
+        for item in MediaItemRowSerializer(rows, context=context).data:
+            yield to_record(item)
+
+
+def render_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class Echo:
+    # File-like object handing csv.writer's rows back instead of storing them
+    def write(self, value):
+        return value
+
+
+def render_csv(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for record in records:
+        record["tags"] = ";".join(record["tags"])
+        record["files"] = " ".join(record["files"])
+        yield writer.writerow([record[column] for column in COLUMNS])
+
+
+RENDERERS = {
+    "ndjson": render_ndjson,
+    "csv": render_csv,
+}
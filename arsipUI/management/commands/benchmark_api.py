@@ -0,0 +1,616 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from arsipUI import response_cache, urls as arsip_urls
+from arsipUI.benchmarks import measure, summarize
+from arsipUI.models import Event, Event_Category, File, MediaItem, MediaItemRollup, ResourceVersion, Tag
+from arsipUI.search import refresh_documents
+from users import urls as users_urls
+from users.models import UserProfile
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+BATCH_SIZE = 500
+ITEMS_PER_EVENT = 50
+MODERATE_BATCH = 20
+PASSWORD = "benchmark-password"
+
+# name is the URL name the route belongs to, role the client sending it.
+# setup(i) prepares the i-th request outside of the timings, e.g. creates
+# the item it approves, and request(client, arg) sends it. Routes marked
+# load only read, the load generator sends them from many threads at once
+Route = namedtuple("Route", "label name role request setup load", defaults=(None, False))
+
+
+def get_url_names(urlconf):
+    return {
+        pattern.name for pattern in urlconf.urlpatterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed MediaItems, Files, Tags and Events and benchmark every route of "
+        "arsipUI/urls.py and users/urls.py through the Django test client: "
+        "latency and query counts per request, then throughput of the read "
+        "routes under concurrent load, optionally against a saved baseline. "
+        "Runs in a throwaway test database unless --current-database is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=5000)
+        parser.add_argument("--files-per-item", type=int, default=2)
+        parser.add_argument("--tags", type=int, default=500)
+        parser.add_argument("--repeat", type=int, default=30, help="Requests per route")
+        parser.add_argument(
+            "--concurrency", type=int, nargs="*", default=[1, 8],
+            help="Threads of the load generator, none to skip it",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Per read route and concurrency"
+        )
+        parser.add_argument(
+            "--route", action="append", dest="routes", help="Only benchmark these labels"
+        )
+        parser.add_argument(
+            "--cold", action="store_true",
+            help="Invalidate the response cache before every request, reads then miss it",
+        )
+        parser.add_argument("--upload-size", type=int, default=256 * 1024)
+        parser.add_argument("--seed", type=int, default=0, help="Of the random data")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database")
+        parser.add_argument(
+            "--current-database", action="store_true",
+            help="Seed the configured database instead, the rows are left behind. "
+            "Needs --yes-destroy",
+        )
+        parser.add_argument(
+            "--yes-destroy", action="store_true",
+            help="Confirm that the configured database is disposable",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="JSON file to compare the results with, or to write them to "
+            "with --save-baseline",
+        )
+        parser.add_argument("--save-baseline", action="store_true")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1.5,
+            help="Fail when a route's p50 exceeds the baseline's, or its throughput "
+            "falls short of it, by this factor",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["save_baseline"] and not options["baseline"]:
+            raise CommandError("--save-baseline needs --baseline")
+        if options["baseline"] and not options["save_baseline"]:
+            if not os.path.exists(options["baseline"]):
+                raise CommandError(f"No baseline at {options['baseline']}")
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+        if options["current_database"] and not options["yes_destroy"]:
+            raise CommandError(
+                "--current-database leaves thousands of rows behind in "
+                f"{connection.settings_dict['NAME']}, add --yes-destroy if it is disposable"
+            )
+
+        # Uploads are written to a temporary MEDIA_ROOT, and the test client
+        # sends requests to "testserver"
+        media_root = tempfile.mkdtemp()
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            UPLOAD_PARTIAL_ROOT=os.path.join(media_root, "partial"),
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+        )
+        old_config = None
+        try:
+            if not options["current_database"]:
+                old_config = setup_databases(
+                    max(options["verbosity"] - 1, 0), interactive=False,
+                    keepdb=options["keepdb"], aliases={"default"},
+                )
+            with settings_override:
+                results = self.run(options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, max(options["verbosity"] - 1, 0), options["keepdb"])
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options["save_baseline"]:
+            with open(options["baseline"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}"))
+        elif baseline is not None:
+            self.compare(results, baseline, options["tolerance"])
+
+    def run(self, options):
+        self.rng = random.Random(options["seed"])
+        self.upload_content = os.urandom(options["upload_size"])
+        self.seed(options)
+
+        routes = self.get_routes()
+        missing = (get_url_names(arsip_urls) | get_url_names(users_urls)) - {
+            route.name for route in routes
+        }
+        if missing:
+            self.stderr.write(f"Routes without a benchmark: {', '.join(sorted(missing))}")
+        if options["routes"]:
+            unknown = set(options["routes"]) - {route.label for route in routes}
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+            routes = [route for route in routes if route.label in options["routes"]]
+
+        results = {
+            "vendor": connection.vendor,
+            "items": options["items"],
+            "routes": {},
+            "load": {},
+        }
+
+        self.stdout.write(
+            f"{'route':<28} {'status':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} "
+            f"{'p99 ms':>9} {'queries':>8}"
+        )
+        for route in routes:
+            stats = self.benchmark(route, options["repeat"], options["cold"])
+            results["routes"][route.label] = stats
+            self.stdout.write(
+                f"{route.label:<28} {stats['status']:>7} {stats['mean']:>9.2f} "
+                f"{stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f} "
+                f"{stats['queries']:>8}"
+            )
+
+        load_routes = [route for route in routes if route.load]
+        if options["concurrency"] and load_routes:
+            self.stdout.write(
+                f"\n{'route':<28} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                f"{'p99 ms':>9} {'errors':>7}"
+            )
+        for route in load_routes:
+            for concurrency in options["concurrency"] or []:
+                stats = self.load(route, concurrency, options["requests"], options["cold"])
+                results["load"][f"{route.label}@{concurrency}"] = stats
+                self.stdout.write(
+                    f"{route.label:<28} {concurrency:>5} {stats['throughput']:>9.1f} "
+                    f"{stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f} "
+                    f"{stats['errors']:>7}"
+                )
+
+        return results
+
+    def create_user(self, username, user_type):
+        user = User.objects.create(username=username)
+        UserProfile.objects.create(user=user, user_type=user_type)
+        return user
+
+    def seed(self, options):
+        rng = self.rng
+        now = timezone.now()
+        categories = [Event_Category.objects.create(name=f"Benchmark {i}") for i in range(5)]
+        contributors = [
+            self.create_user(f"benchmark-contributor-{i}", UserProfile.CONTRIBUTOR)
+            for i in range(20)
+        ]
+        verificators = [
+            self.create_user(f"benchmark-verificator-{i}", UserProfile.VERIFICATOR)
+            for i in range(5)
+        ]
+        # Only the user logging in needs the slow password hash
+        contributors[0].set_password(PASSWORD)
+        contributors[0].save(update_fields=["password"])
+        self.contributor = contributors[0]
+        self.verificator = verificators[0]
+
+        tags = Tag.objects.resolve([f"bench-{i}" for i in range(max(options["tags"], 3))])
+        fakultas = [code for code, name in MediaItem.FAKULTAS_CHOICES]
+        statuses = [MediaItem.APPROVED] * 8 + [MediaItem.WAITLIST, MediaItem.REJECTED]
+
+        count = options["items"]
+        events = []
+        for batch, start in enumerate(range(0, count, ITEMS_PER_EVENT)):
+            event = Event.objects.create(
+                name=f"Benchmark {batch}",
+                date=now.date() - timedelta(days=batch),
+                category=categories[batch % len(categories)],
+                description="",
+            )
+            events.append(event)
+            media_items = []
+            for i in range(start, min(start + ITEMS_PER_EVENT, count)):
+                status = rng.choice(statuses)
+                media_items.append(
+                    MediaItem(
+                        title=f"Benchmark {i}",
+                        description="Some *markdown* text",
+                        formatted_content="<p>Some <em>markdown</em> text</p>",
+                        event=event,
+                        fakultas=rng.choice(fakultas),
+                        status=status,
+                        contributor=rng.choice(contributors),
+                        verificator=(
+                            None if status == MediaItem.WAITLIST else rng.choice(verificators)
+                        ),
+                        reader_count=rng.randint(0, 5000),
+                    )
+                )
+            MediaItem.objects.bulk_create(media_items)
+            # upload_date is set on insert, spread the events over the days
+            MediaItem.objects.filter(event=event).update(upload_date=now - timedelta(days=batch))
+        self.event = events[0] if events else Event.objects.create(
+            name="Benchmark", date=now.date(), category=categories[0], description=""
+        )
+
+        media_item_ids = list(
+            MediaItem.objects.filter(event__in=events).order_by("id").values_list("id", flat=True)
+        )
+        # Unique per run, --current-database may hold the files of earlier ones
+        prefix = f"benchmark/{now:%Y%m%d%H%M%S%f}/"
+        File.objects.bulk_create(
+            [
+                File(
+                    file=f"{prefix}{media_item_id}-{j}.jpg",
+                    file_type=rng.choice(["img"] * 8 + ["vid", "doc"]),
+                    thumbnail=f"{prefix}{media_item_id}-{j}.webp",
+                )
+                for media_item_id in media_item_ids
+                for j in range(options["files_per_item"])
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        files = File.objects.filter(file__startswith=prefix).values_list("id", "file")
+        MediaItem.file_paths.through.objects.bulk_create(
+            [
+                MediaItem.file_paths.through(
+                    mediaitem_id=int(name[len(prefix) :].split("-")[0]), file_id=file_id
+                )
+                for file_id, name in files
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        MediaItem.tags.through.objects.bulk_create(
+            [
+                MediaItem.tags.through(mediaitem_id=media_item_id, tag_id=tag.id)
+                for media_item_id in media_item_ids
+                for tag in rng.sample(tags, 3)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        for start in range(0, len(media_item_ids), BATCH_SIZE):
+            refresh_documents(
+                MediaItem.objects.filter(id__in=media_item_ids[start : start + BATCH_SIZE])
+            )
+        MediaItemRollup.rebuild()
+        ResourceVersion.bump(
+            ResourceVersion.MEDIA_ITEMS, ResourceVersion.EVENTS,
+            ResourceVersion.CATEGORIES, ResourceVersion.TAGS,
+        )
+
+        self.approved_ids = list(
+            MediaItem.objects.filter(status=MediaItem.APPROVED)
+            .order_by("id").values_list("id", flat=True)
+        ) or [self.new_item(MediaItem.APPROVED).id]
+        self.own_id = self.new_item(MediaItem.WAITLIST).id
+
+    def get_client(self, role):
+        # Signed in the way the frontend is, with a JWT, or with a session for
+        # the profile view. Errors are answered with a 500 rather than raised
+        client = APIClient(raise_request_exception=False)
+        users = {"contributor": self.contributor, "verificator": self.verificator}
+        if role in users:
+            token = CustomTokenObtainPairSerializer.get_token(users[role]).access_token
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        elif role == "session":
+            client.force_login(self.contributor)
+        return client
+
+    def new_item(self, status, verificator=None):
+        return MediaItem.objects.create(
+            title="Benchmark",
+            description="Some *markdown* text",
+            event=self.event,
+            status=status,
+            contributor=self.contributor,
+            verificator=verificator,
+        )
+
+    def start_upload(self, i, append=False):
+        client = self.get_client("contributor")
+        response = client.post(reverse("upload-create"), {
+            "filename": f"benchmark-{i}.mp4",
+            "size": len(self.upload_content),
+            "checksum": hashlib.sha256(self.upload_content).hexdigest(),
+        })
+        upload_id = response.data["id"]
+        if append:
+            client.post(reverse("upload-append", args=[upload_id]), {
+                "offset": 0, "chunk": SimpleUploadedFile("chunk", self.upload_content),
+            })
+        return upload_id
+
+    def get_routes(self):
+        def get(path, **params):
+            return lambda client, arg: client.get(path, params)
+
+        approved_ids = self.approved_ids
+
+        return [
+            Route("media-list", "media-list", "anonymous", get(reverse("media-list")), load=True),
+            Route(
+                "media-list?page", "media-list", "anonymous",
+                lambda client, arg: client.get(reverse("media-list"), {"page_size": 20}),
+                load=True,
+            ),
+            Route(
+                "media-list?sort_by_reader", "media-list", "anonymous",
+                lambda client, arg: client.get(
+                    reverse("media-list"),
+                    {"status": "approved", "sort_by_reader": 1, "page_size": 20},
+                ),
+                load=True,
+            ),
+            Route(
+                "media-list?search", "media-list", "anonymous",
+                lambda client, arg: client.get(
+                    reverse("media-list"), {"search": "bench-1", "page_size": 20}
+                ),
+                load=True,
+            ),
+            Route("user-media-list", "user-media-list", "contributor", get(reverse("user-media-list"))),
+            Route(
+                "user-media-list:verificator", "user-media-list", "verificator",
+                get(reverse("user-media-list")),
+            ),
+            Route("events-list", "events-list", "anonymous", get(reverse("events-list")), load=True),
+            Route("category-list", "category-list", "anonymous", get(reverse("category-list")), load=True),
+            Route("fakultas-list", "fakultas-list", "anonymous", get(reverse("fakultas-list")), load=True),
+            Route(
+                "media-create", "media-create", "contributor",
+                lambda client, arg: client.post(reverse("media-create"), {
+                    "title": f"Benchmark upload {arg}",
+                    "description": "Some *markdown* text",
+                    "event_name": self.event.name,
+                    "event_date": self.event.date.isoformat(),
+                    "event_category": self.event.category.name,
+                    "tag_names": "bench-1;bench-2;benchmark-new",
+                }),
+            ),
+            Route(
+                "media-detail", "media-detail", "anonymous",
+                lambda client, pk: client.get(reverse("media-detail", args=[pk])),
+                lambda i: approved_ids[i % len(approved_ids)],
+                load=True,
+            ),
+            Route(
+                "media-detail:update", "media-detail", "contributor",
+                lambda client, arg: client.patch(
+                    reverse("media-detail", args=[self.own_id]), {"title": f"Benchmark {arg}"}
+                ),
+            ),
+            Route(
+                "media-detail:delete", "media-detail", "contributor",
+                lambda client, pk: client.delete(reverse("media-detail", args=[pk])),
+                lambda i: self.new_item(MediaItem.WAITLIST).id,
+            ),
+            Route(
+                "mediaitem-approve", "mediaitem-approve", "verificator",
+                lambda client, pk: client.get(reverse("mediaitem-approve", args=[pk])),
+                lambda i: self.new_item(MediaItem.WAITLIST).id,
+            ),
+            Route(
+                "mediaitem-reject", "mediaitem-reject", "verificator",
+                lambda client, pk: client.patch(
+                    reverse("mediaitem-reject", args=[pk]), {"reject_reason": "Blurry"}
+                ),
+                lambda i: self.new_item(MediaItem.WAITLIST).id,
+            ),
+            Route(
+                "mediaitem-cancel-approval", "mediaitem-cancel-approval", "verificator",
+                lambda client, pk: client.get(reverse("mediaitem-cancel-approval", args=[pk])),
+                lambda i: self.new_item(MediaItem.APPROVED, self.verificator).id,
+            ),
+            Route(
+                "mediaitem-moderate", "mediaitem-moderate", "verificator",
+                lambda client, ids: client.post(
+                    reverse("mediaitem-moderate"), {"ids": ids, "action": "approve"}, format="json"
+                ),
+                lambda i: [self.new_item(MediaItem.WAITLIST).id for j in range(MODERATE_BATCH)],
+            ),
+            Route("media-export", "media-export", "anonymous", get(reverse("media-export"))),
+            Route(
+                "media-export?csv", "media-export", "anonymous",
+                lambda client, arg: client.get(reverse("media-export"), {"output": "csv"}),
+            ),
+            Route(
+                "media-statistics", "media-statistics", "anonymous",
+                get(reverse("media-statistics")), load=True,
+            ),
+            Route(
+                "async-media-list", "async-media-list", "anonymous",
+                lambda client, arg: client.get(reverse("async-media-list"), {"page_size": 20}),
+                load=True,
+            ),
+            Route(
+                "async-media-detail", "async-media-detail", "anonymous",
+                lambda client, pk: client.get(reverse("async-media-detail", args=[pk])),
+                lambda i: approved_ids[i % len(approved_ids)],
+                load=True,
+            ),
+            Route(
+                "async-events-list", "async-events-list", "anonymous",
+                get(reverse("async-events-list")), load=True,
+            ),
+            Route(
+                "async-category-list", "async-category-list", "anonymous",
+                get(reverse("async-category-list")), load=True,
+            ),
+            Route(
+                "upload-create", "upload-create", "contributor",
+                lambda client, arg: client.post(reverse("upload-create"), {
+                    "filename": f"benchmark-{arg}.mp4",
+                    "size": len(self.upload_content),
+                    "checksum": hashlib.sha256(self.upload_content).hexdigest(),
+                }),
+            ),
+            Route(
+                "upload-detail", "upload-detail", "contributor",
+                lambda client, upload_id: client.get(reverse("upload-detail", args=[upload_id])),
+                self.start_upload,
+            ),
+            Route(
+                "upload-append", "upload-append", "contributor",
+                lambda client, upload_id: client.post(reverse("upload-append", args=[upload_id]), {
+                    "offset": 0, "chunk": SimpleUploadedFile("chunk", self.upload_content),
+                }),
+                self.start_upload,
+            ),
+            Route(
+                "upload-complete", "upload-complete", "contributor",
+                lambda client, arg: client.post(
+                    reverse("upload-complete", args=[arg[0]]), {"media_item": arg[1]}
+                ),
+                lambda i: (self.start_upload(i, append=True), self.new_item(MediaItem.WAITLIST).id),
+            ),
+            Route("profile", "profile", "session", get(reverse("profile"))),
+            Route(
+                "token_obtain_pair", "token_obtain_pair", "anonymous",
+                lambda client, arg: client.post(
+                    reverse("token_obtain_pair"),
+                    {"username": self.contributor.username, "password": PASSWORD},
+                ),
+            ),
+            Route(
+                "token_refresh", "token_refresh", "anonymous",
+                lambda client, refresh: client.post(reverse("token_refresh"), {"refresh": refresh}),
+                lambda i: str(CustomTokenObtainPairSerializer.get_token(self.contributor)),
+            ),
+        ]
+
+    def send(self, route, client, arg):
+        response = route.request(client, arg)
+        if response.streaming:
+            # The export is only done once the last row is rendered
+            b"".join(response.streaming_content)
+        return response
+
+    def benchmark(self, route, repeat, cold):
+        client = self.get_client(route.role)
+        statuses = set()
+
+        def setup(i):
+            if cold:
+                response_cache.invalidate()
+            return route.setup(i) if route.setup else i
+
+        def request(arg):
+            statuses.add(self.send(route, client, arg).status_code)
+
+        durations, queries = measure(request, repeat, setup)
+        return {
+            **summarize(durations),
+            "queries": max(queries),
+            "status": ",".join(str(code) for code in sorted(statuses)),
+        }
+
+    def load(self, route, concurrency, requests, cold):
+        # Like the loadtest command, but in process through the test client.
+        # Each thread has its own clients and database connection
+        lock = threading.Lock()
+        remaining = [requests]
+        durations = []
+        errors = [0]
+
+        def take():
+            with lock:
+                if remaining[0] <= 0:
+                    return None
+                remaining[0] -= 1
+                return remaining[0]
+
+        def worker():
+            try:
+                client = self.get_client(route.role)
+                while (i := take()) is not None:
+                    if cold:
+                        response_cache.invalidate()
+                    arg = route.setup(i) if route.setup else i
+                    start = time.perf_counter()
+                    status = self.send(route, client, arg).status_code
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        if status < 400:
+                            durations.append(elapsed)
+                        else:
+                            errors[0] += 1
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(worker) for i in range(concurrency)]
+        elapsed = time.perf_counter() - start
+        for future in futures:
+            future.result()
+
+        stats = summarize(durations) if durations else dict.fromkeys(["mean", "p50", "p95", "p99"], 0.0)
+        return {"throughput": len(durations) / elapsed, "errors": errors[0], **stats}
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        self.stdout.write(
+            f"\n{'route':<32} {'baseline':>9} {'now':>9} {'change':>8} "
+            f"{'queries':>8} {'before':>7}"
+        )
+        for label, stats in results["routes"].items():
+            before = baseline["routes"].get(label)
+            if before is None:
+                continue
+            change = stats["p50"] / before["p50"] if before["p50"] else 1.0
+            self.stdout.write(
+                f"{label:<32} {before['p50']:>9.2f} {stats['p50']:>9.2f} {change:>7.2f}x "
+                f"{stats['queries']:>8} {before['queries']:>7}"
+            )
+            # Query counts do not depend on the machine, any new one counts
+            if change > tolerance or stats["queries"] > before["queries"]:
+                regressions.append(label)
+
+        for label, stats in results["load"].items():
+            before = baseline["load"].get(label)
+            if before is None:
+                continue
+            change = stats["throughput"] / before["throughput"] if before["throughput"] else 1.0
+            self.stdout.write(
+                f"{label:<32} {before['throughput']:>8.1f}/s {stats['throughput']:>7.1f}/s "
+                f"{change:>7.2f}x"
+            )
+            if change * tolerance < 1:
+                regressions.append(label)
+
+        if baseline["vendor"] != results["vendor"] or baseline["items"] != results["items"]:
+            self.stderr.write(
+                f"The baseline ran on {baseline['vendor']} with {baseline['items']} items"
+            )
+        if regressions:
+            raise CommandError(f"Slower than the baseline: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,158 @@
+import json
+import os
+import random
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from arsipUI.benchmarks import measure, rolled_back, summarize
+from arsipUI.models import Event, Event_Category, MediaItem
+
+
+PAGE_SIZE = 20
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed MediaItems and report the query plans and latency of the "
+        "archive's access paths, optionally against a saved baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--explain", action="store_true", help="Print the query plans")
+        parser.add_argument(
+            "--baseline",
+            help="JSON file to compare the results with, or to write them to "
+            "with --save-baseline",
+        )
+        parser.add_argument("--save-baseline", action="store_true")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=1.5,
+            help="Fail when a path's p50 exceeds the baseline's by this factor",
+        )
+
+    def seed(self, count):
+        category = Event_Category.objects.create(name="Benchmark")
+        contributors = [
+            User.objects.create(username=f"benchmark-contributor-{i}") for i in range(10)
+        ]
+        verificators = [
+            User.objects.create(username=f"benchmark-verificator-{i}") for i in range(3)
+        ]
+        statuses = [MediaItem.APPROVED] * 8 + [MediaItem.WAITLIST, MediaItem.REJECTED]
+        now = timezone.now()
+
+        for batch, start in enumerate(range(0, count, BATCH_SIZE)):
+            event = Event.objects.create(
+                name=f"Benchmark {batch}",
+                date=now.date() - timedelta(days=batch),
+                category=category,
+                description="",
+            )
+            media_items = []
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                status = random.choice(statuses)
+                media_items.append(
+                    MediaItem(
+                        title=f"Benchmark {i}",
+                        description="",
+                        event=event,
+                        status=status,
+                        contributor=random.choice(contributors),
+                        verificator=(
+                            None if status == MediaItem.WAITLIST else random.choice(verificators)
+                        ),
+                        reader_count=random.randint(0, 5000),
+                    )
+                )
+            MediaItem.objects.bulk_create(media_items)
+            # upload_date is set on insert, spread the batches over the days
+            MediaItem.objects.filter(event=event).update(
+                upload_date=now - timedelta(days=batch)
+            )
+
+        return contributors[0], verificators[0], event
+
+    def get_access_paths(self, contributor, verificator, event):
+        approved = MediaItem.objects.filter(status=MediaItem.APPROVED)
+        return {
+            "feed": MediaItem.objects.order_by("-upload_date", "-id")[:PAGE_SIZE],
+            "approved_by_date": approved.order_by("-upload_date", "-id")[:PAGE_SIZE],
+            "approved_by_reader": approved.order_by("-reader_count", "-id")[:PAGE_SIZE],
+            "contributor_dashboard": MediaItem.objects.filter(
+                contributor=contributor
+            ).values_list("id", "status"),
+            "verificator_dashboard": MediaItem.objects.filter(
+                Q(status=MediaItem.WAITLIST) | Q(verificator=verificator)
+            ).values_list("id", "status"),
+            "event_lookup": Event.objects.filter(
+                name=event.name, date=event.date, category_id=event.category_id
+            ),
+        }
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"] and not options["save_baseline"]:
+            if not os.path.exists(options["baseline"]):
+                raise CommandError(f"No baseline at {options['baseline']}")
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+
+        results = {}
+        with rolled_back():
+            access_paths = self.get_access_paths(*self.seed(options["items"]))
+
+            self.stdout.write(
+                f"{'path':<24} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}"
+            )
+            for name, queryset in access_paths.items():
+                durations, queries = measure(lambda i: list(queryset.all()), options["repeat"])
+                results[name] = summarize(durations)
+                stats = results[name]
+                self.stdout.write(
+                    f"{name:<24} {stats['mean']:>9.2f} {stats['p50']:>9.2f} "
+                    f"{stats['p95']:>9.2f} {max(queries):>8}"
+                )
+
+            if options["explain"]:
+                for name, queryset in access_paths.items():
+                    self.stdout.write(f"\n{name}:\n{queryset.explain()}")
+
+        if options["save_baseline"]:
+            if not options["baseline"]:
+                raise CommandError("--save-baseline needs --baseline")
+            with open(options["baseline"], "w") as f:
+                json.dump(
+                    {"vendor": connection.vendor, "items": options["items"], "paths": results},
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}"))
+            return
+
+        if baseline is None:
+            return
+
+        regressions = []
+        self.stdout.write(f"\n{'path':<24} {'baseline p50':>13} {'p50':>9} {'change':>8}")
+        for name, stats in results.items():
+            before = baseline["paths"].get(name)
+            if before is None:
+                continue
+            change = stats["p50"] / before["p50"] if before["p50"] else 1.0
+            self.stdout.write(
+                f"{name:<24} {before['p50']:>13.2f} {stats['p50']:>9.2f} {change:>7.2f}x"
+            )
+            if change > options["tolerance"]:
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(f"Slower than the baseline: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,117 @@
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from arsipUI.benchmarks import measure, rolled_back, summarize
+from arsipUI.models import Event, Event_Category, File, MediaItem, Tag
+from arsipUI.renderers import FastJSONRenderer
+from arsipUI.serializers import MediaItemReadSerializer, MediaItemRowSerializer
+
+
+def sort_relations(data):
+    # The prefetches of MediaItemReadSerializer leave tags and files in
+    # database order, the row serializer sorts them by id
+    for item in data:
+        item["tags"] = sorted(item["tags"], key=lambda tag: tag["id"])
+        item["file_paths"] = sorted(item["file_paths"], key=lambda file: file["id"])
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare serializing and rendering MediaItem lists with "
+        "MediaItemReadSerializer and with the values() based row serializer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, nargs="+", default=[100, 1000, 5000])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def seed(self, count, category, contributor, verificator, tags):
+        event = Event.objects.create(
+            name=f"Benchmark {count}", date="2000-01-01", category=category, description=""
+        )
+
+        MediaItem.objects.bulk_create(
+            [
+                MediaItem(
+                    title=f"Benchmark {i}",
+                    description="Some *markdown* text",
+                    formatted_content="<p>Some <em>markdown</em> text</p>",
+                    event=event,
+                    status=MediaItem.APPROVED,
+                    contributor=contributor,
+                    verificator=verificator,
+                )
+                for i in range(count)
+            ],
+            batch_size=500,
+        )
+        media_items = list(MediaItem.objects.filter(event=event).order_by("id"))
+
+        File.objects.bulk_create(
+            [
+                File(
+                    file=f"img/2000/{count}/{i}.jpg",
+                    file_type="img",
+                    thumbnail=f"img/2000/{count}/{i}.webp",
+                )
+                for i in range(count)
+            ],
+            batch_size=500,
+        )
+        files = list(File.objects.filter(file__startswith=f"img/2000/{count}/").order_by("id"))
+
+        MediaItem.tags.through.objects.bulk_create(
+            [
+                MediaItem.tags.through(mediaitem_id=media_item.id, tag_id=tag.id)
+                for i, media_item in enumerate(media_items)
+                for tag in tags[i % 17 : i % 17 + 3]
+            ],
+            batch_size=500,
+        )
+        MediaItem.file_paths.through.objects.bulk_create(
+            [
+                MediaItem.file_paths.through(mediaitem_id=media_item.id, file_id=file.id)
+                for media_item, file in zip(media_items, files)
+            ],
+            batch_size=500,
+        )
+
+        return MediaItem.objects.filter(event=event).order_by("-upload_date", "-id")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'items':>6} {'path':<12} {'mean ms':>9} {'p95 ms':>9} {'queries':>8} {'bytes':>10}"
+        )
+
+        with rolled_back():
+            category = Event_Category.objects.create(name="Benchmark")
+            contributor = User.objects.create(username="benchmark-contributor")
+            verificator = User.objects.create(username="benchmark-verificator")
+            tags = Tag.objects.resolve([f"bench-{i}" for i in range(20)])
+
+            for count in options["items"]:
+                queryset = self.seed(count, category, contributor, verificator, tags)
+
+                def serializer_path(i):
+                    data = MediaItemReadSerializer(queryset.for_read(), many=True).data
+                    return JSONRenderer().render(data)
+
+                def row_path(i):
+                    data = MediaItemRowSerializer(MediaItemRowSerializer.get_rows(queryset)).data
+                    return FastJSONRenderer().render(data)
+
+                expected = sort_relations(json.loads(serializer_path(0)))
+                if json.loads(row_path(0)) != expected:
+                    raise CommandError("The row serializer's output differs")
+
+                for name, path in (("serializer", serializer_path), ("rows", row_path)):
+                    durations, queries = measure(path, options["repeat"])
+                    stats = summarize(durations)
+                    self.stdout.write(
+                        f"{count:>6} {name:<12} {stats['mean']:>9.2f} {stats['p95']:>9.2f} "
+                        f"{max(queries):>8} {len(path(0)):>10}"
+                    )
+
+                queryset.delete()
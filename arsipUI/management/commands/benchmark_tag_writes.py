@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from arsipUI.benchmarks import measure, rolled_back, summarize
+from arsipUI.models import Event, Event_Category, MediaItem, Tag
+
+
+class Command(BaseCommand):
+    help = "Measure MediaItem write latency and queries against its number of tags"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tags", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+
+        self.stdout.write(
+            f"{'tags':>6} {'mean ms':>9} {'p95 ms':>9} {'create q':>9} {'update q':>9}"
+        )
+        # The writes are rolled back, and the cache entries they invalidate,
+        # like the response cache generation, are kept in a private cache
+        private_caches = override_settings(CACHES={
+            alias: {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": f"benchmark_tag_writes-{alias}",
+            }
+            for alias in settings.CACHES
+        })
+        with private_caches, rolled_back():
+            category, created = Event_Category.objects.get_or_create(name="Benchmark")
+            event = Event.objects.create(
+                name="Benchmark", date="2000-01-01", category=category, description=""
+            )
+            # Half of the names already exist, as in a real archive
+            Tag.objects.bulk_create(
+                [Tag(name=f"bench-{i}") for i in range(0, max(options["tags"]), 2)],
+                ignore_conflicts=True,
+            )
+
+            for tag_count in options["tags"]:
+                media_items = []
+
+                def create(i):
+                    tag_names = ";".join(
+                        f"bench-{n}" for n in range(tag_count - 1)
+                    )
+                    media_items.append(
+                        MediaItem.objects.create(
+                            title=f"Benchmark {i}",
+                            description="",
+                            event=event,
+                            tag_names=f"{tag_names};bench-new-{tag_count}-{i}",
+                        )
+                    )
+
+                def update(i):
+                    media_item = media_items[i]
+                    media_item.title = f"Benchmark {i} updated"
+                    media_item.save()
+
+                durations, create_queries = measure(create, repeat)
+                update_durations, update_queries = measure(update, repeat)
+                stats = summarize(durations + update_durations)
+
+                self.stdout.write(
+                    f"{tag_count:>6} {stats['mean']:>9.2f} {stats['p95']:>9.2f} "
+                    f"{max(create_queries):>9} {max(update_queries):>9}"
+                )
@@ -0,0 +1,30 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from arsipUI.models import UploadSession
+from arsipUI.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads that were abandoned before completion"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=24,
+            help="Age since the last chunk after which an upload is abandoned",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        sessions = UploadSession.objects.filter(
+            status=UploadSession.UPLOADING, updated__lt=cutoff
+        )
+
+        deleted = 0
+        for session in sessions:
+            discard_upload(session)
+            deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} abandoned uploads"))
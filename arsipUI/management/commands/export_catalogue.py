@@ -0,0 +1,44 @@
+from urllib.parse import urljoin
+from django.core.management.base import BaseCommand
+from arsipUI.export import RENDERERS, iter_records
+from arsipUI.models import MediaItem
+
+
+class Command(BaseCommand):
+    help = "Stream the MediaItem catalogue as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(RENDERERS), default="ndjson")
+        parser.add_argument("--output", help="File to write to, standard output otherwise")
+        parser.add_argument(
+            "--status",
+            choices=[choice for choice, label in MediaItem.STATUS_CHOICES],
+            help="Only export items with this status, every item otherwise",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--base-url",
+            help="Prefix file URLs with this, e.g. https://arsip.example.com",
+        )
+
+    def handle(self, *args, **options):
+        queryset = MediaItem.objects.all()
+        if options["status"]:
+            queryset = queryset.filter(status=options["status"])
+
+        records = iter_records(queryset, chunk_size=options["chunk_size"])
+        if options["base_url"]:
+            records = self.with_base_url(records, options["base_url"])
+
+        lines = RENDERERS[options["format"]](records)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
+
+    def with_base_url(self, records, base_url):
+        for record in records:
+            record["files"] = [urljoin(base_url, url) for url in record["files"]]
+            yield record
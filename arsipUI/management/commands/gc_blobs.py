@@ -0,0 +1,49 @@
+import os
+import time
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from arsipUI.models import File
+from arsipUI.storage import BLOB_DIR, checksum_from_name
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs that no File references anymore"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=3600,
+            help="Keep blobs younger than this many seconds, they may belong "
+            "to an upload that is not committed yet",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        referenced = set()
+        for names in File.objects.values_list(*File.STORED_FIELDS).iterator():
+            referenced.update(names)
+
+        root = default_storage.path(BLOB_DIR)
+        cutoff = time.time() - options["grace"]
+        deleted = 0
+        freed = 0
+
+        for directory, subdirectories, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location).replace(os.sep, "/")
+                # Skips in-flight temporary files too
+                if not checksum_from_name(name) or name in referenced:
+                    continue
+                if os.path.getmtime(path) > cutoff:
+                    continue
+
+                freed += os.path.getsize(path)
+                deleted += 1
+                if not options["dry_run"]:
+                    os.remove(path)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} unreferenced blobs ({freed} bytes)")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from arsipUI.derivatives import generate_derivatives
+from arsipUI.models import File
+
+
+class Command(BaseCommand):
+    help = "Generate the thumbnails and previews of files that have none"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate the previews of every file",
+        )
+
+    def handle(self, *args, **options):
+        files = File.objects.exclude(file="")
+        if not options["all"]:
+            files = files.filter(thumbnail="")
+
+        generated = 0
+        for file_id in files.values_list("id", flat=True).iterator():
+            if generate_derivatives(file_id):
+                generated += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Generated previews for {generated} files"))
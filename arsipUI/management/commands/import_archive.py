@@ -0,0 +1,326 @@
+import csv
+import json
+import os
+import time
+import markdown
+from django.contrib.auth.models import User
+from django.core.files import File as DjangoFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from arsipUI.models import (
+    Event, Event_Category, File, MediaItem, MediaItemRollup, ResourceVersion, Tag, dated_file_path,
+    get_file_type, normalize_tag_names,
+)
+from arsipUI.search import refresh_documents
+
+
+def split_list(value):
+    # Manifests give lists as JSON arrays or "a;b" strings
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [item.strip() for item in str(value or "").split(";") if item.strip()]
+
+
+def inserted_ids(count):
+    # The ids of the rows of the last multi-row INSERT on this connection,
+    # which are consecutive: InnoDB reserves them at once for an INSERT of a
+    # known number of rows, in every innodb_autoinc_lock_mode, and SQLite
+    # writes one statement at a time
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            # The first of them, spaced by auto_increment_increment
+            cursor.execute("SELECT LAST_INSERT_ID(), @@auto_increment_increment")
+            first, step = cursor.fetchone()
+            return range(first, first + count * step, step)
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT last_insert_rowid()")
+            last = cursor.fetchone()[0]
+            return range(last - count + 1, last + 1)
+    raise NotImplementedError(f"Cannot find the ids of bulk inserts on {connection.vendor}")
+
+
+def bulk_insert(model, objs, batch_size):
+    # The M2M rows need the ids of the new rows, which MySQL does not return
+    # from a bulk insert. There each batch goes in one INSERT whose ids are
+    # recovered from the connection
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+
+    # Small enough that bulk_create doesn't split it further
+    fields = [
+        field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)
+    ]
+    batch_size = max(min(batch_size, connection.ops.bulk_batch_size(fields, objs)), 1)
+    for offset in range(0, len(objs), batch_size):
+        batch = objs[offset : offset + batch_size]
+        model.objects.bulk_create(batch)
+        for obj, pk in zip(batch, inserted_ids(len(batch))):
+            obj.pk = pk
+    return objs
+
+
+class Command(BaseCommand):
+    help = (
+        "Import MediaItems in bulk from a CSV or JSON manifest, with their files "
+        "read from a directory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", help="CSV file, or JSON list of objects")
+        parser.add_argument("directory", help="Directory the manifest's file paths are relative to")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--status",
+            choices=[choice for choice, label in MediaItem.STATUS_CHOICES],
+            default=MediaItem.WAITLIST,
+        )
+        parser.add_argument("--contributor", help="Username of the contributor")
+        parser.add_argument("--verificator", help="Username of the verificator")
+        parser.add_argument("--dry-run", action="store_true", help="Only validate the manifest")
+
+    def handle(self, *args, **options):
+        self.directory = os.path.realpath(options["directory"])
+        self.status = options["status"]
+        self.contributor = self.get_user(options["contributor"])
+        self.verificator = self.get_user(options["verificator"])
+        self.batch_size = options["batch_size"]
+
+        rows = self.read_manifest(options["manifest"])
+        items = []
+        errors = []
+        for line, row in enumerate(rows, start=1):
+            try:
+                items.append(self.clean(row))
+            except ValueError as e:
+                errors.append(f"Item {line}: {e}")
+        if errors:
+            raise CommandError("Invalid manifest:\n" + "\n".join(errors))
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"{len(items)} items are valid"))
+            return
+
+        start = time.perf_counter()
+        imported = files = queries = 0
+        for offset in range(0, len(items), self.batch_size):
+            batch = items[offset : offset + self.batch_size]
+            with CaptureQueriesContext(connection) as context:
+                files += self.import_batch(batch)
+            imported += len(batch)
+            queries += len(context.captured_queries)
+
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{imported}/{len(items)} items, {imported / elapsed:.1f} items/s"
+            )
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} items and {files} files in {elapsed:.1f}s "
+            f"({imported / elapsed if elapsed else 0:.1f} items/s, "
+            f"{queries / imported if imported else 0:.1f} queries per item)"
+        ))
+        if files:
+            self.stdout.write("Run generate_derivatives to create their previews")
+
+    def get_user(self, username):
+        if not username:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {username!r}")
+
+    def read_manifest(self, path):
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                if path.lower().endswith(".json"):
+                    rows = json.load(f)
+                else:
+                    rows = list(csv.DictReader(f))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise CommandError("A JSON manifest must be a list of objects")
+        return rows
+
+    def clean(self, row):
+        title = str(row.get("title") or "").strip()
+        if not title:
+            raise ValueError("title is required")
+        if len(title) > MediaItem._meta.get_field("title").max_length:
+            raise ValueError("title is too long")
+
+        fakultas = str(row.get("fakultas") or "").strip()
+        if fakultas and fakultas not in dict(MediaItem.FAKULTAS_CHOICES):
+            raise ValueError(f"unknown fakultas {fakultas!r}")
+
+        event = None
+        event_fields = [
+            str(row.get(key) or "").strip()
+            for key in ("event_name", "event_date", "event_category")
+        ]
+        if any(event_fields):
+            name, date, category = event_fields
+            if not all(event_fields):
+                raise ValueError("event_name, event_date and event_category go together")
+            try:
+                date = parse_date(date)
+            except ValueError:
+                date = None
+            if date is None:
+                raise ValueError(f"invalid event_date {event_fields[1]!r}")
+            if len(category) > Event_Category._meta.get_field("name").max_length:
+                raise ValueError("event_category is too long")
+            event = (name, date, category)
+
+        paths = []
+        for name in split_list(row.get("files")):
+            path = os.path.realpath(os.path.join(self.directory, name))
+            if os.path.commonpath([path, self.directory]) != self.directory:
+                raise ValueError(f"{name} is outside the directory")
+            if not os.path.isfile(path):
+                raise ValueError(f"{name} does not exist")
+            paths.append(path)
+
+        tag_names = normalize_tag_names(";".join(split_list(row.get("tags"))))
+        return {
+            "title": title,
+            "description": str(row.get("description") or ""),
+            "fakultas": fakultas,
+            "event": event,
+            "tag_names": tag_names,
+            "paths": paths,
+        }
+
+    def import_batch(self, items):
+        with transaction.atomic():
+            categories = self.resolve_categories(
+                {item["event"][2] for item in items if item["event"]}
+            )
+            events = self.resolve_events(
+                {item["event"] for item in items if item["event"]}, categories
+            )
+            tag_names = list(dict.fromkeys(name for item in items for name in item["tag_names"]))
+            resolved = Tag.objects.resolve(tag_names)
+            # Case-insensitive collations (MySQL) return "Batik" for "batik"
+            tags = {tag.name.casefold(): tag for tag in resolved}
+            tags.update({tag.name: tag for tag in resolved})
+
+            tag_names_length = MediaItem._meta.get_field("tag_names").max_length
+            media_items = []
+            files = []
+            for item in items:
+                event = events[item["event"]] if item["event"] else None
+                media_item = MediaItem(
+                    title=item["title"],
+                    description=item["description"],
+                    formatted_content=markdown.markdown(item["description"]),
+                    fakultas=item["fakultas"],
+                    event=event,
+                    status=self.status,
+                    contributor=self.contributor,
+                    verificator=None if self.status == MediaItem.WAITLIST else self.verificator,
+                    tag_names=";".join(item["tag_names"])[:tag_names_length],
+                )
+                media_items.append(media_item)
+                # Blobs of a rolled back batch are left for gc_blobs
+                date = event.date if event else timezone.localdate()
+                files.append([self.store(path, date) for path in item["paths"]])
+
+            bulk_insert(MediaItem, media_items, self.batch_size)
+            bulk_insert(File, [file for item_files in files for file in item_files], self.batch_size)
+
+            MediaItem.tags.through.objects.bulk_create(
+                [
+                    MediaItem.tags.through(
+                        mediaitem_id=media_item.id,
+                        tag_id=(tags.get(name) or tags[name.casefold()]).id,
+                    )
+                    for media_item, item in zip(media_items, items)
+                    for name in item["tag_names"]
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            MediaItem.file_paths.through.objects.bulk_create(
+                [
+                    MediaItem.file_paths.through(mediaitem_id=media_item.id, file_id=file.id)
+                    for media_item, item_files in zip(media_items, files)
+                    for file in item_files
+                ],
+                batch_size=self.batch_size,
+            )
+
+            refresh_documents(
+                MediaItem.objects.filter(id__in=[media_item.id for media_item in media_items])
+            )
+            # bulk_create skips save(), count the batch into the rollups at once.
+            # The insert has set upload_date on the instances
+            rollup_deltas = {}
+            for media_item in media_items:
+                MediaItemRollup.add(rollup_deltas, media_item.get_rollup_entry())
+            MediaItemRollup.apply(rollup_deltas)
+            ResourceVersion.bump(
+                ResourceVersion.MEDIA_ITEMS,
+                ResourceVersion.EVENTS,
+                ResourceVersion.CATEGORIES,
+                ResourceVersion.TAGS,
+            )
+
+        return sum(len(item_files) for item_files in files)
+
+    def resolve_categories(self, names):
+        # Like Tag.objects.resolve(), one lookup and one bulk insert
+        names = list(names)
+        if not names:
+            return {}
+        Event_Category.objects.bulk_create(
+            [Event_Category(name=name) for name in names], ignore_conflicts=True
+        )
+        # Case-insensitive collations (MySQL) may return another spelling
+        found = {
+            category.name.casefold(): category
+            for category in Event_Category.objects.filter(name__in=names)
+        }
+        return {name: found[name.casefold()] for name in names}
+
+    def resolve_events(self, keys, categories):
+        if not keys:
+            return {}
+
+        def key(name, date, category_id):
+            # Names compare like the database's collation may
+            return name.casefold(), date, category_id
+
+        def lookup():
+            found = Event.objects.filter(
+                name__in={name for name, date, category in keys},
+                date__in={date for name, date, category in keys},
+            )
+            return {key(event.name, event.date, event.category_id): event for event in found}
+
+        existing = lookup()
+        missing = [
+            Event(name=name, date=date, category=categories[category], description="")
+            for name, date, category in keys
+            if key(name, date, categories[category].id) not in existing
+        ]
+        if missing:
+            Event.objects.bulk_create(missing)
+            existing = lookup()
+
+        return {
+            (name, date, category): existing[key(name, date, categories[category].id)]
+            for name, date, category in keys
+        }
+
+    def store(self, path, date):
+        filename = os.path.basename(path)
+        storage = File._meta.get_field("file").storage
+        with open(path, "rb") as f:
+            name = storage.save(dated_file_path(filename, date), DjangoFile(f, name=filename))
+        return File(file=name, file_type=get_file_type(filename))
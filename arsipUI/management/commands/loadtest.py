@@ -0,0 +1,116 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from arsipUI.benchmarks import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test running deployments of the API and compare their throughput "
+        "and latency, e.g. the sync views under gunicorn against the async "
+        "views under uvicorn:\n"
+        "  gunicorn project.wsgi -w 4 -b 127.0.0.1:8000\n"
+        "  uvicorn project.asgi:application --workers 4 --port 8001\n"
+        "  manage.py loadtest --target wsgi=http://127.0.0.1:8000/arsip/ "
+        "--target asgi=http://127.0.0.1:8001/arsip/async/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target", action="append", required=True, metavar="NAME=URL",
+            help="Base URL the paths are relative to, can be repeated",
+        )
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Paths to request, defaults to the media list, events and categories",
+        )
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100])
+        parser.add_argument("--requests", type=int, default=1000, help="Per target, path and concurrency")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--output", help="Also write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options["target"]:
+            name, sep, url = target.partition("=")
+            if not sep or urlsplit(url).scheme not in ("http", "https"):
+                raise CommandError(f"Expected NAME=http://host/path/, got {target!r}")
+            targets.append((name, url if url.endswith("/") else url + "/"))
+        paths = options["paths"] or ["", "?page_size=20", "events", "categories"]
+        self.timeout = options["timeout"]
+
+        self.stdout.write(
+            f"{'target':<10} {'path':<16} {'conc':>5} {'req/s':>9} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        results = []
+        for path in paths:
+            for concurrency in options["concurrency"]:
+                for name, base in targets:
+                    result = self.run(urljoin(base, path), concurrency, options["requests"])
+                    result.update({"target": name, "path": path, "concurrency": concurrency})
+                    results.append(result)
+                    self.stdout.write(
+                        f"{name:<10} {path or '/':<16} {concurrency:>5} {result['throughput']:>9.1f} "
+                        f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f} "
+                        f"{result['errors']:>7}"
+                    )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def run(self, url, concurrency, requests):
+        # Each thread keeps its own keep-alive connection and takes requests
+        # until the total is reached
+        parts = urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        connection_class = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        lock = threading.Lock()
+        remaining = [requests]
+        durations = []
+        errors = [0]
+
+        def take():
+            with lock:
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker():
+            connection = connection_class(parts.netloc, timeout=self.timeout)
+            try:
+                while take():
+                    start = time.perf_counter()
+                    try:
+                        connection.request("GET", target, headers={"Accept": "application/json"})
+                        response = connection.getresponse()
+                        response.read()
+                        ok = response.status < 400
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+                        ok = False
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        if ok:
+                            durations.append(elapsed)
+                        else:
+                            errors[0] += 1
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for i in range(concurrency):
+                executor.submit(worker)
+        elapsed = time.perf_counter() - start
+
+        stats = summarize(durations) if durations else dict.fromkeys(["mean", "p50", "p95", "p99"], 0.0)
+        return {"throughput": len(durations) / elapsed, "errors": errors[0], **stats}
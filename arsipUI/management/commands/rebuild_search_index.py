@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from arsipUI.models import MediaItem, ResourceVersion
+from arsipUI.search import refresh_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents of every MediaItem"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ids = list(MediaItem.objects.order_by("id").values_list("id", flat=True))
+
+        indexed = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start : start + batch_size]
+            indexed += refresh_documents(MediaItem.objects.filter(id__in=batch))
+
+        # Search results may have changed
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} media items"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from arsipUI.models import MediaItemRollup, ResourceVersion
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the statistics rollups from the MediaItems, after bulk changes "
+        "that skip save() such as deleting users"
+    )
+
+    def handle(self, *args, **options):
+        MediaItemRollup.rebuild()
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {MediaItemRollup.objects.count()} statistics rollups"
+        ))
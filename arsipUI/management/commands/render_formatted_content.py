@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from arsipUI.models import MediaItem, ResourceVersion
+
+
+class Command(BaseCommand):
+    help = "Render the markdown description of MediaItems into formatted_content"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every item, not only the ones never rendered",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        queryset = MediaItem.objects.only("id", "description", "formatted_content")
+        if not options["all"]:
+            queryset = queryset.filter(formatted_content="").exclude(description="")
+
+        batch = []
+        rendered = 0
+        for media_item in queryset.iterator(chunk_size=batch_size):
+            media_item.render_formatted_content()
+            batch.append(media_item)
+
+            if len(batch) >= batch_size:
+                MediaItem.objects.bulk_update(batch, ["formatted_content"])
+                rendered += len(batch)
+                batch = []
+
+        if batch:
+            MediaItem.objects.bulk_update(batch, ["formatted_content"])
+            rendered += len(batch)
+
+        if rendered:
+            ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} media items"))
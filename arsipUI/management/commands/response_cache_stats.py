@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from arsipUI import response_cache
+
+
+class Command(BaseCommand):
+    help = "Show the hit and miss counts of the anonymous media list response cache"
+
+    def handle(self, *args, **options):
+        if not response_cache.is_enabled():
+            self.stdout.write(self.style.WARNING(
+                "The response cache is off, it needs a shared CACHE_URL"
+            ))
+        metrics = response_cache.get_metrics()
+        self.stdout.write(
+            f"hits: {metrics['hits']}\n"
+            f"misses: {metrics['misses']}\n"
+            f"hit ratio: {metrics['hit_ratio']:.1%}"
+        )
@@ -0,0 +1,121 @@
+import signal
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from arsipUI import tasks
+
+
+# Seconds between requeueing the tasks of dead workers and purging old ones
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background tasks: previews, video transcoding, reader "
+        "count flushes and search index updates"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=getattr(settings, "TASK_WORKER_THREADS", 2),
+            help="Tasks run at once by this worker",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for tasks",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        self.poll_interval = options["poll_interval"]
+        self.burst = options["burst"]
+        self.worker = tasks.get_worker_name()
+        self.processed = 0
+        self.lock = threading.Lock()
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            # Finish the running tasks on the way out
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                handlers[signum] = signal.signal(signum, lambda *args: self.stopping.set())
+
+        # Beats on its own, the loops can be busy with a task for hours
+        self.finished = threading.Event()
+        heartbeat = threading.Thread(target=self.beat, daemon=True)
+        heartbeat.start()
+
+        try:
+            self.maintain()
+            if options["threads"] <= 1:
+                # The only loop does the maintenance between tasks
+                self.loop(self.worker, maintain=True)
+            else:
+                self.run_threads(options["threads"])
+        finally:
+            self.finished.set()
+            heartbeat.join()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {self.processed} tasks"))
+
+    def run_threads(self, count):
+        threads = [
+            threading.Thread(target=self.loop, args=(f"{self.worker}:{i}",), daemon=True)
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+
+        while any(thread.is_alive() for thread in threads):
+            if self.maintenance_due():
+                self.maintain()
+                close_old_connections()
+            for thread in threads:
+                thread.join(timeout=self.poll_interval)
+
+    def maintenance_due(self):
+        return time.monotonic() - self.last_maintenance >= MAINTENANCE_INTERVAL
+
+    def maintain(self):
+        self.last_maintenance = time.monotonic()
+        tasks.requeue_stale()
+        tasks.purge_finished()
+
+    def beat(self):
+        interval = getattr(settings, "TASK_HEARTBEAT_INTERVAL", 30)
+        try:
+            while not self.finished.wait(interval):
+                try:
+                    tasks.heartbeat(self.worker)
+                except DatabaseError:
+                    # Tried again on the next beat
+                    self.stderr.write("Heartbeat failed, database unavailable")
+                close_old_connections()
+        finally:
+            close_old_connections()
+
+    def loop(self, worker, maintain=False):
+        # Each thread claims and runs one task at a time
+        try:
+            while not self.stopping.is_set():
+                if maintain and self.maintenance_due():
+                    self.maintain()
+                task = tasks.claim(worker)
+                if task is None:
+                    if self.burst:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                tasks.run(task)
+                with self.lock:
+                    self.processed += 1
+                close_old_connections()
+        finally:
+            close_old_connections()
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from arsipUI import tasks
+
+
+def seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+class Command(BaseCommand):
+    help = "Show the depth, wait and run times of the background task queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window", type=int, default=3600,
+            help="Seconds of finished tasks the timings cover",
+        )
+
+    def handle(self, *args, **options):
+        metrics = tasks.get_metrics(window=options["window"])
+        if not metrics:
+            self.stdout.write("No tasks")
+            return
+
+        self.stdout.write(
+            f"{'task':<50} {'queued':>6} {'running':>7} {'failed':>6} {'oldest':>8} "
+            f"{'done':>5} {'wait p50':>9} {'wait p95':>9} {'run p50':>8} {'run p95':>8}"
+        )
+        for name, entry in sorted(metrics.items()):
+            self.stdout.write(
+                f"{name:<50} {entry['queued']:>6} {entry['running']:>7} {entry['failed']:>6} "
+                f"{seconds(entry['oldest']):>8} {entry['done']:>5} "
+                f"{seconds(entry['wait_p50']):>9} {seconds(entry['wait_p95']):>9} "
+                f"{seconds(entry['run_p50']):>8} {seconds(entry['run_p95']):>8}"
+            )
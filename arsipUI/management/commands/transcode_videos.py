@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from arsipUI.models import File
+from arsipUI.transcoding import has_ffmpeg, transcode
+
+
+class Command(BaseCommand):
+    help = "Transcode the videos that have no web rendition yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry the videos that failed before",
+        )
+
+    def handle(self, *args, **options):
+        if not has_ffmpeg():
+            raise CommandError("ffmpeg and ffprobe are required, see FFMPEG_BINARY")
+
+        statuses = ["", File.TRANSCODE_PENDING]
+        if options["retry_failed"]:
+            statuses.append(File.TRANSCODE_FAILED)
+        files = File.objects.filter(file_type="vid", transcode_status__in=statuses).exclude(file="")
+
+        transcoded = failed = 0
+        for file_id in files.values_list("id", flat=True).iterator():
+            if transcode(file_id):
+                transcoded += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Transcoded {transcoded} videos, {failed} failed"))
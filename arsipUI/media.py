@@ -0,0 +1,156 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from .storage import BLOB_DIR, checksum_from_name
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 64 * 1024
+# Blobs are named after their content, they never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    # (start, end) of a single "bytes=" range, end inclusive, or None when the
+    # whole file should be sent. Multiple ranges are answered with the whole
+    # file, which RFC 9110 allows
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+
+    start, end = match.groups()
+    if start == "":
+        # "bytes=-500", the last 500 bytes
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def iter_range(f, start, end):
+    try:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+def is_private(name):
+    # Chunked uploads in progress and the storage's temporary files
+    hidden = [os.path.join(BLOB_DIR, "tmp")]
+    partial_root = os.path.realpath(settings.UPLOAD_PARTIAL_ROOT)
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    if os.path.commonpath([partial_root, media_root]) == media_root:
+        hidden.append(os.path.relpath(partial_root, media_root))
+    return any(name == path or name.startswith(path + "/") for path in hidden)
+
+
+def get_etag(name, stat):
+    # The checksum in a blob's name is a strong validator for free, other
+    # files fall back to their modification time and size
+    checksum = checksum_from_name(name)
+    if checksum:
+        return f'"{checksum}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def sendfile_response(name):
+    # Let the front proxy send the file, it handles ranges itself
+    mode = getattr(settings, "MEDIA_SENDFILE", "")
+    response = HttpResponse()
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "MEDIA_SENDFILE_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + name
+    else:
+        response["X-Sendfile"] = safe_join(settings.MEDIA_ROOT, name)
+    # The proxy fills in the type from the file, Django would default to HTML
+    del response["Content-Type"]
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    # Serves MEDIA_ROOT in place of django.conf.urls.static: byte ranges for
+    # seeking through videos, validators from the blob checksums, long cache
+    # lifetimes, and MEDIA_SENDFILE to hand the transfer to nginx or Apache
+    name = os.path.normpath(path).lstrip("/")
+    if name.startswith("..") or is_private(name):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = get_etag(name, stat)
+    last_modified = int(stat.st_mtime)
+    if checksum_from_name(name):
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build_response(request, name, full_path, stat.st_size, etag)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = cache_control
+    return response
+
+
+def build_response(request, name, full_path, size, etag):
+    if getattr(settings, "MEDIA_SENDFILE", ""):
+        return sendfile_response(name)
+
+    byte_range = None
+    header = request.META.get("HTTP_RANGE")
+    # A Range only applies while the client's copy is still the same file
+    if header and request.META.get("HTTP_IF_RANGE", etag) == etag:
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None or byte_range == (0, size - 1):
+        # The WSGI server's file wrapper can send it with sendfile()
+        response = FileResponse(open(full_path, "rb"))
+    else:
+        start, end = byte_range
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = StreamingHttpResponse(
+            iter_range(open(full_path, "rb"), start, end),
+            status=206,
+            content_type=content_type or "application/octet-stream",
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = "arsipUI_searchdocument"
+
+    if connection.vendor == "mysql":
+        schema_editor.execute(
+            f"ALTER TABLE `{table}` ADD FULLTEXT INDEX `{table}_content_ft` (`content`)"
+        )
+    elif connection.vendor == "sqlite":
+        # External content FTS5 table kept in sync with the documents by triggers
+        index = f"{table}_fts"
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE "{index}" USING fts5('
+            f"content, content='{table}', content_rowid='media_item_id')"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER "{index}_ai" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{index}" (rowid, content) VALUES (new.media_item_id, new.content); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER "{index}_ad" AFTER DELETE ON "{table}" BEGIN '
+            f'INSERT INTO "{index}" ("{index}", rowid, content) '
+            f"VALUES ('delete', old.media_item_id, old.content); END"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER "{index}_au" AFTER UPDATE ON "{table}" BEGIN '
+            f'INSERT INTO "{index}" ("{index}", rowid, content) '
+            f"VALUES ('delete', old.media_item_id, old.content); "
+            f'INSERT INTO "{index}" (rowid, content) VALUES (new.media_item_id, new.content); END'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    table = "arsipUI_searchdocument"
+
+    if connection.vendor == "mysql":
+        schema_editor.execute(f"ALTER TABLE `{table}` DROP INDEX `{table}_content_ft`")
+    elif connection.vendor == "sqlite":
+        index = f"{table}_fts"
+        for trigger in ("ai", "ad", "au"):
+            schema_editor.execute(f'DROP TRIGGER "{index}_{trigger}"')
+        schema_editor.execute(f'DROP TABLE "{index}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0036_file_file_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('media_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='arsipUI.mediaitem')),
+                ('content', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0037_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='formatted_content',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
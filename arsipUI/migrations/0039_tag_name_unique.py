@@ -0,0 +1,51 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:14
+
+import unicodedata
+from django.db import migrations, models
+
+
+def collation_key(name, vendor):
+    # MySQL's default collation compares names ignoring case, accents and
+    # trailing spaces, so it rejects those as duplicates too
+    if vendor != "mysql":
+        return name
+    name = unicodedata.normalize("NFKD", name.rstrip())
+    return "".join(char for char in name if not unicodedata.combining(char)).casefold()
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    Tag = apps.get_model("arsipUI", "Tag")
+    MediaItemTags = apps.get_model("arsipUI", "MediaItem").tags.through
+    vendor = schema_editor.connection.vendor
+
+    kept = {}
+    for tag in Tag.objects.order_by("id"):
+        key = collation_key(tag.name, vendor)
+        if key not in kept:
+            kept[key] = tag.id
+            continue
+
+        # Move the duplicate's links onto the oldest tag of the same name
+        linked = MediaItemTags.objects.filter(tag_id=kept[key]).values_list(
+            "mediaitem_id", flat=True
+        )
+        MediaItemTags.objects.filter(tag_id=tag.id).exclude(
+            mediaitem_id__in=list(linked)
+        ).update(tag_id=kept[key])
+        tag.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0038_mediaitem_formatted_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0040_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='preview',
+            field=models.FileField(blank=True, editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:19
+
+import arsipUI.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0041_file_thumbnail_preview'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(blank=True, db_index=True, upload_to=arsipUI.models.media_file_path, validators=[arsipUI.models.validate_file_extension]),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='preview',
+            field=models.FileField(blank=True, db_index=True, editable=False, upload_to=''),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='thumbnail',
+            field=models.FileField(blank=True, db_index=True, editable=False, upload_to=''),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_versions(apps, schema_editor):
+    ResourceVersion = apps.get_model("arsipUI", "ResourceVersion")
+    ResourceVersion.objects.bulk_create(
+        [
+            ResourceVersion(key=key)
+            for key in ("media_items", "events", "categories", "tags")
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0042_file_stored_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceVersion',
+            fields=[
+                ('key', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
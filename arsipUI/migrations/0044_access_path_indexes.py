@@ -0,0 +1,88 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:29
+
+import unicodedata
+from django.db import migrations, models
+
+
+def collation_key(name, vendor):
+    # MySQL's default collation compares names ignoring case, accents and
+    # trailing spaces, so it rejects those as duplicates too
+    if vendor != "mysql":
+        return name
+    name = unicodedata.normalize("NFKD", name.rstrip())
+    return "".join(char for char in name if not unicodedata.combining(char)).casefold()
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    Event_Category = apps.get_model("arsipUI", "Event_Category")
+    Event = apps.get_model("arsipUI", "Event")
+    MediaItem = apps.get_model("arsipUI", "MediaItem")
+    vendor = schema_editor.connection.vendor
+
+    kept = {}
+    merged = set()
+    for category in Event_Category.objects.order_by("id"):
+        key = collation_key(category.name, vendor)
+        if key not in kept:
+            kept[key] = category.id
+            continue
+
+        # Move the duplicate's events onto the oldest category of the same name
+        Event.objects.filter(category_id=category.id).update(category_id=kept[key])
+        merged.add(kept[key])
+        category.delete()
+
+    # Which may now hold two events of the same name and date, that
+    # MediaItem.save() would no longer tell apart. Their items move to the
+    # oldest one
+    for category_id in merged:
+        kept_events = {}
+        for event in Event.objects.filter(category_id=category_id).order_by("id"):
+            key = (collation_key(event.name, vendor), event.date)
+            if key not in kept_events:
+                kept_events[key] = event.id
+                continue
+
+            MediaItem.objects.filter(event_id=event.id).update(event_id=kept_events[key])
+            event.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0043_resourceversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='event',
+            name='date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='event_category',
+            name='name',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['-upload_date', '-id'], name='mediaitem_upload_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['status', '-upload_date', '-id'], name='mediaitem_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['status', '-reader_count', '-id'], name='mediaitem_status_reader_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['contributor', 'status'], name='mediaitem_contributor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['verificator', 'status'], name='mediaitem_verificator_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:56
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def build_rollups(apps, schema_editor):
+    MediaItem = apps.get_model("arsipUI", "MediaItem")
+    MediaItemRollup = apps.get_model("arsipUI", "MediaItemRollup")
+
+    # Months found like in MediaItemRollup.bucket(), TruncMonth needs the
+    # time zone tables on MySQL
+    rollups = {}
+    rows = MediaItem.objects.values_list(
+        "fakultas", "event_id", "upload_date", "status", "reader_count"
+    ).order_by()
+    for fakultas, event_id, upload_date, status, reader_count in rows.iterator(chunk_size=2000):
+        month = timezone.localtime(upload_date).date().replace(day=1)
+        rollup = rollups.setdefault((fakultas, event_id, month, status), [0, 0])
+        rollup[0] += 1
+        rollup[1] += reader_count
+
+    MediaItemRollup.objects.bulk_create(
+        [
+            MediaItemRollup(
+                fakultas=fakultas, event_id=event_id, month=month, status=status,
+                items=items, readers=readers,
+            )
+            for (fakultas, event_id, month, status), (items, readers) in rollups.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0044_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaItemRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fakultas', models.CharField(blank=True, max_length=8)),
+                ('month', models.DateField()),
+                ('status', models.CharField(max_length=8)),
+                ('items', models.IntegerField(default=0)),
+                ('readers', models.BigIntegerField(default=0)),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='arsipUI.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fakultas', 'event', 'month', 'status'], name='rollup_bucket_idx')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
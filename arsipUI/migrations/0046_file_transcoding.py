@@ -0,0 +1,33 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0045_mediaitemrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='poster',
+            field=models.FileField(blank=True, db_index=True, editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='rendition',
+            field=models.FileField(blank=True, db_index=True, editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='transcode_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], editable=False, max_length=10),
+        ),
+    ]
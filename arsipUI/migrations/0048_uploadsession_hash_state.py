@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0047_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='hash_state',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+def set_heartbeats(apps, schema_editor):
+    # Running tasks count as alive since they started
+    Task = apps.get_model("arsipUI", "Task")
+    Task.objects.filter(status="running").update(heartbeat=models.F("started"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0048_uploadsession_hash_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_heartbeats, migrations.RunPython.noop),
+    ]
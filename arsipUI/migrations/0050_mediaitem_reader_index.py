@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0049_task_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['-reader_count', '-id'], name='mediaitem_reader_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:32
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arsipUI', '0050_mediaitem_reader_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='uploadsession',
+            name='hash_state',
+        ),
+    ]
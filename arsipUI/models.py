@@ -1,32 +1,121 @@
 import os
-from django.db import models
+import uuid
+import markdown
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
+from .response_cache import invalidate as invalidate_responses
+from .storage import checksum_from_name
+
+
+def normalize_tag_names(value):
+    # Split a "tag1;tag2" string into clean, distinct tag names
+    names = []
+    seen = set()
+    for name in value.split(";"):
+        name = " ".join(name.split())[: Tag._meta.get_field("name").max_length]
+        if name and name.casefold() not in seen:
+            seen.add(name.casefold())
+            names.append(name)
+    return names
+
+
+class TagQuerySet(models.QuerySet):
+    def resolve(self, names):
+        # Get the Tag of every name with one lookup, creating the missing ones
+        # in bulk. ignore_conflicts makes concurrent creation of the same name
+        # safe thanks to the unique constraint, the losers re-read the winner's row
+        tags = self._match(names)
+        missing = [name for name in names if name not in tags]
+        if missing:
+            self.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            tags.update(self._match(missing))
+
+        return [tags[name] for name in names if name in tags]
+
+    def _match(self, names):
+        found = list(self.filter(name__in=names))
+        by_name = {tag.name: tag for tag in found}
+        # Case-insensitive collations (MySQL) return "Batik" when asked for "batik"
+        by_folded_name = {tag.name.casefold(): tag for tag in found}
+
+        tags = {}
+        for name in names:
+            tag = by_name.get(name) or by_folded_name.get(name.casefold())
+            if tag:
+                tags[name] = tag
+        return tags
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, unique=True)
+
+    objects = TagQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+
+        # A renamed tag changes the search documents of its items
+        if not adding:
+            from .search import refresh_related_documents
+
+            refresh_related_documents.enqueue("tags", self.id)
+            ResourceVersion.bump(ResourceVersion.TAGS)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        ResourceVersion.bump(ResourceVersion.TAGS)
+        return result
+
 
 class Event_Category(models.Model):
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, unique=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ResourceVersion.bump(ResourceVersion.CATEGORIES)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        ResourceVersion.bump(ResourceVersion.CATEGORIES)
+        return result
+
 
 class Event(models.Model):
     name = models.CharField(max_length=255)
-    date = models.DateField()
+    date = models.DateField(db_index=True)
     category = models.ForeignKey(Event_Category, on_delete=models.CASCADE)
     description = models.TextField()
 
     def __str__(self):
         return self.name
-    
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+
+        # An edited event changes the search documents of its items
+        if not adding:
+            from .search import refresh_related_documents
+
+            refresh_related_documents.enqueue("event", self.id)
+        ResourceVersion.bump(ResourceVersion.EVENTS)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        ResourceVersion.bump(ResourceVersion.EVENTS)
+        return result
+
 def get_file_type(value):
     img_type = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp', '.svg']
     vid_type = ['.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.3gp', '.3gpp']
@@ -47,12 +136,15 @@ def validate_file_extension(value):
     if get_file_type(value.name) == None:
         raise ValidationError('Unsupported file extension.')
 
+def dated_file_path(filename, date):
+    return f"{get_file_type(filename)}/{date.year}/{date.month}/{filename}"
+
 def media_file_path(instance, filename):
     category = get_file_type(filename)
     instance.file_type = category
     event_date = instance.media_items.first().event.date
     # Define the file path for multimedia uploads
-    return f"{category}/{event_date.year}/{event_date.month}/{filename}"
+    return dated_file_path(filename, event_date)
 
 class File(models.Model):
     FILE_TYPE = [
@@ -60,12 +152,208 @@ class File(models.Model):
         ("vid", "Videos"),
         ("doc", "Documents")
     ]
-    file = models.FileField(upload_to=media_file_path, validators=[validate_file_extension], blank=True)
+    TRANSCODE_PENDING = "pending"
+    TRANSCODE_PROCESSING = "processing"
+    TRANSCODE_DONE = "done"
+    TRANSCODE_FAILED = "failed"
+    TRANSCODE_STATUS_CHOICES = [
+        (TRANSCODE_PENDING, "Pending"),
+        (TRANSCODE_PROCESSING, "Processing"),
+        (TRANSCODE_DONE, "Done"),
+        (TRANSCODE_FAILED, "Failed"),
+    ]
+    # Indexed, the storage shares one blob between File rows with the same
+    # content and looks up its references by name
+    file = models.FileField(upload_to=media_file_path, validators=[validate_file_extension], blank=True, db_index=True)
     file_type = models.CharField(choices=FILE_TYPE, max_length=3, editable=False)
+    # Downscaled WebP renditions generated by derivatives.py
+    thumbnail = models.FileField(blank=True, editable=False, db_index=True)
+    preview = models.FileField(blank=True, editable=False, db_index=True)
+    # H.264/AAC MP4 rendition and poster frame of videos made by transcoding.py,
+    # transcode_status stays empty for other files
+    rendition = models.FileField(blank=True, editable=False, db_index=True)
+    poster = models.FileField(blank=True, editable=False, db_index=True)
+    duration = models.FloatField(null=True, blank=True, editable=False)
+    transcode_status = models.CharField(
+        max_length=10, choices=TRANSCODE_STATUS_CHOICES, blank=True, editable=False
+    )
+
+    STORED_FIELDS = ["file", "thumbnail", "preview", "rendition", "poster"]
+    # Columns FileSerializer reads
+    SERIALIZED_FIELDS = [
+        "id", "file", "file_type", "thumbnail", "preview",
+        "rendition", "poster", "duration", "transcode_status",
+    ]
 
     def __str__(self):
         return self.file.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Files are serialized as part of their media items
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+
+    @classmethod
+    def is_referenced(cls, name):
+        query = Q()
+        for field in cls.STORED_FIELDS:
+            query |= Q(**{field: name})
+        return cls.objects.filter(query).exists()
+
+    def delete(self, *args, **kwargs):
+        names = {getattr(self, field).name for field in self.STORED_FIELDS} - {""}
+        result = super().delete(*args, **kwargs)
+
+        # Blobs are left to gc_blobs: a concurrent upload of the same content
+        # may already have been handed the name without its row committed yet.
+        # Files stored before content addressing are never shared
+        for name in names:
+            if not checksum_from_name(name) and not File.is_referenced(name):
+                self.file.storage.delete(name)
+
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+        return result
+
+class MediaItemQuerySet(models.QuerySet):
+    # Columns emitted by UserSerializer for the nested contributor/verificator
+    USER_READ_FIELDS = ["id", "username", "first_name", "last_name", "email"]
+
+    # Actions of the bulk moderation endpoint
+    APPROVE = "approve"
+    REJECT = "reject"
+    CANCEL = "cancel"
+    MODERATION_ACTIONS = [APPROVE, REJECT, CANCEL]
+
+    def for_read(self):
+        # Load everything MediaItemReadSerializer nests (event.category, tags,
+        # file_paths, contributor, verificator) in a fixed number of queries,
+        # regardless of how many rows are serialized
+        related_fields = [
+            f"{relation}__{field}"
+            for relation in ("contributor", "verificator")
+            for field in self.USER_READ_FIELDS
+        ]
+
+        return (
+            self.select_related("event__category", "contributor", "verificator")
+            .only(
+                *[field.name for field in self.model._meta.concrete_fields],
+                "event__name",
+                "event__date",
+                "event__description",
+                "event__category__name",
+                *related_fields,
+            )
+            .prefetch_related(
+                Prefetch("tags", queryset=Tag.objects.only("id", "name")),
+                Prefetch(
+                    "file_paths",
+                    queryset=File.objects.only(*File.SERIALIZED_FIELDS),
+                ),
+            )
+        )
+
+    def for_fields(self, fields, expand=()):
+        # Like for_read(), for MediaItemCompactSerializer: only loads the
+        # columns and relations the given fields need, relations that are not
+        # expanded are read as ids
+        concrete = {field.name for field in self.model._meta.concrete_fields}
+        # The pagination cursors read these
+        columns = ["id", "upload_date", "reader_count"]
+        columns += [name for name in fields if name in concrete]
+        if "formatted_content" in fields:
+            columns.append("description")
+
+        queryset = self
+        if "event" in expand:
+            queryset = queryset.select_related("event__category")
+            columns += [
+                "event__name",
+                "event__date",
+                "event__description",
+                "event__category__name",
+            ]
+        for relation in ("contributor", "verificator"):
+            if relation in expand:
+                queryset = queryset.select_related(relation)
+                columns += [f"{relation}__{field}" for field in self.USER_READ_FIELDS]
+
+        if "tags" in fields:
+            tag_fields = ["id", "name"] if "tags" in expand else ["id"]
+            queryset = queryset.prefetch_related(
+                Prefetch("tags", queryset=Tag.objects.only(*tag_fields))
+            )
+        if "file_paths" in fields or "thumbnail" in fields:
+            file_fields = ["id", "thumbnail"]
+            if "file_paths" in expand:
+                file_fields = File.SERIALIZED_FIELDS
+            queryset = queryset.prefetch_related(
+                Prefetch("file_paths", queryset=File.objects.only(*file_fields))
+            )
+
+        return queryset.only(*columns)
+
+    def moderate(self, ids, action, user, reject_reason=""):
+        # Approve, reject or cancel the decision on many items with one locking
+        # read and one UPDATE, skipping save() since moderation only touches
+        # columns nothing is derived from but the statistics rollups, which are
+        # moved along in the same transaction. Returns {id: result} where result is
+        # "updated", "unchanged", "forbidden" or "not_found"
+        model = self.model
+        if action == self.APPROVE:
+            values = {"status": model.APPROVED, "verificator_id": user.id}
+        elif action == self.REJECT:
+            values = {
+                "status": model.REJECTED,
+                "verificator_id": user.id,
+                "reject_reason": reject_reason,
+            }
+        elif action == self.CANCEL:
+            values = {"status": model.WAITLIST, "verificator_id": None}
+        else:
+            raise ValueError(f"Unknown moderation action {action!r}")
+
+        results = dict.fromkeys(ids, "not_found")
+        with transaction.atomic():
+            rows = (
+                self.filter(id__in=ids)
+                .select_for_update()
+                .values_list(
+                    "id", "status", "verificator_id",
+                    "fakultas", "event_id", "upload_date", "reader_count",
+                )
+            )
+
+            updated = []
+            rollup_deltas = {}
+            for (
+                media_item_id, status, verificator_id,
+                fakultas, event_id, upload_date, reader_count,
+            ) in rows:
+                if action == self.CANCEL and verificator_id != user.id:
+                    # Only the verificator of an item can take the decision back
+                    results[media_item_id] = "forbidden"
+                elif (
+                    action != self.REJECT
+                    and status == values["status"]
+                    and verificator_id == values["verificator_id"]
+                ):
+                    results[media_item_id] = "unchanged"
+                else:
+                    results[media_item_id] = "updated"
+                    updated.append(media_item_id)
+                    for item_status, sign in ((status, -1), (values["status"], 1)):
+                        bucket = MediaItemRollup.bucket(fakultas, event_id, upload_date, item_status)
+                        MediaItemRollup.add(rollup_deltas, (bucket, reader_count), sign)
+
+            if updated:
+                self.model.objects.filter(id__in=updated).update(**values)
+                MediaItemRollup.apply(rollup_deltas)
+                ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+
+        return results
+
+
 class MediaItem(models.Model):
     WAITLIST = "waitlist"
     APPROVED = "approved"
@@ -118,6 +406,8 @@ class MediaItem(models.Model):
         related_name='verifications'
     )
     description = models.TextField()
+    # Rendered markdown of the description, regenerated when it changes
+    formatted_content = models.TextField(blank=True, editable=False)
     file_paths = models.ManyToManyField(File, related_name='media_items')
     upload_date = models.DateTimeField(auto_now_add=True)
     fakultas = models.CharField(max_length=8, choices=FAKULTAS_CHOICES, blank=True)
@@ -133,24 +423,90 @@ class MediaItem(models.Model):
     event_date = models.DateField(null=True, blank=True)
     tag_names = models.CharField(max_length=255, blank=True)
 
+    objects = MediaItemQuerySet.as_manager()
+
+    # Columns MediaItemRollup counts an item by
+    ROLLUP_FIELDS = ["fakultas", "event_id", "upload_date", "status", "reader_count"]
+
+    class Meta:
+        # One per access path: the public feed, by status or not, ordered by
+        # date or by reader count, and the dashboards of contributors and
+        # verificators. The feeds end with the id to serve the keyset
+        # pagination's (date, id) or (reader_count, id) order straight from
+        # the index
+        indexes = [
+            models.Index(fields=["-upload_date", "-id"], name="mediaitem_upload_date_idx"),
+            models.Index(fields=["status", "-upload_date", "-id"], name="mediaitem_status_date_idx"),
+            models.Index(fields=["-reader_count", "-id"], name="mediaitem_reader_idx"),
+            models.Index(fields=["status", "-reader_count", "-id"], name="mediaitem_status_reader_idx"),
+            models.Index(fields=["contributor", "status"], name="mediaitem_contributor_idx"),
+            models.Index(fields=["verificator", "status"], name="mediaitem_verificator_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored description to only re-render it when it changes
+        instance._loaded_description = instance.__dict__.get("description")
+        # And what it counted for in the statistics rollups
+        if all(field in instance.__dict__ for field in cls.ROLLUP_FIELDS):
+            instance._loaded_rollup = instance.get_rollup_entry()
+        return instance
+
+    def get_rollup_entry(self):
+        bucket = MediaItemRollup.bucket(self.fakultas, self.event_id, self.upload_date, self.status)
+        return bucket, self.reader_count
+
+    def fetch_rollup_entry(self):
+        # The entry of the stored row, for instances not loaded with its fields
+        row = MediaItem.objects.filter(id=self.id).values_list(*self.ROLLUP_FIELDS).first()
+        if row is None:
+            return None
+        fakultas, event_id, upload_date, status, reader_count = row
+        return MediaItemRollup.bucket(fakultas, event_id, upload_date, status), reader_count
+
+    def render_formatted_content(self):
+        self.formatted_content = markdown.markdown(self.description)
+
     def handle_tags(self):
-        # Clear existing tags and add new tags based on tag_names
-        self.tags.clear()
+        # Sync tags with tag_names, set() only adds and removes the links that
+        # changed
+        tags = Tag.objects.resolve(normalize_tag_names(self.tag_names))
+        self.tags.set(tags)
 
-        if self.tag_names:
-            tag_names = [tag_name.strip() for tag_name in self.tag_names.split(";")]
-            tags = [
-                Tag.objects.get_or_create(name=tag_name)[0] for tag_name in tag_names
-            ]
-            self.tags.set(tags)
+        self.after_change()
 
     def __str__(self):
         return self.title
 
+    def update_search_document(self):
+        from .search import build_document
+
+        SearchDocument(media_item=self, content=build_document(self)).save()
+
+    def after_change(self):
+        # Refresh what is derived from the item, once its tags are settled
+        self.update_search_document()
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+
     def save(self, *args, **kwargs):
         # On create:
         if self.id == None:
             self.status = self.WAITLIST
+            previous_rollup = None
+        elif hasattr(self, "_loaded_rollup"):
+            previous_rollup = self._loaded_rollup
+        else:
+            previous_rollup = self.fetch_rollup_entry()
+
+        # Render the description's markdown once per change instead of per read
+        if self.description != getattr(self, "_loaded_description", None):
+            self.render_formatted_content()
+            self._loaded_description = self.description
+
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "description" in update_fields:
+                kwargs["update_fields"] = {*update_fields, "formatted_content"}
 
         # Check if event exists, create if not
         if not self.event_id and (self.event_name and self.event_date and self.event_category):
@@ -166,6 +522,247 @@ class MediaItem(models.Model):
 
         super().save(*args, **kwargs)
 
+        self._loaded_rollup = self.get_rollup_entry()
+        MediaItemRollup.move(previous_rollup, self._loaded_rollup)
+
         # Handle tags
         if self.tag_names != "":
             self.handle_tags()
+        else:
+            self.after_change()
+
+    def delete(self, *args, **kwargs):
+        previous_rollup = getattr(self, "_loaded_rollup", None) or self.fetch_rollup_entry()
+        result = super().delete(*args, **kwargs)
+        MediaItemRollup.move(previous_rollup, None)
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+        return result
+
+
+class MediaItemRollup(models.Model):
+    # Number of MediaItems and sum of their reader counts per fakultas, event,
+    # upload month and status. Kept up to date with deltas as items change,
+    # so statistics aggregate this small table instead of every item.
+    # Concurrent inserts may duplicate a bucket's row, reads always sum them
+    fakultas = models.CharField(max_length=8, blank=True)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, null=True, blank=True)
+    month = models.DateField()
+    status = models.CharField(max_length=8)
+    items = models.IntegerField(default=0)
+    readers = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fakultas", "event", "month", "status"], name="rollup_bucket_idx"),
+        ]
+
+    @staticmethod
+    def bucket(fakultas, event_id, upload_date, status):
+        month = timezone.localtime(upload_date).date().replace(day=1)
+        return fakultas, event_id, month, status
+
+    @staticmethod
+    def add(deltas, entry, sign=1):
+        # Count an item's (bucket, reader_count) entry in or out of deltas
+        bucket, reader_count = entry
+        delta = deltas.setdefault(bucket, [0, 0])
+        delta[0] += sign
+        delta[1] += sign * reader_count
+
+    @classmethod
+    def apply(cls, deltas):
+        # Apply {bucket: [items, readers]} with one UPDATE per changed bucket
+        for (fakultas, event_id, month, status), (items, readers) in deltas.items():
+            if not items and not readers:
+                continue
+            updated = cls.objects.filter(
+                fakultas=fakultas, event_id=event_id, month=month, status=status
+            ).update(items=F("items") + items, readers=F("readers") + readers)
+            if not updated:
+                cls.objects.create(
+                    fakultas=fakultas,
+                    event_id=event_id,
+                    month=month,
+                    status=status,
+                    items=items,
+                    readers=readers,
+                )
+
+    @classmethod
+    def move(cls, previous, current):
+        # An item changed from the previous entry to the current one, either
+        # may be None when it was created or deleted
+        if previous == current:
+            return
+        deltas = {}
+        if previous is not None:
+            cls.add(deltas, previous, -1)
+        if current is not None:
+            cls.add(deltas, current)
+        cls.apply(deltas)
+
+    @classmethod
+    def rebuild(cls):
+        # Recount every bucket from the items, for rollups that drifted from
+        # bulk updates or cascading deletes. The months are found here like
+        # in bucket(), TruncMonth needs the time zone tables on MySQL
+        with transaction.atomic():
+            deltas = {}
+            rows = MediaItem.objects.values_list(
+                "fakultas", "event_id", "upload_date", "status", "reader_count"
+            ).order_by()
+            for fakultas, event_id, upload_date, status, reader_count in rows.iterator(chunk_size=2000):
+                cls.add(deltas, (cls.bucket(fakultas, event_id, upload_date, status), reader_count))
+
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        fakultas=fakultas,
+                        event_id=event_id,
+                        month=month,
+                        status=status,
+                        items=items,
+                        readers=readers,
+                    )
+                    for (fakultas, event_id, month, status), (items, readers) in deltas.items()
+                ],
+                batch_size=500,
+            )
+
+
+class SearchDocument(models.Model):
+    # Denormalized, pre-tokenized text of a MediaItem backing full-text search
+    media_item = models.OneToOneField(
+        MediaItem,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    content = models.TextField()
+
+    def __str__(self):
+        return self.media_item.title
+
+
+class UploadSession(models.Model):
+    # A resumable upload whose chunks are appended to a partial file on disk
+    UPLOADING = "uploading"
+    COMPLETE = "complete"
+
+    STATUS_CHOICES = [
+        (UPLOADING, "Uploading"),
+        (COMPLETE, "Complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # SHA-256 hex digest of the whole file, checked on completion
+    checksum = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0, editable=False)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=UPLOADING, editable=False)
+    file = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    @property
+    def partial_path(self):
+        return os.path.join(settings.UPLOAD_PARTIAL_ROOT, f"{self.id}.part")
+
+    def __str__(self):
+        return self.filename
+
+
+class ResourceVersion(models.Model):
+    # Version and last modification of a kind of resource, bumped on every
+    # write so read views can answer conditional requests from one lookup
+    MEDIA_ITEMS = "media_items"
+    EVENTS = "events"
+    CATEGORIES = "categories"
+    TAGS = "tags"
+
+    key = models.CharField(max_length=32, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+    @classmethod
+    def bump(cls, *keys):
+        now = timezone.now()
+        updated = cls.objects.filter(key__in=keys).update(
+            version=F("version") + 1, modified=now
+        )
+        if updated < len(keys):
+            for key in keys:
+                cls.objects.get_or_create(key=key, defaults={"version": 1, "modified": now})
+
+        # Again once committed, in case a concurrent request cached the old
+        # rows in between
+        invalidate_responses()
+        transaction.on_commit(invalidate_responses)
+
+    @classmethod
+    def get_many(cls, keys):
+        return {
+            key: (version, modified)
+            for key, version, modified in cls.objects.filter(key__in=keys).values_list(
+                "key", "version", "modified"
+            )
+        }
+
+    @classmethod
+    async def aget_many(cls, keys):
+        return {
+            key: (version, modified)
+            async for key, version, modified in cls.objects.filter(key__in=keys).values_list(
+                "key", "version", "modified"
+            )
+        }
+
+
+class Task(models.Model):
+    # A call of a function decorated with tasks.task(), queued in the database
+    # and run by the run_tasks worker command
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    # Dotted path of the function
+    name = models.CharField(max_length=255)
+    # Positional arguments, JSON serializable
+    args = models.JSONField(default=list)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Not run before, pushed back between retries
+    run_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, blank=True)
+    # Updated by the worker while running it, see tasks.heartbeat()
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "-priority", "run_at", "id"], name="task_claim_idx"),
+            models.Index(fields=["status", "name"], name="task_status_name_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}({', '.join(map(repr, self.args))})"
@@ -0,0 +1,120 @@
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class MediaItemCursorPagination(BasePagination):
+    # Keyset pagination over (upload_date, id), or (reader_count, id) when the
+    # feed is sorted by reader, so every page is a single indexed range scan
+    # no matter how deep the client has scrolled
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = 20
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_active(self, request):
+        # Keep returning the whole (optionally limited) list to clients that
+        # did not ask for a page
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_ordering_field(self, request):
+        if request.query_params.get("sort_by_reader", False):
+            return "reader_count"
+        return "upload_date"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_active(request):
+            return None
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        # Like paginate_queryset(), with the async ORM for async views
+        if not self.is_active(request):
+            return None
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.ordering_field = self.get_ordering_field(request)
+        self.requested_page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f"-{self.ordering_field}", "-id")
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f"{self.ordering_field}__lt": value})
+                | Q(**{self.ordering_field: value, "id__lt": pk})
+            )
+
+        # Fetch one extra row to know whether there is a next page
+        return queryset[: self.requested_page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.requested_page_size
+        self.page = results[: self.requested_page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        # Pages are model instances, or values() rows
+        last = self.page[-1]
+        if isinstance(last, dict):
+            value, pk = last[self.ordering_field], last["id"]
+        else:
+            value, pk = getattr(last, self.ordering_field), last.id
+        if self.ordering_field == "upload_date":
+            value = value.isoformat()
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(value, pk)
+        )
+
+    def encode_cursor(self, value, pk):
+        payload = json.dumps([value, pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            pk = int(pk)
+            if self.ordering_field == "upload_date":
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError
+            else:
+                value = int(value)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return value, pk
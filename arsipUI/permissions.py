@@ -1,4 +1,6 @@
 from rest_framework import permissions
+from users.authentication import get_user_type
+from users.models import UserProfile
 
 
 class IsContributorOrReadOnly(permissions.BasePermission):
@@ -8,11 +10,7 @@ class IsContributorOrReadOnly(permissions.BasePermission):
             return True
 
         # Check if the user making the request is the contributor of the media item
-        return (
-            request.user
-            and request.user.is_authenticated
-            and request.user.userprofile.user_type == "contributor"
-        )
+        return get_user_type(request.user) == UserProfile.CONTRIBUTOR
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -21,23 +19,15 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
 
         # Check if the user making the request is the contributor of the media item
-        print(obj)
         return (
-            request.user
-            and request.user.is_authenticated
-            and request.user.userprofile.user_type == "contributor"
-            and obj.contributor == request.user
+            get_user_type(request.user) == UserProfile.CONTRIBUTOR
+            and obj.contributor_id == request.user.id
         )
 
 class IsObjectVerificator(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        object_verificator = obj.verificator
-        user = request.user
-
         # Check if the user making the request is the verificator of the media item
         return (
-            user
-            and user.is_authenticated
-            and user.userprofile.user_type == "verificator"
-            and user.id == object_verificator.id
-        )
\ No newline at end of file
+            get_user_type(request.user) == UserProfile.VERIFICATOR
+            and obj.verificator_id == request.user.id
+        )
@@ -0,0 +1,23 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    # Optional, several times faster than the json module on large lists
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Renders with orjson when it is installed, falling back to DRF's
+    # renderer for indented output or when it is missing
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Types orjson does not know (lazy strings, querysets...) are
+        # converted like DRF's encoder does
+        return orjson.dumps(data, default=JSONEncoder().default)
@@ -0,0 +1,157 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+GENERATION_KEY = "arsip:response-cache:generation"
+HITS_KEY = "arsip:response-cache:hits"
+MISSES_KEY = "arsip:response-cache:misses"
+
+# Query parameters MediaItemList's output depends on, anything else shares
+# the same entry
+CACHED_PARAMS = [
+    "status", "sort_by_reader", "limit", "search", "cursor", "page_size", "fields", "expand",
+]
+
+
+def get_cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def is_enabled():
+    # The generation must be shared by every process that writes, the web
+    # workers and the task workers, or they would miss each other's
+    # invalidations. Off on per-process caches unless RESPONSE_CACHE_ENABLED
+    # says otherwise, e.g. for a single process in development
+    enabled = getattr(settings, "RESPONSE_CACHE_ENABLED", None)
+    if enabled is None:
+        return not isinstance(get_cache(), (LocMemCache, DummyCache))
+    return enabled
+
+
+def get_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Never restart from a number an evicted generation may have used
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def invalidate():
+    # Every write to the archive starts a new generation, orphaning the cached
+    # responses of the previous ones until they expire
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def normalize_params(query_params):
+    params = []
+    for name in CACHED_PARAMS:
+        value = query_params.get(name, "").strip()
+        if name == "search":
+            value = " ".join(value.lower().split())
+        elif name == "sort_by_reader":
+            value = "1" if value else ""
+        elif name in ("fields", "expand"):
+            # Serialized in declaration order whatever order they are asked in,
+            # and even empty they switch to the compact representation
+            if name in query_params:
+                names = {field.strip() for field in value.split(",")} - {""}
+                params.append((name, ",".join(sorted(names))))
+            continue
+        if value:
+            params.append((name, value))
+    return params
+
+
+def get_key(request, generation):
+    # Responses contain absolute URLs, so the host and path are part of the key
+    parts = [
+        request.scheme,
+        request.get_host(),
+        request.path,
+        urlencode(normalize_params(request.query_params)),
+    ]
+    digest = hashlib.sha1("|".join(parts).encode()).hexdigest()
+    return f"arsip:response-cache:{generation}:{digest}"
+
+
+def count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def lookup(request):
+    if not is_enabled():
+        return None
+    cache = get_cache()
+    data = cache.get(get_key(request, get_generation(cache)))
+    count(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def store(request, data):
+    if not is_enabled():
+        return
+    cache = get_cache()
+    timeout = getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+    cache.set(get_key(request, get_generation(cache)), data, timeout)
+
+
+async def aget_generation(cache):
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_KEY, time.time_ns(), None)
+        generation = await cache.aget(GENERATION_KEY)
+    return generation
+
+
+async def acount(key):
+    cache = get_cache()
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, None):
+            await cache.aincr(key)
+
+
+async def alookup(request):
+    # lookup() and store() for async views
+    if not is_enabled():
+        return None
+    cache = get_cache()
+    data = await cache.aget(get_key(request, await aget_generation(cache)))
+    await acount(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+async def astore(request, data):
+    if not is_enabled():
+        return
+    cache = get_cache()
+    timeout = getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+    await cache.aset(get_key(request, await aget_generation(cache)), data, timeout)
+
+
+def get_metrics():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
@@ -0,0 +1,165 @@
+import re
+import unicodedata
+from django.db import connection
+from django.db.models import Value
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.settings import api_settings
+from .models import MediaItem, ResourceVersion, SearchDocument
+from .tasks import task
+
+
+# Indonesian function words that only add noise to the index
+STOPWORDS = {
+    "ada", "adalah", "agar", "akan", "antara", "atau", "bagi", "bahwa",
+    "dalam", "dan", "dari", "dengan", "di", "hingga", "ini", "itu", "juga",
+    "karena", "ke", "kepada", "oleh", "pada", "para", "saat", "sampai",
+    "sebagai", "secara", "serta", "sudah", "telah", "tersebut", "tidak",
+    "untuk", "yang",
+}
+
+# Inflectional suffixes, removed in the same order as the first steps of the
+# Nazief-Adriani stemmer: particles, then possessive pronouns
+PARTICLES = ("lah", "kah", "tah", "pun")
+POSSESSIVES = ("nya", "ku", "mu")
+MIN_STEM_LENGTH = 3
+
+# InnoDB ignores shorter words (innodb_ft_min_token_size)
+MYSQL_MIN_TOKEN_LENGTH = 3
+
+
+def normalize(text):
+    # Lowercase and strip accents so "Café" and "cafe" index the same
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return text.lower()
+
+
+def stem(token):
+    for suffixes in (PARTICLES, POSSESSIVES):
+        for suffix in suffixes:
+            if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+                token = token[: -len(suffix)]
+                break
+    return token
+
+
+def tokenize(text):
+    tokens = re.findall(r"[0-9a-z]+", normalize(text))
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+def build_document(media_item):
+    parts = [
+        media_item.title,
+        media_item.description,
+        media_item.tag_names,
+        media_item.event_name,
+        media_item.event_date or "",
+    ]
+    parts += [tag.name for tag in media_item.tags.all()]
+    if media_item.event_id:
+        event = media_item.event
+        parts += [event.name, event.date, event.category.name]
+
+    # Index both the surface form and the stem, queries are matched by the
+    # stem as a prefix so "buku", "bukunya" and "bukulah" find each other
+    words = []
+    for token in tokenize(" ".join(str(part) for part in parts)):
+        words.append(token)
+        stemmed = stem(token)
+        if stemmed != token:
+            words.append(stemmed)
+
+    return " ".join(words)
+
+
+def refresh_documents(queryset):
+    # Rebuild the search documents of many MediaItems with bulk writes
+    media_items = list(
+        queryset.select_related("event__category").prefetch_related("tags")
+    )
+    if not media_items:
+        return 0
+
+    SearchDocument.objects.filter(media_item__in=media_items).delete()
+    SearchDocument.objects.bulk_create(
+        [
+            SearchDocument(media_item=media_item, content=build_document(media_item))
+            for media_item in media_items
+        ]
+    )
+
+    return len(media_items)
+
+
+@task(priority=5)
+def refresh_related_documents(field, value):
+    # Refresh the documents of the items of an edited tag or event on the task
+    # workers, there may be thousands of them
+    if field not in ("tags", "event"):
+        raise ValueError(f"Unknown relation {field!r}")
+    if refresh_documents(MediaItem.objects.filter(**{field: value})):
+        # Cached search results may predate the new documents
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+
+
+def search_queryset(queryset, query):
+    # Filter a MediaItem queryset to the items matching every word of the
+    # query, annotated with a relevance score as "search_rank"
+    terms = [stem(token) for token in tokenize(query)]
+    if not terms:
+        return queryset
+
+    quote_name = connection.ops.quote_name
+    document_table = quote_name(SearchDocument._meta.db_table)
+    item_id = f"{quote_name(queryset.model._meta.db_table)}.{quote_name('id')}"
+
+    if connection.vendor == "mysql":
+        terms = [term for term in terms if len(term) >= MYSQL_MIN_TOKEN_LENGTH]
+        if not terms:
+            return queryset
+
+        match = " ".join(f"+{term}*" for term in terms)
+        against = "MATCH (content) AGAINST (%s IN BOOLEAN MODE)"
+        matches = RawSQL(
+            f"SELECT media_item_id FROM {document_table} WHERE {against}", (match,)
+        )
+        rank = RawSQL(
+            f"SELECT {against} FROM {document_table} "
+            f"WHERE {document_table}.media_item_id = {item_id}",
+            (match,),
+        )
+    elif connection.vendor == "sqlite":
+        index_table = quote_name(f"{SearchDocument._meta.db_table}_fts")
+        match = " ".join(f'"{term}"*' for term in terms)
+        matches = RawSQL(
+            f"SELECT rowid FROM {index_table} WHERE {index_table} MATCH %s", (match,)
+        )
+        rank = RawSQL(
+            f"SELECT -bm25({index_table}) FROM {index_table} "
+            f"WHERE {index_table} MATCH %s AND rowid = {item_id}",
+            (match,),
+        )
+    else:
+        # No full-text index on other backends, scan the documents instead
+        for term in terms:
+            queryset = queryset.filter(search_document__content__icontains=term)
+        return queryset.annotate(search_rank=Value(1.0))
+
+    return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+class MediaItemSearchFilter(filters.BaseFilterBackend):
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        searched = search_queryset(queryset, query)
+        if searched is queryset:
+            return queryset
+
+        # Most relevant first, unless the client asked for a specific sort
+        if request.query_params.get("sort_by_reader", False):
+            return searched
+        return searched.order_by("-search_rank", *queryset.query.order_by)
@@ -1,6 +1,12 @@
+import os
+import re
 import markdown
+from django.conf import settings
+from django.db.models import QuerySet
 from rest_framework import serializers
-from .models import MediaItem, Tag, Event, Event_Category, File
+from .models import MediaItem, MediaItemQuerySet, Tag, Event, Event_Category, File, UploadSession
+from .derivatives import schedule_derivatives
+from .transcoding import schedule_transcode
 from users.serializers import UserSerializer
 
 
@@ -23,7 +29,10 @@ class EventSerializer(serializers.ModelSerializer):
 class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
-        fields = ['file', 'file_type', 'id']
+        fields = [
+            'file', 'file_type', 'id', 'thumbnail', 'preview',
+            'rendition', 'poster', 'duration', 'transcode_status',
+        ]
 
 class MediaItemReadSerializer(serializers.ModelSerializer):
     event = EventSerializer()
@@ -34,6 +43,10 @@ class MediaItemReadSerializer(serializers.ModelSerializer):
     formatted_content = serializers.SerializerMethodField()
     
     def get_formatted_content(self, instance):
+        # Rows saved before formatted_content existed are rendered on the fly
+        # until the render_formatted_content command has backfilled them
+        if instance.formatted_content or not instance.description:
+            return instance.formatted_content
         return markdown.markdown(instance.description)
 
     class Meta:
@@ -55,6 +68,200 @@ class MediaItemReadSerializer(serializers.ModelSerializer):
             'verificator',
             ]
 
+class MediaItemCompactSerializer(serializers.ModelSerializer):
+    # Feed cards: the fields picked with ?fields= (DEFAULT_FIELDS otherwise),
+    # with relations as ids unless they are listed in ?expand=
+    DEFAULT_FIELDS = ['id', 'title', 'upload_date', 'status', 'reader_count', 'thumbnail', 'event']
+    EXPANDABLE_FIELDS = {
+        'event': lambda: EventSerializer(),
+        'tags': lambda: TagSerializer(many=True),
+        'file_paths': lambda: FileSerializer(many=True),
+        'contributor': lambda: UserSerializer(),
+        'verificator': lambda: UserSerializer(),
+    }
+
+    formatted_content = serializers.SerializerMethodField()
+    # First preview thumbnail of the item, or None
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MediaItem
+        fields = MediaItemReadSerializer.Meta.fields + ['thumbnail']
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in expand:
+            self.fields[name] = self.EXPANDABLE_FIELDS[name]()
+        for name in set(self.fields) - set(fields or self.DEFAULT_FIELDS):
+            self.fields.pop(name)
+
+    get_formatted_content = MediaItemReadSerializer.get_formatted_content
+
+    def get_thumbnail(self, instance):
+        for file in instance.file_paths.all():
+            if file.thumbnail:
+                request = self.context.get('request')
+                url = file.thumbnail.url
+                return request.build_absolute_uri(url) if request else url
+        return None
+
+class MediaItemRowSerializer:
+    # Builds exactly what MediaItemReadSerializer(many=True) outputs, from
+    # values() rows and two batched queries for tags and files, without the
+    # per-field serializer machinery. Used for large lists
+    COLUMNS = [
+        'id', 'title', 'description', 'fakultas', 'formatted_content', 'upload_date',
+        'status', 'reject_reason', 'reader_count',
+        'event_id', 'event__name', 'event__date', 'event__description',
+        'event__category_id', 'event__category__name',
+        'contributor_id', 'verificator_id',
+        *[f'{relation}__{field}' for relation in ('contributor', 'verificator')
+          for field in UserSerializer.Meta.fields if field != 'id'],
+    ]
+    USER_FIELDS = [field for field in UserSerializer.Meta.fields if field != 'id']
+
+    datetime_field = serializers.DateTimeField()
+    date_field = serializers.DateField()
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def get_rows(cls, queryset):
+        return queryset.prefetch_related(None).values(*cls.COLUMNS)
+
+    def file_url(self, name):
+        if not name:
+            return None
+        url = self.storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    @staticmethod
+    def get_tag_rows(ids):
+        return (
+            MediaItem.tags.through.objects.filter(mediaitem_id__in=ids)
+            .order_by('tag_id')
+            .values_list('mediaitem_id', 'tag_id', 'tag__name')
+        )
+
+    @staticmethod
+    def get_file_rows(ids):
+        return (
+            MediaItem.file_paths.through.objects.filter(mediaitem_id__in=ids)
+            .order_by('file_id')
+            .values_list(
+                'mediaitem_id', 'file_id', 'file__file', 'file__file_type',
+                'file__thumbnail', 'file__preview', 'file__rendition', 'file__poster',
+                'file__duration', 'file__transcode_status',
+            )
+        )
+
+    def get_tags(self, ids, rows):
+        tags = {media_item_id: [] for media_item_id in ids}
+        for media_item_id, tag_id, name in rows:
+            tags[media_item_id].append({'id': tag_id, 'name': name})
+        return tags
+
+    def get_files(self, ids, rows):
+        files = {media_item_id: [] for media_item_id in ids}
+        for (
+            media_item_id, file_id, name, file_type, thumbnail, preview,
+            rendition, poster, duration, transcode_status,
+        ) in rows:
+            files[media_item_id].append({
+                'file': self.file_url(name),
+                'file_type': file_type,
+                'id': file_id,
+                'thumbnail': self.file_url(thumbnail),
+                'preview': self.file_url(preview),
+                'rendition': self.file_url(rendition),
+                'poster': self.file_url(poster),
+                'duration': duration,
+                'transcode_status': transcode_status,
+            })
+        return files
+
+    def get_user(self, row, relation):
+        user_id = row[f'{relation}_id']
+        if user_id is None:
+            return None
+        user = {'id': user_id}
+        for field in self.USER_FIELDS:
+            user[field] = row[f'{relation}__{field}']
+        return user
+
+    def get_event(self, row):
+        if row['event_id'] is None:
+            return None
+        return {
+            'id': row['event_id'],
+            'category': {
+                'id': row['event__category_id'],
+                'name': row['event__category__name'],
+            },
+            'name': row['event__name'],
+            'date': self.date_field.to_representation(row['event__date']),
+            'description': row['event__description'],
+        }
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        ids = [row['id'] for row in rows]
+        if not ids:
+            return []
+        return self.build(
+            rows, ids, list(self.get_tag_rows(ids)), list(self.get_file_rows(ids))
+        )
+
+    async def adata(self):
+        # Like data, with the async ORM for async views
+        if isinstance(self.rows, QuerySet):
+            rows = [row async for row in self.rows]
+        else:
+            rows = list(self.rows)
+        ids = [row['id'] for row in rows]
+        if not ids:
+            return []
+        return self.build(
+            rows,
+            ids,
+            [row async for row in self.get_tag_rows(ids)],
+            [row async for row in self.get_file_rows(ids)],
+        )
+
+    def build(self, rows, ids, tag_rows, file_rows):
+        self.storage = File._meta.get_field('file').storage
+        tags = self.get_tags(ids, tag_rows)
+        files = self.get_files(ids, file_rows)
+
+        data = []
+        for row in rows:
+            formatted_content = row['formatted_content']
+            if not formatted_content and row['description']:
+                formatted_content = markdown.markdown(row['description'])
+
+            data.append({
+                'id': row['id'],
+                'title': row['title'],
+                'description': row['description'],
+                'fakultas': row['fakultas'],
+                'formatted_content': formatted_content,
+                'upload_date': self.datetime_field.to_representation(row['upload_date']),
+                'event': self.get_event(row),
+                'file_paths': files[row['id']],
+                'tags': tags[row['id']],
+                'status': row['status'],
+                'reject_reason': row['reject_reason'],
+                'reader_count': row['reader_count'],
+                'contributor': self.get_user(row, 'contributor'),
+                'verificator': self.get_user(row, 'verificator'),
+            })
+        return data
+
 class MediaItemSerializer(serializers.ModelSerializer):
     file_paths = serializers.ListField(child=serializers.FileField(max_length=None), write_only=True, required=False)
     class Meta:
@@ -62,20 +269,84 @@ class MediaItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def create(self, validated_data):
-        file_paths_data = validated_data.pop('file_paths')
+        # Files may also be attached afterwards through a chunked upload
+        file_paths_data = validated_data.pop('file_paths', [])
+        # save() already applied tag_names, unless a "tags" list overrode them
+        sync_tags = 'tags' in validated_data
             
         instance = super().create(validated_data)
-        instance.handle_tags()
+        if sync_tags:
+            instance.handle_tags()
         
         for file_path in file_paths_data:
             file_instance = File.objects.create()
             instance.file_paths.add(file_instance)
             file_instance.file = file_path
             file_instance.save()
+            schedule_derivatives(file_instance)
+            schedule_transcode(file_instance)
 
         return instance
 
     def update(self, instance, validated_data):
+        sync_tags = 'tags' in validated_data
         instance = super().update(instance, validated_data)
-        instance.handle_tags()
+        # save() skips empty tag_names, which must still clear the tags
+        if sync_tags or not instance.tag_names:
+            instance.handle_tags()
         return instance
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    file = FileSerializer(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'checksum', 'offset', 'status', 'file']
+
+    def validate_filename(self, value):
+        # Only the name is used, without the client's directories
+        name = os.path.basename(value.replace("\\", "/")).strip()
+        if name in ("", ".", ".."):
+            raise serializers.ValidationError("Not a file name.")
+        return name
+
+    def validate_checksum(self, value):
+        if not re.fullmatch(r"[0-9a-fA-F]{64}", value):
+            raise serializers.ValidationError("Expected a SHA-256 hex digest.")
+        return value.lower()
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("File is empty.")
+        return value
+
+
+class UploadChunkSerializer(serializers.Serializer):
+    offset = serializers.IntegerField(min_value=0)
+    chunk = serializers.FileField(allow_empty_file=False)
+    # Optional SHA-256 hex digest of the chunk
+    checksum = serializers.CharField(required=False, max_length=64)
+
+    def validate_chunk(self, value):
+        if value.size > settings.UPLOAD_CHUNK_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes."
+            )
+        return value
+
+
+class UploadCompleteSerializer(serializers.Serializer):
+    media_item = serializers.PrimaryKeyRelatedField(queryset=MediaItem.objects.all())
+
+
+class MediaItemModerationSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500
+    )
+    action = serializers.ChoiceField(choices=MediaItemQuerySet.MODERATION_ACTIONS)
+    reject_reason = serializers.CharField(required=False, allow_blank=True, default="")
+
+    def validate_ids(self, value):
+        # Keep the order the client sent, once per item
+        return list(dict.fromkeys(value))
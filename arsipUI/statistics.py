@@ -0,0 +1,82 @@
+from collections import defaultdict
+from django.db.models import Sum
+from .models import MediaItem, MediaItemRollup
+
+TOP_READ_LIMIT = 10
+
+
+def get_rollup_rows():
+    # The whole rollup table summed per bucket, with the event's category.
+    # Its size depends on the number of fakultas, events and months, not on
+    # the number of items
+    return (
+        MediaItemRollup.objects.values(
+            "fakultas", "event__category_id", "event__category__name", "month", "status"
+        )
+        .annotate(items=Sum("items"), readers=Sum("readers"))
+        .order_by()
+    )
+
+
+def get_top_read(limit=TOP_READ_LIMIT):
+    # Walks mediaitem_status_reader_idx, so only reads the first rows
+    return list(
+        MediaItem.objects.filter(status=MediaItem.APPROVED)
+        .order_by("-reader_count", "-id")
+        .values("id", "title", "fakultas", "reader_count")[:limit]
+    )
+
+
+def build_statistics():
+    # Counts per status over every item, and per fakultas, event category and
+    # upload month over the approved items the archive shows
+    fakultas_labels = dict(MediaItem.FAKULTAS_CHOICES)
+    # In the order of the choices, items without one last
+    fakultas_order = {fakultas: i for i, fakultas in enumerate(fakultas_labels)}
+    by_status = {status: {"items": 0, "readers": 0} for status, label in MediaItem.STATUS_CHOICES}
+    by_fakultas = defaultdict(lambda: {"items": 0, "readers": 0})
+    by_category = defaultdict(lambda: {"items": 0, "readers": 0})
+    by_month = defaultdict(lambda: {"items": 0, "readers": 0})
+
+    for row in get_rollup_rows():
+        items, readers = row["items"] or 0, row["readers"] or 0
+        if not items:
+            continue
+        totals = by_status.setdefault(row["status"], {"items": 0, "readers": 0})
+        totals["items"] += items
+        totals["readers"] += readers
+        if row["status"] != MediaItem.APPROVED:
+            continue
+        for totals in (
+            by_fakultas[row["fakultas"]],
+            by_category[(row["event__category_id"], row["event__category__name"])],
+            by_month[row["month"]],
+        ):
+            totals["items"] += items
+            totals["readers"] += readers
+
+    approved = by_status[MediaItem.APPROVED]
+    return {
+        "total": approved["items"],
+        "readers": approved["readers"],
+        "status": [
+            {"value": status, **totals} for status, totals in by_status.items()
+        ],
+        "fakultas": [
+            {"value": fakultas, "label": fakultas_labels.get(fakultas, ""), **totals}
+            for fakultas, totals in sorted(
+                by_fakultas.items(), key=lambda entry: fakultas_order.get(entry[0], len(fakultas_order))
+            )
+        ],
+        "category": [
+            {"id": category_id, "name": name, **totals}
+            for (category_id, name), totals in sorted(
+                by_category.items(), key=lambda entry: (entry[0][0] is None, entry[0][0] or 0)
+            )
+        ],
+        "month": [
+            {"month": month.strftime("%Y-%m"), **totals}
+            for month, totals in sorted(by_month.items())
+        ],
+        "top_read": get_top_read(),
+    }
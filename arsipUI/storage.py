@@ -0,0 +1,112 @@
+import hashlib
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_DIR = "blobs"
+BLOB_NAME_RE = re.compile(rf"^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\.\w+)?$")
+
+
+def blob_name(checksum, ext):
+    # "blobs/ab/cd/abcd...ef.jpg", fanned out to keep directories small
+    return f"{BLOB_DIR}/{checksum[:2]}/{checksum[2:4]}/{checksum}{ext}"
+
+
+def checksum_from_name(name):
+    match = BLOB_NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    # Stores every file under the SHA-256 of its content, so the same photo
+    # uploaded to several MediaItems is written to disk once. The name asked
+    # for by upload_to only contributes its extension. Blobs are shared by
+    # File rows and removed by the gc_blobs command once nothing references
+    # them. Reusing a blob refreshes its modification time, so the command's
+    # grace period covers uploads that are not committed yet
+
+    def get_available_name(self, name, max_length=None):
+        # Names never collide, the final name is chosen from the content
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+
+        if hasattr(content, "temporary_file_path"):
+            # Already on disk, hash it unless its checksum is known, and move
+            # it into place
+            path = content.temporary_file_path()
+            checksum = getattr(content, "checksum", None) or self._hash_file(path)
+            return self._store(checksum, ext, path, temporary=False)
+
+        if not content.multiple_chunks():
+            # Small enough to hash in memory first, and skip the write entirely
+            # when the blob already exists
+            content.seek(0)
+            data = content.read()
+            checksum = hashlib.sha256(data).hexdigest()
+            name = blob_name(checksum, ext)
+            if not self._reuse(name):
+                with self._temporary_file() as temp:
+                    temp.write(data)
+                return self._store(checksum, ext, temp.name)
+            return name
+
+        # Stream it to a temporary file, hashing on the way
+        digest = hashlib.sha256()
+        with self._temporary_file() as temp:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temp.write(chunk)
+        return self._store(digest.hexdigest(), ext, temp.name)
+
+    @contextmanager
+    def _temporary_file(self):
+        # In the storage location, so moving it into place is a rename
+        temp_dir = os.path.join(self.location, BLOB_DIR, "tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+        temp = tempfile.NamedTemporaryFile(dir=temp_dir, delete=False)
+        try:
+            with temp:
+                yield temp
+        except BaseException:
+            os.remove(temp.name)
+            raise
+
+    def _hash_file(self, path, block_size=1024 * 1024):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _reuse(self, name):
+        # Whether the blob exists, touching it to keep gc_blobs away
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _store(self, checksum, ext, source_path, temporary=True):
+        name = blob_name(checksum, ext)
+        full_path = self.path(name)
+
+        if self._reuse(name):
+            # Same content is already stored
+            if temporary:
+                os.remove(source_path)
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file_move_safe(source_path, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+        return name
@@ -0,0 +1,262 @@
+import logging
+import math
+import os
+import socket
+import time
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Task
+
+
+logger = logging.getLogger(__name__)
+
+# Queued tasks looked at per claim, skipping those over their concurrency
+CLAIM_BATCH = 20
+
+
+def task(priority=0, max_attempts=3, retry_delay=10, concurrency=None, atomic=False):
+    # Lets a function run on the task workers with func.enqueue(*args), it
+    # can still be called directly. Failures are retried after retry_delay
+    # seconds, doubled per attempt. concurrency caps the calls running at
+    # once over all workers, either a number or a callable read when
+    # claiming, e.g. to follow a setting. The cap is best effort, two workers
+    # claiming at the same instant may both go over it. atomic tasks are
+    # marked done in the transaction of their work, for short database work
+    # that must not be applied twice
+    def decorator(func):
+        func.task_name = f"{func.__module__}.{func.__qualname__}"
+        func.task_options = {
+            "priority": priority,
+            "max_attempts": max_attempts,
+            "retry_delay": retry_delay,
+            "concurrency": concurrency,
+            "atomic": atomic,
+        }
+        func.enqueue = lambda *args, **options: enqueue(func, *args, **options)
+        return func
+
+    return decorator
+
+
+def enqueue(func, *args, priority=None, delay=0):
+    # Inserted in the current transaction, so workers only see the task once
+    # the data it works on is committed
+    options = func.task_options
+    now = timezone.now()
+    return Task.objects.create(
+        name=func.task_name,
+        args=list(args),
+        priority=options["priority"] if priority is None else priority,
+        max_attempts=options["max_attempts"],
+        run_at=now + timedelta(seconds=delay),
+        created=now,
+    )
+
+
+def get_function(name):
+    func = import_string(name)
+    if not hasattr(func, "task_options"):
+        raise ImportError(f"{name} is not a task")
+    return func
+
+
+def get_concurrency(name):
+    try:
+        concurrency = get_function(name).task_options["concurrency"]
+    except ImportError:
+        return None
+    return concurrency() if callable(concurrency) else concurrency
+
+
+def get_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker=None):
+    # Marks the most urgent runnable task as running and returns it, or None.
+    # The conditional UPDATE makes sure only one worker gets each task
+    now = timezone.now()
+    running = dict(
+        Task.objects.filter(status=Task.RUNNING)
+        .values_list("name")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    limits = {name: get_concurrency(name) for name in running}
+    full = [
+        name for name, count in running.items()
+        if limits[name] is not None and count >= limits[name]
+    ]
+
+    candidates = (
+        Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+        .exclude(name__in=full)
+        .order_by("-priority", "run_at", "id")
+        .values_list("id", "name")[:CLAIM_BATCH]
+    )
+    for task_id, name in candidates:
+        limit = get_concurrency(name)
+        if limit is not None and running.get(name, 0) >= limit:
+            continue
+        claimed = Task.objects.filter(id=task_id, status=Task.QUEUED).update(
+            status=Task.RUNNING,
+            attempts=F("attempts") + 1,
+            started=now,
+            heartbeat=now,
+            worker=worker or get_worker_name(),
+        )
+        if claimed:
+            return Task.objects.get(id=task_id)
+    return None
+
+
+def run(task):
+    # Runs a claimed task, queueing it again after a failure while it has
+    # attempts left. Returns whether it succeeded
+    start = time.monotonic()
+    try:
+        func = get_function(task.name)
+    except ImportError:
+        Task.objects.filter(id=task.id).update(
+            status=Task.FAILED, finished=timezone.now(), last_error=traceback.format_exc()
+        )
+        logger.error("Unknown task %s", task.name)
+        return False
+
+    # An atomic task requeued after its worker died can't have been applied
+    # already, nor be applied twice: when it was requeued while running, the
+    # work of this run is rolled back. Others, like transcoding, commit as
+    # they go and must not hold a transaction open for their whole run
+    atomic = func.task_options.get("atomic", False)
+    try:
+        with transaction.atomic() if atomic else nullcontext():
+            func(*task.args)
+            done = Task.objects.filter(
+                id=task.id, status=Task.RUNNING, attempts=task.attempts
+            ).update(status=Task.DONE, finished=timezone.now())
+            if atomic and not done:
+                transaction.set_rollback(True)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if task.attempts < task.max_attempts:
+            delay = func.task_options["retry_delay"] * 2 ** (task.attempts - 1)
+            Task.objects.filter(id=task.id).update(
+                status=Task.QUEUED, run_at=now + timedelta(seconds=delay), last_error=error
+            )
+            logger.warning("Task %s failed, retrying in %ss", task, delay, exc_info=True)
+        else:
+            Task.objects.filter(id=task.id).update(
+                status=Task.FAILED, finished=now, last_error=error
+            )
+            logger.error("Task %s failed %s times", task, task.attempts, exc_info=True)
+        return False
+
+    if not done:
+        logger.warning("Task %s was requeued while running, this run is not counted", task)
+        return False
+    logger.info("Task %s done in %.3fs", task, time.monotonic() - start)
+    return True
+
+
+def run_pending(worker=None):
+    # Runs runnable tasks until none are left, in this thread. For tests and
+    # run_tasks --burst
+    count = 0
+    while True:
+        task = claim(worker)
+        if task is None:
+            return count
+        run(task)
+        count += 1
+
+
+def heartbeat(worker):
+    # Tells requeue_stale that the running tasks of worker, or of its
+    # threads named worker:<n>, are still alive
+    return Task.objects.filter(
+        Q(worker=worker) | Q(worker__startswith=f"{worker}:"), status=Task.RUNNING
+    ).update(heartbeat=timezone.now())
+
+
+def requeue_stale(timeout=None):
+    # Tasks of workers that died while running them, found by their missed
+    # heartbeats. They count as an attempt, a task that keeps killing its
+    # worker ends up failed
+    timeout = timeout or getattr(settings, "TASK_HEARTBEAT_TIMEOUT", 5 * 60)
+    stale = Task.objects.filter(
+        status=Task.RUNNING, heartbeat__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Task.FAILED, finished=timezone.now(), last_error="Worker stopped while running it"
+    )
+    return failed + stale.update(status=Task.QUEUED)
+
+
+def purge_finished(retention=None):
+    # Finished tasks are kept for TASK_RETENTION seconds for the metrics
+    retention = retention or getattr(settings, "TASK_RETENTION", 7 * 24 * 60 * 60)
+    deleted, by_model = Task.objects.filter(
+        status=Task.DONE, finished__lt=timezone.now() - timedelta(seconds=retention)
+    ).delete()
+    return deleted
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, math.ceil(fraction * len(values)) - 1)]
+
+
+def get_metrics(window=3600, sample=1000):
+    # Queue depth and age of the oldest runnable task per function, and the
+    # wait (queued to started) and run times of the tasks finished within
+    # the last window seconds, in seconds
+    now = timezone.now()
+    metrics = {}
+
+    def entry(name):
+        return metrics.setdefault(name, {
+            Task.QUEUED: 0, Task.RUNNING: 0, Task.FAILED: 0,
+            "oldest": None, "done": 0, "wait_p50": None, "wait_p95": None,
+            "run_p50": None, "run_p95": None,
+        })
+
+    rows = (
+        Task.objects.exclude(status=Task.DONE)
+        .values_list("name", "status")
+        .annotate(count=Count("id"), oldest=Min("run_at"))
+        .order_by()
+    )
+    for name, status, count, oldest in rows:
+        entry(name)[status] = count
+        if status == Task.QUEUED:
+            entry(name)["oldest"] = max((now - oldest).total_seconds(), 0)
+
+    finished = (
+        Task.objects.filter(status=Task.DONE, finished__gte=now - timedelta(seconds=window))
+        .order_by("-finished")
+        .values_list("name", "created", "started", "finished")[:sample]
+    )
+    timings = {}
+    for name, created, started, finished_at in finished:
+        waits, runs = timings.setdefault(name, ([], []))
+        waits.append((started - created).total_seconds())
+        runs.append((finished_at - started).total_seconds())
+    for name, (waits, runs) in timings.items():
+        entry(name).update({
+            "done": len(runs),
+            "wait_p50": percentile(waits, 0.5),
+            "wait_p95": percentile(waits, 0.95),
+            "run_p50": percentile(runs, 0.5),
+            "run_p95": percentile(runs, 0.95),
+        })
+
+    return metrics
@@ -1,12 +1,41 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
 from PIL import Image
-from io import BytesIO
-from datetime import date
-from django.test import TestCase
+from io import BytesIO, StringIO
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework import status
-from rest_framework.test import APIClient
-from .models import MediaItem, Tag, Event, Event_Category
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from .counters import ReaderCounter, add_reader_counts, reader_counter
+from . import response_cache
+from .derivatives import generate_derivatives
+from .export import iter_records
+from .renderers import FastJSONRenderer
+from .serializers import MediaItemReadSerializer, MediaItemRowSerializer
+from .storage import ContentAddressedStorage, checksum_from_name
+from . import tasks
+from .tasks import claim, run, run_pending
+from . import transcoding
+from . import uploads
+from .models import MediaItem, MediaItemRollup, Tag, Event, Event_Category, File, SearchDocument, Task, UploadSession
 from users.tests import create_contributor, create_verificator
 
 
@@ -41,6 +70,28 @@ def dummy_image_data(string):
     return data
 
 
+def create_media_items(count, event, contributor, verificator, status=MediaItem.APPROVED):
+    media_items = []
+    for i in range(count):
+        media_item = MediaItem.objects.create(
+            title=f"Media Item {i}",
+            description="A test media item",
+            event=event,
+            tag_names=f"tag{i};shared",
+            contributor=contributor,
+        )
+        media_item.file_paths.add(
+            File.objects.create(file=f"img/1000/12/{i}.png", file_type="img"),
+            File.objects.create(file=f"doc/1000/12/{i}.pdf", file_type="doc"),
+        )
+        MediaItem.objects.filter(id=media_item.id).update(
+            status=status, verificator=verificator
+        )
+        media_items.append(media_item)
+
+    return media_items
+
+
 class MediaItemTests(TestCase):
     def setUp(self):
         # Create a test user
@@ -73,6 +124,7 @@ class MediaItemTests(TestCase):
         )
         # Create an API client
         self.client = APIClient()
+        reader_counter.reset()
 
     def test_media_item_detail(self):
         # Ensure that the media item detail endpoint returns the correct data
@@ -80,6 +132,8 @@ class MediaItemTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         # Check if the reader count has increased after retrieving the media item
+        reader_counter.flush()
+        run_pending()
         self.assertEqual(
             self.media_item.reader_count + 1,
             MediaItem.objects.get(id=self.media_item.id).reader_count,
@@ -205,3 +259,2122 @@ class MediaItemTests(TestCase):
         self.client.force_authenticate(user=self.verificator_user_alternate)      
         response = self.client.get(f'/arsip/{self.media_item.id}/cancel')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MediaItemQueryCountTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        self.client = APIClient()
+
+    def create_media_items(self, count, status=MediaItem.APPROVED):
+        return create_media_items(
+            count, self.event, self.contributor_user, self.verificator_user, status
+        )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url, expected):
+        # The number of queries must not grow with the number of rows
+        self.create_media_items(1)
+        self.assertEqual(self.count_queries(url), expected)
+        self.create_media_items(10)
+        self.assertEqual(self.count_queries(url), expected)
+
+    def test_media_item_list_query_count(self):
+        self.assert_constant_queries(reverse("media-list"), 4)
+
+    def test_media_item_list_filtered_query_count(self):
+        url = reverse("media-list") + "?status=approved&sort_by_reader=true&limit=5"
+        self.assert_constant_queries(url, 4)
+
+    def test_media_item_list_search_query_count(self):
+        self.assert_constant_queries(reverse("media-list") + "?search=shared", 4)
+
+    def test_authenticated_media_item_list_query_count(self):
+        self.client.force_authenticate(user=self.contributor_user)
+        self.assert_constant_queries(reverse("user-media-list"), 4)
+
+    def test_media_item_detail_query_count(self):
+        self.create_media_items(1)
+        media_item = MediaItem.objects.get()
+        reader_counter.reset()
+        with self.assertNumQueries(4):
+            self.client.get(reverse("media-detail", args=[media_item.id]))
+        reader_counter.reset()
+
+    def test_event_list_query_count(self):
+        self.create_media_items(1)
+        with self.assertNumQueries(2):
+            self.client.get(reverse("events-list"))
+
+
+class MediaItemPaginationTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        self.media_items = create_media_items(
+            7, self.event, self.contributor_user, None
+        )
+        self.client = APIClient()
+
+    def collect_pages(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+            pages += 1
+        return ids, pages
+
+    def test_unpaginated_list_is_unchanged(self):
+        response = self.client.get(reverse("media-list"))
+        self.assertEqual(len(response.data), 7)
+
+        response = self.client.get(reverse("media-list") + "?limit=3")
+        self.assertEqual(len(response.data), 3)
+
+    def test_cursor_pages_by_upload_date(self):
+        # Items sharing an upload_date are ordered by id and never repeated
+        MediaItem.objects.filter(id__in=[m.id for m in self.media_items[2:5]]).update(
+            upload_date=self.media_items[2].upload_date
+        )
+        expected = list(
+            MediaItem.objects.order_by("-upload_date", "-id").values_list("id", flat=True)
+        )
+
+        ids, pages = self.collect_pages(reverse("media-list") + "?page_size=2")
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_cursor_pages_by_reader_count(self):
+        for i, media_item in enumerate(self.media_items):
+            MediaItem.objects.filter(id=media_item.id).update(reader_count=i % 3)
+        expected = list(
+            MediaItem.objects.order_by("-reader_count", "-id").values_list("id", flat=True)
+        )
+
+        ids, pages = self.collect_pages(
+            reverse("media-list") + "?sort_by_reader=true&page_size=3"
+        )
+
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_deep_page_query_count(self):
+        url = reverse("media-list") + "?page_size=2"
+        while url:
+            # The resource versions lookup, the page and its prefetches
+            with self.assertNumQueries(4):
+                response = self.client.get(url)
+            url = response.data["next"]
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("media-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MediaItemSearchTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name="Wisuda Semester Genap",
+            date="2023-08-26",
+            category=Event_Category.objects.create(name="Upacara"),
+        )
+        self.client = APIClient()
+
+    def create_media_item(self, title, description="", tag_names=""):
+        return MediaItem.objects.create(
+            title=title,
+            description=description,
+            event=self.event,
+            tag_names=tag_names,
+        )
+
+    def search(self, query, **params):
+        params["search"] = query
+        response = self.client.get(reverse("media-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["title"] for item in response.data]
+
+    def test_search_title_description_and_tags(self):
+        self.create_media_item("Gedung Rektorat", "Foto udara kampus Depok")
+        self.create_media_item("Perpustakaan", "Ruang baca", tag_names="arsitektur;kampus")
+        self.create_media_item("Lomba Robot", "Tim Fasilkom")
+
+        self.assertEqual(self.search("rektorat"), ["Gedung Rektorat"])
+        self.assertEqual(self.search("arsitektur"), ["Perpustakaan"])
+        self.assertCountEqual(self.search("kampus"), ["Gedung Rektorat", "Perpustakaan"])
+        # Every word must match
+        self.assertEqual(self.search("kampus depok"), ["Gedung Rektorat"])
+
+    def test_search_event_fields(self):
+        self.create_media_item("Foto Bersama")
+
+        self.assertEqual(self.search("wisuda"), ["Foto Bersama"])
+        self.assertEqual(self.search("upacara"), ["Foto Bersama"])
+        self.assertEqual(self.search("2023"), ["Foto Bersama"])
+
+    def test_search_indonesian_suffixes_and_accents(self):
+        self.create_media_item("Peluncuran bukunya", "Kafé sastra")
+
+        self.assertEqual(self.search("buku"), ["Peluncuran bukunya"])
+        self.assertEqual(self.search("bukulah"), ["Peluncuran bukunya"])
+        self.assertEqual(self.search("kafe"), ["Peluncuran bukunya"])
+        # Stopwords alone do not filter anything out
+        self.assertEqual(self.search("yang dan"), ["Peluncuran bukunya"])
+
+    def test_search_ranks_and_does_not_duplicate(self):
+        self.create_media_item("Seminar", "Diskusi panel", tag_names="batik")
+        self.create_media_item("Pameran batik", "Batik tulis dan batik cap", tag_names="batik;batik tulis")
+
+        self.assertEqual(self.search("batik"), ["Pameran batik", "Seminar"])
+
+    def test_search_follows_updates(self):
+        media_item = self.create_media_item("Dies Natalis")
+        self.assertEqual(self.search("natalis"), ["Dies Natalis"])
+
+        media_item.title = "Malam Puncak"
+        media_item.save()
+        self.assertEqual(self.search("natalis"), [])
+        self.assertEqual(self.search("puncak"), ["Malam Puncak"])
+
+        # The event's items are refreshed on the task workers
+        self.event.name = "Konser Kebudayaan"
+        self.event.save()
+        self.assertEqual(self.search("konser"), [])
+        run_pending()
+        self.assertEqual(self.search("konser"), ["Malam Puncak"])
+
+    def test_rebuild_search_index(self):
+        self.create_media_item("Dies Natalis")
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.search("natalis"), [])
+
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("natalis"), ["Dies Natalis"])
+
+    def test_search_with_limit(self):
+        for i in range(3):
+            self.create_media_item(f"Kegiatan {i}")
+
+        response = self.client.get(reverse("media-list"), {"search": "kegiatan", "limit": 2})
+        self.assertEqual(len(response.data), 2)
+
+
+class ReaderCountTests(TestCase):
+    def setUp(self):
+        self.media_items = [
+            MediaItem.objects.create(title=f"Media Item {i}", description="")
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        reader_counter.reset()
+        cache.clear()
+
+    def tearDown(self):
+        reader_counter.reset()
+
+    def read(self, media_item):
+        response = self.client.get(reverse("media-detail", args=[media_item.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def reader_counts(self):
+        # Once the task workers wrote what was flushed
+        run_pending()
+        return [
+            MediaItem.objects.get(id=media_item.id).reader_count
+            for media_item in self.media_items
+        ]
+
+    def test_reads_are_buffered_until_flush(self):
+        response = self.read(self.media_items[0])
+        self.read(self.media_items[0])
+        self.read(self.media_items[1])
+
+        # The response counts the read, the database is untouched until flushed
+        self.assertEqual(response.data["reader_count"], 1)
+        self.assertEqual(self.reader_counts(), [0, 0, 0])
+
+        # The request thread only queues the counts
+        with self.assertNumQueries(1):
+            reader_counter.flush()
+        self.assertEqual(Task.objects.get().args, [[[self.media_items[0].id, 2], [self.media_items[1].id, 1]]])
+
+        # The worker runs one UPDATE per distinct increment, a read of their
+        # rollup buckets and one UPDATE per bucket in a savepoint, and marks
+        # the task done in the same transaction. The validators are left alone
+        task = claim()
+        with self.assertNumQueries(9):
+            run(task)
+        self.assertEqual(self.reader_counts(), [2, 1, 0])
+
+    @override_settings(READER_COUNT_FLUSH_SIZE=2)
+    def test_flush_when_buffer_is_full(self):
+        self.read(self.media_items[0])
+        self.assertEqual(self.reader_counts(), [0, 0, 0])
+
+        self.read(self.media_items[1])
+        self.assertEqual(self.reader_counts(), [1, 1, 0])
+
+    @override_settings(READER_COUNT_FLUSH_INTERVAL=0.05)
+    def test_flush_on_timer_and_exit(self):
+        # Without further reads, once started by a server
+        counter = ReaderCounter()
+        with mock.patch("arsipUI.counters.atexit.register") as register:
+            counter.start()
+        register.assert_called_once_with(counter.flush)
+        self.addCleanup(counter.reset)
+        flushed = threading.Event()
+        with mock.patch.object(add_reader_counts, "enqueue", side_effect=lambda counts: flushed.set()) as enqueue:
+            counter.increment(self.media_items[0].id)
+            counter.increment(self.media_items[0].id)
+            self.assertTrue(flushed.wait(5))
+        enqueue.assert_called_once_with([(self.media_items[0].id, 2)])
+        self.assertIsNone(counter.timer)
+
+    @override_settings(READER_COUNT_FLUSH_INTERVAL=0)
+    def test_flush_when_interval_elapsed(self):
+        self.read(self.media_items[2])
+        self.assertEqual(self.reader_counts(), [0, 0, 1])
+
+    @override_settings(READER_COUNT_DEDUP_WINDOW=60)
+    def test_repeated_reads_within_window(self):
+        self.read(self.media_items[0])
+        response = self.read(self.media_items[0])
+        self.read(self.media_items[1])
+
+        reader_counter.flush()
+        self.assertEqual(response.data["reader_count"], 0)
+        self.assertEqual(self.reader_counts(), [1, 1, 0])
+
+        # Another reader is counted
+        self.client.force_authenticate(user=create_contributor("reader", "password123"))
+        self.read(self.media_items[0])
+        reader_counter.flush()
+        self.assertEqual(self.reader_counts(), [2, 1, 0])
+
+
+class FormattedContentTests(TestCase):
+    def setUp(self):
+        self.media_item = MediaItem.objects.create(
+            title="Test Media Item", description="Some **bold** text"
+        )
+        self.client = APIClient()
+
+    def test_rendered_on_save(self):
+        self.assertEqual(
+            self.media_item.formatted_content, "<p>Some <strong>bold</strong> text</p>"
+        )
+
+        media_item = MediaItem.objects.get(id=self.media_item.id)
+        media_item.description = "*changed*"
+        media_item.save()
+        self.assertEqual(
+            MediaItem.objects.get(id=self.media_item.id).formatted_content,
+            "<p><em>changed</em></p>",
+        )
+
+    def test_not_rendered_when_description_unchanged(self):
+        media_item = MediaItem.objects.get(id=self.media_item.id)
+        media_item.title = "Renamed"
+        with mock.patch("arsipUI.models.markdown.markdown") as render:
+            media_item.save()
+        render.assert_not_called()
+
+    def test_list_does_not_render_markdown(self):
+        with mock.patch("markdown.markdown") as render:
+            response = self.client.get(reverse("media-list"))
+        render.assert_not_called()
+        self.assertEqual(
+            response.data[0]["formatted_content"],
+            "<p>Some <strong>bold</strong> text</p>",
+        )
+
+    def test_backfill_command(self):
+        MediaItem.objects.update(formatted_content="")
+
+        # Items not backfilled yet are still rendered when read
+        response = self.client.get(reverse("media-list"))
+        self.assertEqual(
+            response.data[0]["formatted_content"],
+            "<p>Some <strong>bold</strong> text</p>",
+        )
+
+        call_command("render_formatted_content", stdout=StringIO())
+        self.assertEqual(
+            MediaItem.objects.get(id=self.media_item.id).formatted_content,
+            "<p>Some <strong>bold</strong> text</p>",
+        )
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.other_contributor = create_contributor(
+            username="contributor2", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.other_verificator = create_verificator(
+            username="verificator2", password="password123"
+        )
+        event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        create_media_items(3, event, self.contributor_user, None, MediaItem.WAITLIST)
+        create_media_items(5, event, self.contributor_user, self.verificator_user)
+        create_media_items(
+            2, event, self.contributor_user, self.other_verificator, MediaItem.REJECTED
+        )
+        create_media_items(4, event, self.other_contributor, None, MediaItem.WAITLIST)
+        self.client = APIClient()
+
+    def titles(self, items):
+        return [item["title"] for item in items]
+
+    def test_contributor_dashboard(self):
+        self.client.force_authenticate(user=self.contributor_user)
+        response = self.client.get(reverse("user-media-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["counts"], {"waitlist": 3, "approved": 5, "rejected": 2}
+        )
+        self.assertEqual(len(response.data["waitlist"]), 3)
+        self.assertEqual(len(response.data["approved"]), 5)
+        self.assertEqual(len(response.data["rejected"]), 2)
+        self.assertTrue(
+            all(
+                item["contributor"]["id"] == self.contributor_user.id
+                for item in response.data["waitlist"]
+            )
+        )
+
+    def test_verificator_dashboard(self):
+        self.client.force_authenticate(user=self.verificator_user)
+        response = self.client.get(reverse("user-media-list"))
+
+        # Every waitlisted item, but only the items this verificator handled
+        self.assertEqual(
+            response.data["counts"], {"waitlist": 7, "approved": 5, "rejected": 0}
+        )
+        self.assertEqual(response.data["rejected"], [])
+
+    def test_anonymous_and_profileless_users(self):
+        response = self.client.get(reverse("user-media-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=User.objects.create_user("staff", password="password123"))
+        response = self.client.get(reverse("user-media-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["counts"], {"waitlist": 0, "approved": 0, "rejected": 0}
+        )
+        self.assertEqual(response.data["waitlist"] + response.data["rejected"], [])
+
+    def test_whole_lists_unless_paged(self):
+        event = Event.objects.get()
+        create_media_items(25, event, self.contributor_user, self.verificator_user)
+        self.client.force_authenticate(user=self.contributor_user)
+
+        # The counts, then the items with their relations
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("user-media-list"))
+        self.assertEqual(len(response.data["approved"]), 30)
+        self.assertEqual(response.data["counts"]["approved"], 30)
+        self.assertNotIn("pages", response.data)
+
+        response = self.client.get(reverse("user-media-list"), {"approved_page": 2})
+        self.assertEqual(len(response.data["approved"]), 10)
+        self.assertEqual(len(response.data["waitlist"]), 3)
+
+        # Searches are paged in their order
+        response = self.client.get(
+            reverse("user-media-list"), {"search": "shared", "page_size": 2}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["approved"]), 2)
+        self.assertEqual(response.data["counts"]["approved"], 30)
+
+    def test_buckets_are_paged_independently(self):
+        self.client.force_authenticate(user=self.contributor_user)
+        response = self.client.get(
+            reverse("user-media-list"), {"page_size": 2, "approved_page": 3}
+        )
+
+        expected_approved = list(
+            MediaItem.objects.filter(
+                contributor=self.contributor_user, status=MediaItem.APPROVED
+            )
+            .order_by("-upload_date")
+            .values_list("title", flat=True)
+        )
+        self.assertEqual(self.titles(response.data["approved"]), expected_approved[4:])
+        self.assertEqual(len(response.data["waitlist"]), 2)
+        self.assertEqual(len(response.data["rejected"]), 2)
+        self.assertEqual(
+            response.data["pages"],
+            {
+                "waitlist": {"page": 1, "num_pages": 2},
+                "approved": {"page": 3, "num_pages": 3},
+                "rejected": {"page": 1, "num_pages": 1},
+            },
+        )
+        self.assertEqual(response.data["counts"]["approved"], 5)
+
+
+class TagResolutionTests(TestCase):
+    def setUp(self):
+        Tag.objects.create(name="existing")
+        self.client = APIClient()
+
+    def test_resolve_in_bulk(self):
+        with self.assertNumQueries(3):
+            tags = Tag.objects.resolve(["existing", "new1", "new2"])
+
+        self.assertEqual([tag.name for tag in tags], ["existing", "new1", "new2"])
+        self.assertEqual(Tag.objects.count(), 3)
+
+        # Everything exists now, a single lookup
+        with self.assertNumQueries(1):
+            Tag.objects.resolve(["new2", "existing"])
+
+    def test_tag_names_are_normalized(self):
+        media_item = MediaItem.objects.create(
+            title="Test", description="", tag_names=" batik ;;Batik; kain   tenun;existing"
+        )
+
+        self.assertEqual(
+            sorted(media_item.tags.values_list("name", flat=True)),
+            ["batik", "existing", "kain tenun"],
+        )
+
+    def test_unchanged_tags_are_kept(self):
+        media_item = MediaItem.objects.create(
+            title="Test", description="", tag_names="a;b;c"
+        )
+        links = MediaItem.tags.through.objects.filter(mediaitem=media_item)
+        kept_ids = set(links.filter(tag__name__in=["a", "b"]).values_list("id", flat=True))
+
+        media_item.tag_names = "a;b;d"
+        media_item.save()
+
+        self.assertEqual(
+            sorted(media_item.tags.values_list("name", flat=True)), ["a", "b", "d"]
+        )
+        self.assertTrue(kept_ids <= set(links.values_list("id", flat=True)))
+
+    def test_write_queries_do_not_grow_with_tags(self):
+        def count_save_queries(tag_count):
+            media_item = MediaItem.objects.create(title="Test", description="")
+            media_item.tag_names = ";".join(f"tag{i}" for i in range(tag_count))
+            with CaptureQueriesContext(connection) as context:
+                media_item.save()
+            return len(context.captured_queries)
+
+        self.assertEqual(count_save_queries(2), count_save_queries(20))
+
+    def test_update_clears_tags(self):
+        user = create_contributor(username="contributor", password="password123")
+        media_item = MediaItem.objects.create(
+            title="Test", description="", tag_names="a;b", contributor=user
+        )
+        self.client.force_authenticate(user=user)
+
+        response = self.client.patch(
+            reverse("media-detail", args=[media_item.id]), {"tag_names": ""}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(media_item.tags.count(), 0)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_benchmark_command(self):
+        # Leaves the database and the shared cache as they were
+        Event_Category.objects.create(name="Benchmark")
+        cache.set("unrelated", 1)
+        generation = response_cache.get_generation(cache)
+
+        out = StringIO()
+        call_command("benchmark_tag_writes", tags=[1, 3], repeat=2, stdout=out)
+
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertEqual(MediaItem.objects.count(), 0)
+        self.assertEqual(cache.get("unrelated"), 1)
+        self.assertEqual(response_cache.get_generation(cache), generation)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=directory.name,
+            UPLOAD_PARTIAL_ROOT=os.path.join(directory.name, "partial"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.contributor_user)
+
+        data = dummy_image_data("test")
+        data.pop("file_paths")
+        response = self.client.post("/arsip/create", data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.media_item = MediaItem.objects.get(id=response.data["id"])
+
+        self.content = os.urandom(3000)
+        self.checksum = hashlib.sha256(self.content).hexdigest()
+
+    def start(self, **data):
+        data = {
+            "filename": "video.mp4",
+            "size": len(self.content),
+            "checksum": self.checksum,
+            **data,
+        }
+        response = self.client.post(reverse("upload-create"), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def append(self, upload_id, offset, data, checksum=None):
+        payload = {"offset": offset, "chunk": SimpleUploadedFile("chunk", data)}
+        if checksum:
+            payload["checksum"] = checksum
+        return self.client.post(reverse("upload-append", args=[upload_id]), payload)
+
+    def complete(self, upload_id):
+        return self.client.post(
+            reverse("upload-complete", args=[upload_id]),
+            {"media_item": self.media_item.id},
+        )
+
+    def test_upload_in_chunks(self):
+        upload_id = self.start()
+
+        for offset in range(0, len(self.content), 1024):
+            data = self.content[offset : offset + 1024]
+            response = self.append(
+                upload_id, offset, data, hashlib.sha256(data).hexdigest()
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["offset"], offset + len(data))
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["file_type"], "vid")
+
+        file_instance = self.media_item.file_paths.get()
+        self.assertEqual(file_instance.id, response.data["id"])
+        with file_instance.file.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+        session = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(session.status, UploadSession.COMPLETE)
+        self.assertFalse(os.path.exists(session.partial_path))
+
+    def test_resume_from_offset(self):
+        upload_id = self.start()
+        self.append(upload_id, 0, self.content[:1000])
+
+        # A retried chunk at a stale offset is refused with the current offset
+        response = self.append(upload_id, 0, self.content[:1000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 1000)
+
+        response = self.client.get(reverse("upload-detail", args=[upload_id]))
+        self.assertEqual(response.data["offset"], 1000)
+
+        self.append(upload_id, 1000, self.content[1000:])
+        self.assertEqual(self.complete(upload_id).status_code, status.HTTP_201_CREATED)
+
+    def test_chunk_checksum_mismatch(self):
+        upload_id = self.start()
+
+        response = self.append(upload_id, 0, self.content[:1000], "0" * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        session = UploadSession.objects.get(id=upload_id)
+        self.assertEqual(session.offset, 0)
+        self.assertEqual(os.path.getsize(session.partial_path), 0)
+
+    def test_file_checksum_mismatch(self):
+        upload_id = self.start(checksum="0" * 64)
+        self.append(upload_id, 0, self.content)
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.media_item.file_paths.count(), 0)
+
+    def test_incomplete_upload(self):
+        upload_id = self.start()
+        self.append(upload_id, 0, self.content[:1000])
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.append(upload_id, 1000, self.content[1000:] + b"extra")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_file_hashed_once_on_completion(self):
+        upload_id = self.start()
+        self.append(upload_id, 0, self.content)
+
+        # Verified, then filed by the same checksum without reading it again
+        with mock.patch("arsipUI.uploads.file_checksum", wraps=uploads.file_checksum) as checksum, \
+                mock.patch.object(ContentAddressedStorage, "_hash_file", side_effect=AssertionError):
+            self.assertEqual(self.complete(upload_id).status_code, status.HTTP_201_CREATED)
+        checksum.assert_called_once()
+        file_instance = UploadSession.objects.get(id=upload_id).file
+        self.assertEqual(checksum_from_name(file_instance.file.name), self.checksum)
+
+    def test_filename_is_sanitized(self):
+        upload_id = self.start(filename="a/../x.mp4")
+        self.assertEqual(UploadSession.objects.get(id=upload_id).filename, "x.mp4")
+        self.append(upload_id, 0, self.content)
+        self.assertEqual(self.complete(upload_id).status_code, status.HTTP_201_CREATED)
+
+        for filename in ("a/..", "dir/", " . "):
+            response = self.client.post(reverse("upload-create"), {
+                "filename": filename, "size": len(self.content), "checksum": self.checksum,
+            })
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, filename)
+
+    def test_uploads_are_private(self):
+        upload_id = self.start()
+
+        self.client.force_authenticate(
+            user=create_contributor(username="contributor2", password="password123")
+        )
+        response = self.client.get(reverse("upload-detail", args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_clean_abandoned_uploads(self):
+        upload_id = self.start()
+        session = UploadSession.objects.get(id=upload_id)
+
+        call_command("clean_uploads", hours=0, stdout=StringIO())
+
+        self.assertFalse(UploadSession.objects.filter(id=upload_id).exists())
+        self.assertFalse(os.path.exists(session.partial_path))
+
+
+class DerivativeTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.contributor_user)
+
+    def create_media_item(self, files):
+        data = dummy_image_data("test")
+        data["file_paths"] = files
+        response = self.client.post("/arsip/create", data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Generation is deferred to the task workers
+        submitted = Task.objects.filter(name="arsipUI.derivatives.generate_derivatives").count()
+        return MediaItem.objects.get(id=response.data["id"]), submitted
+
+    def test_image_previews(self):
+        media_item, submitted = self.create_media_item([create_dummy_image(2000, 1000)])
+        self.assertEqual(submitted, 1)
+        file_instance = media_item.file_paths.get()
+        self.assertEqual(file_instance.thumbnail.name, "")
+
+        self.assertTrue(generate_derivatives(file_instance.id))
+        file_instance.refresh_from_db()
+
+        for field, size in (("thumbnail", (320, 160)), ("preview", (1280, 640))):
+            derivative = getattr(file_instance, field)
+            with derivative.open("rb") as f, Image.open(f) as image:
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(image.size, size)
+
+        response = self.client.get(reverse("media-list"))
+        serialized = response.data[0]["file_paths"][0]
+        self.assertTrue(serialized["thumbnail"].endswith(".webp"))
+        self.assertTrue(serialized["preview"].endswith(".webp"))
+
+    def test_documents_without_previews(self):
+        document = SimpleUploadedFile("notes.txt", b"notes", content_type="text/plain")
+        media_item, submitted = self.create_media_item([document])
+
+        self.assertEqual(submitted, 0)
+        self.assertFalse(generate_derivatives(media_item.file_paths.get().id))
+
+    def test_backfill_command(self):
+        media_item, submitted = self.create_media_item([create_dummy_image()])
+
+        call_command("generate_derivatives", stdout=StringIO())
+        self.assertNotEqual(media_item.file_paths.get().thumbnail.name, "")
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.contributor_user)
+
+    def upload(self, *files):
+        data = dummy_image_data("test")
+        data["file_paths"] = list(files)
+        response = self.client.post("/arsip/create", data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return MediaItem.objects.get(id=response.data["id"]).file_paths.get()
+
+    def test_identical_uploads_share_a_blob(self):
+        first = self.upload(create_dummy_image())
+        second = self.upload(create_dummy_image())
+        other = self.upload(create_dummy_image(50, 50))
+
+        content = create_dummy_image().read()
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(
+            checksum_from_name(first.file.name), hashlib.sha256(content).hexdigest()
+        )
+        self.assertTrue(first.file.name.endswith(".png"))
+        with first.file.open("rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_large_uploads_are_hashed_while_streamed(self):
+        content = os.urandom(3 * 1024 * 1024)
+        file_instance = self.upload(SimpleUploadedFile("video.mp4", content))
+
+        self.assertEqual(
+            checksum_from_name(file_instance.file.name),
+            hashlib.sha256(content).hexdigest(),
+        )
+        self.assertEqual(file_instance.file.size, len(content))
+
+    def test_blobs_outlive_their_rows_until_collected(self):
+        first = self.upload(create_dummy_image())
+        second = self.upload(create_dummy_image())
+        storage = first.file.storage
+        name = second.file.name
+
+        first.delete()
+        second.delete()
+        self.assertTrue(storage.exists(name))
+        call_command("gc_blobs", grace=0, stdout=StringIO())
+        self.assertFalse(storage.exists(name))
+
+    def test_reused_blobs_are_within_the_grace_period(self):
+        first = self.upload(create_dummy_image(70, 70))
+        storage = first.file.storage
+        name = first.file.name
+        old = time.time() - 2 * 3600
+        os.utime(storage.path(name), (old, old))
+        File.objects.filter(id=first.id).delete()
+
+        # Same content, as an upload that is not committed yet would get it
+        self.assertEqual(storage.save("other.png", create_dummy_image(70, 70)), name)
+        call_command("gc_blobs", grace=3600, stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+
+    def test_gc_unreferenced_blobs(self):
+        file_instance = self.upload(create_dummy_image(60, 60))
+        storage = file_instance.file.storage
+        name = file_instance.file.name
+
+        call_command("gc_blobs", grace=0, stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+
+        # Rows removed without going through File.delete()
+        File.objects.filter(id=file_instance.id).delete()
+        call_command("gc_blobs", grace=3600, stdout=StringIO())
+        self.assertTrue(storage.exists(name))
+        call_command("gc_blobs", grace=0, stdout=StringIO())
+        self.assertFalse(storage.exists(name))
+
+
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        self.media_item = MediaItem.objects.create(
+            title="Test Media Item", description="", event=self.event, tag_names="a"
+        )
+        self.client = APIClient()
+        reader_counter.reset()
+
+    def tearDown(self):
+        reader_counter.reset()
+
+    def assert_revalidates(self, url, queries=1):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        # Answered from the resource versions alone
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        return etag
+
+    def assert_changed(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_media_item_list(self):
+        url = reverse("media-list")
+        etag = self.assert_revalidates(url)
+
+        # Other query parameters are another representation
+        self.assert_changed(url + "?status=approved", etag)
+
+        self.media_item.title = "Changed"
+        self.media_item.save()
+        self.assert_changed(url, etag)
+
+    def test_media_item_list_after_tag_rename(self):
+        url = reverse("media-list")
+        etag = self.assert_revalidates(url)
+
+        tag = Tag.objects.get(name="a")
+        tag.name = "b"
+        tag.save()
+        self.assert_changed(url, etag)
+
+    def test_media_item_detail(self):
+        url = reverse("media-detail", args=[self.media_item.id])
+        # And whether the item exists, before counting the read
+        etag = self.assert_revalidates(url, queries=2)
+
+        # Revalidated reads are still counted, flushing them keeps the validators
+        reader_counter.flush()
+        run_pending()
+        self.assertEqual(MediaItem.objects.get(id=self.media_item.id).reader_count, 3)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.media_item.title = "Changed"
+        self.media_item.save()
+        self.assert_changed(url, etag)
+
+    def test_revalidating_missing_items_is_not_counted(self):
+        url = reverse("media-detail", args=[999999])
+        for url in (url, reverse("async-media-detail", args=[999999])):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(reader_counter.flush(), 0)
+
+    def test_event_and_category_lists(self):
+        events_etag = self.assert_revalidates(reverse("events-list"))
+        categories_etag = self.assert_revalidates(reverse("category-list"))
+
+        self.event.category.name = "Changed"
+        self.event.category.save()
+        self.assert_changed(reverse("events-list"), events_etag)
+        self.assert_changed(reverse("category-list"), categories_etag)
+
+        events_etag = self.assert_revalidates(reverse("events-list"))
+        Event.objects.create(name="Other", date="2000-01-01", category=self.event.category)
+        self.assert_changed(reverse("events-list"), events_etag)
+
+
+# The test cache is per process, as if every process wrote through this one
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        self.media_item = MediaItem.objects.create(
+            title="Test Media Item", description="", event=self.event, tag_names="a"
+        )
+        self.client = APIClient()
+        cache.clear()
+
+    def test_anonymous_list_is_cached(self):
+        url = reverse("media-list") + "?status=waitlist"
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+        # Only the resource versions are read to build the validators
+        with self.assertNumQueries(1):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(response_cache.get_metrics()["hits"], 1)
+        self.assertEqual(response_cache.get_metrics()["misses"], 1)
+
+    def test_equivalent_queries_share_an_entry(self):
+        self.client.get(reverse("media-list") + "?status=waitlist&sort_by_reader=true")
+        with self.assertNumQueries(1):
+            self.client.get(reverse("media-list") + "?sort_by_reader=1&utm=x&status=waitlist")
+
+    def test_authenticated_list_is_not_cached(self):
+        self.client.force_authenticate(user=self.contributor_user)
+        self.client.get(reverse("media-list"))
+        self.client.get(reverse("media-list"))
+        self.assertEqual(response_cache.get_metrics()["hits"], 0)
+
+    def test_invalidated_by_moderation(self):
+        url = reverse("media-list") + "?status=approved"
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+        self.client.force_authenticate(user=self.verificator_user)
+        self.client.get(reverse("mediaitem-approve", args=[self.media_item.id]))
+        self.client.force_authenticate(user=None)
+        self.assertEqual(len(self.client.get(url).data), 1)
+
+        self.client.force_authenticate(user=self.verificator_user)
+        self.client.get(reverse("mediaitem-cancel-approval", args=[self.media_item.id]))
+        self.client.force_authenticate(user=None)
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+    def test_invalidated_by_tag_change(self):
+        url = reverse("media-list")
+        self.client.get(url)
+
+        tag = Tag.objects.get(name="a")
+        tag.name = "b"
+        tag.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data[0]["tags"][0]["name"], "b")
+        self.assertEqual(response_cache.get_metrics()["hits"], 0)
+
+    def test_not_invalidated_by_reader_counts(self):
+        url = reverse("media-list")
+        self.client.get(reverse("media-detail", args=[self.media_item.id]))
+        self.client.get(url)
+        reader_counter.flush()
+        run_pending()
+        self.client.get(url)
+        self.assertEqual(response_cache.get_metrics()["hits"], 1)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=None)
+    def test_off_with_a_per_process_cache(self):
+        self.assertFalse(response_cache.is_enabled())
+        url = reverse("media-list")
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        self.assertEqual(response_cache.get_metrics()["misses"], 0)
+
+
+class QueryBenchmarkTests(TestCase):
+    def test_benchmark_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = os.path.join(directory.name, "baseline.json")
+        options = {"items": 60, "repeat": 2, "stdout": StringIO()}
+
+        call_command("benchmark_queries", baseline=baseline, save_baseline=True, **options)
+        with open(baseline) as f:
+            self.assertIn("approved_by_date", json.load(f)["paths"])
+
+        output = StringIO()
+        options["stdout"] = output
+        call_command("benchmark_queries", baseline=baseline, explain=True, tolerance=1000, **options)
+        self.assertIn("verificator_dashboard", output.getvalue())
+
+        # The seeded rows are rolled back
+        self.assertFalse(MediaItem.objects.exists())
+
+
+class BulkModerationTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.other_verificator = create_verificator(
+            username="verificator2", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        self.media_items = [
+            MediaItem.objects.create(
+                title=f"Item {i}", description="", event=self.event, tag_names="a"
+            )
+            for i in range(3)
+        ]
+        self.ids = [media_item.id for media_item in self.media_items]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.verificator_user)
+
+    def moderate(self, ids, action, **data):
+        return self.client.post(
+            reverse("mediaitem-moderate"), {"ids": ids, "action": action, **data}, format="json"
+        )
+
+    def results(self, response):
+        return {item["id"]: item["result"] for item in response.data["results"]}
+
+    def test_approve_many(self):
+        # Savepoint, the locking read, one UPDATE, the version bump, release,
+        # and the rollups: one UPDATE out of the waitlist bucket, one UPDATE
+        # and INSERT of the approved bucket which does not exist yet
+        with self.assertNumQueries(8):
+            response = self.moderate(self.ids + [999999], "approve")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(self.results(response)[999999], "not_found")
+
+        for media_item in MediaItem.objects.filter(id__in=self.ids):
+            self.assertEqual(media_item.status, MediaItem.APPROVED)
+            self.assertEqual(media_item.verificator, self.verificator_user)
+
+        # Approving again changes nothing
+        response = self.moderate(self.ids, "approve")
+        self.assertEqual(response.data["updated"], 0)
+        self.assertEqual(set(self.results(response).values()), {"unchanged"})
+
+    def test_reject_with_reason(self):
+        response = self.moderate(self.ids[:2], "reject", reject_reason="Blurry")
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(
+            list(MediaItem.objects.filter(status=MediaItem.REJECTED).values_list("reject_reason", flat=True)),
+            ["Blurry", "Blurry"],
+        )
+        # Tags are left alone
+        self.assertEqual(self.media_items[0].tags.count(), 1)
+
+    def test_cancel_only_own_decisions(self):
+        self.moderate(self.ids[:2], "approve")
+        self.client.force_authenticate(user=self.other_verificator)
+        self.moderate(self.ids[2:], "approve")
+
+        response = self.moderate(self.ids, "cancel")
+        self.assertEqual(
+            self.results(response),
+            {self.ids[0]: "forbidden", self.ids[1]: "forbidden", self.ids[2]: "updated"},
+        )
+        media_item = MediaItem.objects.get(id=self.ids[2])
+        self.assertEqual(media_item.status, MediaItem.WAITLIST)
+        self.assertIsNone(media_item.verificator)
+
+    def test_invalidates_public_list(self):
+        cache.clear()
+        self.client.force_authenticate(user=None)
+        url = reverse("media-list") + "?status=approved"
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+        self.client.force_authenticate(user=self.verificator_user)
+        self.moderate(self.ids, "approve")
+        self.client.force_authenticate(user=None)
+        self.assertEqual(len(self.client.get(url).data), 3)
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.moderate([], "approve").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.moderate(self.ids, "delete").status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=self.contributor_user)
+        self.assertEqual(self.moderate(self.ids, "approve").status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        create_media_items(3, self.event, self.contributor_user, self.verificator_user)
+        self.media_item = MediaItem.objects.first()
+        self.media_item.file_paths.add(
+            File.objects.create(
+                file="img/1000/12/cover.png", file_type="img", thumbnail="img/1000/12/cover.webp"
+            )
+        )
+        self.client = APIClient()
+        reader_counter.reset()
+
+    def tearDown(self):
+        reader_counter.reset()
+
+    def test_default_compact_fields(self):
+        response = self.client.get(reverse("media-list") + "?expand=")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = next(item for item in response.data if item["id"] == self.media_item.id)
+        self.assertEqual(
+            list(item), ["id", "title", "upload_date", "event", "status", "reader_count", "thumbnail"]
+        )
+        self.assertEqual(item["event"], self.event.id)
+        self.assertTrue(item["thumbnail"].startswith("http://testserver/"))
+
+    def test_only_requested_columns_are_loaded(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("media-list") + "?fields=title,upload_date")
+        self.assertEqual(list(response.data[0]), ["title", "upload_date"])
+
+        item_queries = [
+            query["sql"] for query in context.captured_queries
+            if 'FROM "arsipUI_mediaitem"' in query["sql"]
+        ]
+        self.assertEqual(len(item_queries), 1)
+        self.assertNotIn("description", item_queries[0])
+        self.assertNotIn("JOIN", item_queries[0])
+
+    def test_expand_relations(self):
+        url = reverse("media-list") + "?fields=title,tags&expand=event,contributor"
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        item = response.data[0]
+        self.assertEqual(list(item), ["title", "event", "tags", "contributor"])
+        self.assertEqual(item["event"]["category"]["name"], "Test")
+        self.assertEqual(item["contributor"]["username"], "contributor")
+        self.assertEqual(len(item["tags"]), 2)
+        self.assertIsInstance(item["tags"][0], int)
+
+    def test_detail(self):
+        url = reverse("media-detail", args=[self.media_item.id])
+        response = self.client.get(url + "?fields=title,formatted_content")
+        self.assertEqual(list(response.data), ["title", "formatted_content"])
+
+    def test_unknown_fields(self):
+        response = self.client.get(reverse("media-list") + "?fields=title,password")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("media-list") + "?expand=title")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_full_representation_by_default(self):
+        response = self.client.get(reverse("media-list"))
+        self.assertEqual(response.data[0]["event"]["name"], "Test Event")
+        self.assertIn("formatted_content", response.data[0])
+
+
+class MediaItemRowSerializerTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        create_media_items(3, self.event, self.contributor_user, self.verificator_user)
+        # No event, verificator, tags or files, and never rendered
+        MediaItem.objects.create(title="Bare", description="**bold**")
+        MediaItem.objects.filter(title="Bare").update(formatted_content="")
+        self.client = APIClient()
+
+    def test_matches_read_serializer(self):
+        request = APIRequestFactory().get("/arsip/")
+        context = {"request": request}
+        queryset = MediaItem.objects.order_by("-upload_date", "-id")
+
+        expected = MediaItemReadSerializer(queryset.for_read(), many=True, context=context).data
+        rows = MediaItemRowSerializer(MediaItemRowSerializer.get_rows(queryset), context=context)
+        data = rows.data
+
+        expected = json.loads(JSONRenderer().render(expected))
+        data = json.loads(FastJSONRenderer().render(data))
+        for item in expected:
+            item["tags"].sort(key=lambda tag: tag["id"])
+            item["file_paths"].sort(key=lambda file: file["id"])
+        self.assertEqual(data, expected)
+        self.assertEqual([list(item) for item in data], [list(item) for item in expected])
+
+    def test_list_uses_rows(self):
+        response = self.client.get(reverse("media-list") + "?page_size=2")
+        self.assertEqual(len(response.json()["results"]), 2)
+        response = self.client.get(response.json()["next"])
+        self.assertEqual(len(response.json()["results"]), 2)
+        self.assertIsNone(response.json()["next"])
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command("benchmark_serializers", items=[5], repeat=1, stdout=output)
+        self.assertIn("rows", output.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        create_media_items(3, self.event, self.contributor_user, self.verificator_user)
+        create_media_items(
+            1, self.event, self.contributor_user, None, status=MediaItem.WAITLIST
+        )
+        self.client = APIClient()
+
+    def test_ndjson(self):
+        response = self.client.get(reverse("media-export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        # Only the approved catalogue, in id order
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]["title"], "Media Item 0")
+        self.assertEqual(records[0]["category"], "Test")
+        self.assertEqual(records[0]["tags"], ["tag0", "shared"])
+        self.assertEqual(len(records[0]["files"]), 2)
+        self.assertTrue(records[0]["files"][0].startswith("http://testserver/"))
+        self.assertNotIn("contributor", records[0])
+
+    def test_csv(self):
+        response = self.client.get(reverse("media-export") + "?output=csv")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(set(rows[1]["tags"].split(";")), {"tag1", "shared"})
+
+        response = self.client.get(reverse("media-export") + "?output=xml")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batches(self):
+        # A query for the rows, tags and files of each batch, and a last one
+        # finding no more rows
+        with self.assertNumQueries(3 * 2 + 1):
+            records = list(iter_records(MediaItem.objects.all(), chunk_size=2))
+        self.assertEqual(len(records), 4)
+
+    def test_command(self):
+        output = StringIO()
+        call_command("export_catalogue", status="approved", format="csv",
+                     base_url="https://arsip.example.com", stdout=output)
+        rows = list(csv.DictReader(StringIO(output.getvalue())))
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(rows[0]["files"].startswith("https://arsip.example.com/"))
+
+
+class ImportArchiveTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        for name, size in (("a.png", 100), ("b.png", 50)):
+            with open(os.path.join(self.directory, name), "wb") as f:
+                f.write(create_dummy_image(size, size).read())
+        self.client = APIClient()
+
+    def write_manifest(self, items, name="manifest.json"):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", newline="") as f:
+            if name.endswith(".json"):
+                json.dump(items, f)
+            else:
+                writer = csv.DictWriter(f, fieldnames=list(items[0]))
+                writer.writeheader()
+                writer.writerows(items)
+        return path
+
+    def items(self, count, event="Wisuda"):
+        return [
+            {
+                "title": f"Foto {event} {i}",
+                "description": "*Arsip* lama",
+                "fakultas": "FT",
+                "event_name": event,
+                "event_date": "1998-08-17",
+                "event_category": "Upacara",
+                "tags": [f"{event}-{i}", "sejarah"],
+                "files": ["a.png", "b.png"] if i == 0 else ["a.png"],
+            }
+            for i in range(count)
+        ]
+
+    def run_import(self, manifest, **options):
+        output = StringIO()
+        call_command("import_archive", manifest, self.directory, stdout=output, **options)
+        return output.getvalue()
+
+    def test_import_json(self):
+        output = self.run_import(
+            self.write_manifest(self.items(3)), status="approved", contributor="contributor"
+        )
+        self.assertIn("Imported 3 items and 4 files", output)
+
+        media_items = MediaItem.objects.order_by("id")
+        self.assertEqual(media_items.count(), 3)
+        self.assertEqual(Event.objects.filter(name="Wisuda").count(), 1)
+        self.assertEqual(Tag.objects.filter(name="sejarah").count(), 1)
+
+        media_item = media_items[0]
+        self.assertEqual(media_item.status, MediaItem.APPROVED)
+        self.assertEqual(media_item.contributor, self.contributor_user)
+        self.assertEqual(media_item.formatted_content, "<p><em>Arsip</em> lama</p>")
+        self.assertEqual(media_item.tags.count(), 2)
+        self.assertEqual(media_item.file_paths.count(), 2)
+        # Identical files share a blob
+        self.assertEqual(len(set(File.objects.values_list("file", flat=True))), 2)
+        self.assertEqual(File.objects.first().file_type, "img")
+
+        response = self.client.get(reverse("media-list") + "?search=wisuda")
+        self.assertEqual(len(response.data), 3)
+
+    def test_import_csv(self):
+        items = self.items(2)
+        for item in items:
+            item["tags"] = ";".join(item["tags"])
+            item["files"] = ";".join(item["files"])
+        self.run_import(self.write_manifest(items, "manifest.csv"))
+        self.assertEqual(MediaItem.objects.filter(status=MediaItem.WAITLIST).count(), 2)
+        self.assertEqual(MediaItem.objects.get(title="Foto Wisuda 0").file_paths.count(), 2)
+
+    def test_queries_do_not_grow_with_items(self):
+        def count_queries(items):
+            with CaptureQueriesContext(connection) as context:
+                self.run_import(self.write_manifest(items))
+            return len(context.captured_queries)
+
+        self.assertEqual(
+            count_queries(self.items(2, event="Dies")),
+            count_queries(self.items(8, event="Lustrum")),
+        )
+
+    def test_import_without_returning_ids(self):
+        # As on MySQL, the ids of the new rows come from the connection
+        self.run_import(self.write_manifest(self.items(1, event="Dies")))
+        with mock.patch.object(
+            type(connection.features), "can_return_rows_from_bulk_insert", False
+        ):
+            with CaptureQueriesContext(connection) as context:
+                self.run_import(self.write_manifest(self.items(3)))
+            few = len(context.captured_queries)
+            with CaptureQueriesContext(connection) as context:
+                self.run_import(self.write_manifest(self.items(9, event="Lustrum")))
+            self.assertEqual(len(context.captured_queries), few)
+
+        media_item = MediaItem.objects.get(title="Foto Wisuda 0")
+        self.assertEqual(
+            sorted(media_item.tags.values_list("name", flat=True)), ["Wisuda-0", "sejarah"]
+        )
+        self.assertEqual(media_item.file_paths.count(), 2)
+        self.assertEqual(MediaItem.objects.get(title="Foto Lustrum 8").file_paths.count(), 1)
+        # Every File row belongs to one item
+        self.assertEqual(
+            MediaItem.file_paths.through.objects.values("file_id").distinct().count(),
+            File.objects.count(),
+        )
+
+    def test_invalid_manifest(self):
+        items = self.items(2)
+        items[0]["files"] = ["missing.png"]
+        items[1]["event_date"] = "17-08-1998"
+        with self.assertRaisesMessage(CommandError, "Item 1: missing.png does not exist"):
+            self.run_import(self.write_manifest(items))
+        self.assertFalse(MediaItem.objects.exists())
+
+        items = self.items(1)
+        items[0]["files"] = ["../outside.png"]
+        with self.assertRaisesMessage(CommandError, "outside the directory"):
+            self.run_import(self.write_manifest(items))
+
+
+class StatisticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        category = Event_Category.objects.create(name="Wisuda")
+        self.event = Event.objects.create(name="Wisuda 2023", date="2023-08-17", category=category)
+        self.media_items = [
+            MediaItem.objects.create(
+                title=f"Media Item {i}",
+                description="A test media item",
+                fakultas=fakultas,
+                event=self.event if i < 2 else None,
+                contributor=self.contributor_user,
+            )
+            for i, fakultas in enumerate(["Fasilkom", "Fasilkom", "FH"])
+        ]
+        self.client = APIClient()
+
+    def rollups(self):
+        return sorted(
+            MediaItemRollup.objects.filter(items__gt=0).values_list(
+                "fakultas", "event_id", "month", "status", "items", "readers"
+            )
+        )
+
+    def rebuilt_rollups(self):
+        current = self.rollups()
+        MediaItemRollup.rebuild()
+        return current, self.rollups()
+
+    def test_rollups_follow_changes(self):
+        MediaItem.objects.moderate(
+            [item.id for item in self.media_items[:2]], "approve", self.verificator_user
+        )
+        self.media_items[2].fakultas = "FK"
+        self.media_items[2].save()
+        for i in range(3):
+            reader_counter.increment(self.media_items[0].id)
+        reader_counter.flush()
+        run_pending()
+        MediaItem.objects.get(id=self.media_items[1].id).delete()
+
+        current, rebuilt = self.rebuilt_rollups()
+        self.assertEqual(current, rebuilt)
+        self.assertEqual(len(current), 2)
+
+    def test_rebuild_months_in_local_time(self):
+        # Already February in Jakarta
+        MediaItem.objects.filter(id=self.media_items[0].id).update(
+            upload_date=datetime(2024, 1, 31, 20, tzinfo=dt_timezone.utc)
+        )
+        MediaItemRollup.rebuild()
+        self.assertTrue(
+            MediaItemRollup.objects.filter(month=date(2024, 2, 1), fakultas="Fasilkom").exists()
+        )
+
+    def test_statistics(self):
+        MediaItem.objects.moderate(
+            [item.id for item in self.media_items], "approve", self.verificator_user
+        )
+        MediaItem.objects.filter(id=self.media_items[1].id).update(reader_count=5)
+        MediaItemRollup.rebuild()
+
+        # The rollup rows and the top read items, plus the version lookup
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("media-statistics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total"], 3)
+        self.assertEqual(response.data["readers"], 5)
+        self.assertEqual(
+            {row["value"]: row["items"] for row in response.data["status"]},
+            {MediaItem.WAITLIST: 0, MediaItem.APPROVED: 3, MediaItem.REJECTED: 0},
+        )
+        self.assertEqual(
+            [(row["value"], row["items"]) for row in response.data["fakultas"]],
+            [("FH", 1), ("Fasilkom", 2)],
+        )
+        self.assertEqual(response.data["fakultas"][1]["label"], "Fakultas Ilmu Komputer")
+        self.assertEqual(
+            [(row["name"], row["items"], row["readers"]) for row in response.data["category"]],
+            [("Wisuda", 2, 5), (None, 1, 0)],
+        )
+        self.assertEqual(len(response.data["month"]), 1)
+        self.assertEqual(response.data["top_read"][0]["id"], self.media_items[1].id)
+
+        # Answered from the versions alone while nothing changes
+        etag = response["ETag"]
+        response = self.client.get(reverse("media-statistics"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_waitlist_is_not_broken_down(self):
+        response = self.client.get(reverse("media-statistics"))
+        self.assertEqual(response.data["total"], 0)
+        self.assertEqual(response.data["fakultas"], [])
+        self.assertEqual(
+            {row["value"]: row["items"] for row in response.data["status"]}[MediaItem.WAITLIST], 3
+        )
+
+    def test_import_is_counted(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        manifest = os.path.join(directory.name, "manifest.json")
+        with open(manifest, "w") as f:
+            json.dump([{"title": f"Imported {i}", "fakultas": "FH"} for i in range(4)], f)
+        call_command("import_archive", manifest, directory.name, stdout=StringIO())
+
+        current, rebuilt = self.rebuilt_rollups()
+        self.assertEqual(current, rebuilt)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=directory.name,
+            UPLOAD_PARTIAL_ROOT=os.path.join(directory.name, "partial"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.content = bytes(range(256)) * 40
+        self.checksum = hashlib.sha256(self.content).hexdigest()
+        self.name = f"blobs/{self.checksum[:2]}/{self.checksum[2:4]}/{self.checksum}.mp4"
+        for name in (self.name, "img/2020/1/legacy.png", "partial/upload"):
+            path = os.path.join(directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(self.content)
+
+    def get(self, name, **headers):
+        return self.client.get("/media/" + name, **headers)
+
+    def test_whole_file(self):
+        response = self.get(self.name)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["ETag"], f'"{self.checksum}"')
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response = self.get(self.name, HTTP_IF_NONE_MATCH=f'"{self.checksum}"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_ranges(self):
+        size = len(self.content)
+        for header, start, end in (
+            ("bytes=100-199", 100, 199),
+            ("bytes=10000-", 10000, size - 1),
+            ("bytes=-24", size - 24, size - 1),
+            ("bytes=200-999999", 200, size - 1),
+        ):
+            response = self.get(self.name, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT, header)
+            self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{size}")
+            self.assertEqual(int(response["Content-Length"]), end - start + 1)
+            self.assertEqual(b"".join(response.streaming_content), self.content[start : end + 1])
+
+        response = self.get(self.name, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response["Content-Range"], f"bytes */{size}")
+
+        # A stale If-Range gets the whole, current file
+        response = self.get(self.name, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_legacy_files_and_private_paths(self):
+        response = self.get("img/2020/1/legacy.png")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        response.close()
+
+        for name in ("partial/upload", "../outside", "img/2020/1/missing.png", "img"):
+            self.assertEqual(self.get(name).status_code, status.HTTP_404_NOT_FOUND, name)
+
+    @override_settings(MEDIA_SENDFILE="x-accel-redirect")
+    def test_sendfile(self):
+        response = self.get(self.name, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + self.name)
+        self.assertEqual(response["ETag"], f'"{self.checksum}"')
+        self.assertEqual(response.content, b"")
+
+
+def fake_ffmpeg(*args):
+    # Stands in for ffprobe and ffmpeg, writing outputs to the last argument
+    if args[0].endswith("ffprobe"):
+        return "12.5\n"
+    output = args[-1]
+    if output.endswith(".png"):
+        Image.new("RGB", (640, 360), "black").save(output)
+    else:
+        with open(output, "wb") as f:
+            f.write(b"rendition of " + args[args.index("-i") + 1].encode())
+    return ""
+
+
+class TranscodingTests(TestCase):
+    def setUp(self):
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.contributor_user)
+
+    def upload_video(self, content=b"not really a video"):
+        data = dummy_image_data("test")
+        data["file_paths"] = [SimpleUploadedFile("clip.avi", content, content_type="video/x-msvideo")]
+        response = self.client.post("/arsip/create", data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        submitted = Task.objects.filter(name="arsipUI.transcoding.transcode").count()
+        return MediaItem.objects.get(id=response.data["id"]).file_paths.get(), submitted
+
+    def test_transcode(self):
+        with mock.patch("arsipUI.transcoding.get_binary", side_effect=lambda name: f"/usr/bin/{name}"):
+            file_instance, submitted = self.upload_video()
+            # Queued for the task workers, the request does no processing
+            self.assertEqual(submitted, 1)
+            self.assertEqual(file_instance.transcode_status, File.TRANSCODE_PENDING)
+
+            with mock.patch("arsipUI.transcoding.run", side_effect=fake_ffmpeg):
+                self.assertTrue(transcoding.transcode(file_instance.id))
+
+        file_instance.refresh_from_db()
+        self.assertEqual(file_instance.transcode_status, File.TRANSCODE_DONE)
+        self.assertEqual(file_instance.duration, 12.5)
+        self.assertTrue(file_instance.rendition.name.endswith(".mp4"))
+        with file_instance.poster.open("rb") as f, Image.open(f) as image:
+            self.assertEqual(image.format, "WEBP")
+        self.assertNotEqual(file_instance.thumbnail.name, "")
+
+        response = self.client.get(reverse("media-list"))
+        serialized = response.data[0]["file_paths"][0]
+        self.assertTrue(serialized["rendition"].endswith(".mp4"))
+        self.assertEqual(serialized["duration"], 12.5)
+        self.assertEqual(serialized["transcode_status"], File.TRANSCODE_DONE)
+
+    def test_failure(self):
+        def broken(*args):
+            raise transcoding.TranscodeError("Invalid data found when processing input")
+
+        with mock.patch("arsipUI.transcoding.get_binary", side_effect=lambda name: f"/usr/bin/{name}"):
+            file_instance, submitted = self.upload_video()
+            with mock.patch("arsipUI.transcoding.run", side_effect=broken):
+                with self.assertLogs("arsipUI.transcoding", "WARNING"):
+                    self.assertFalse(transcoding.transcode(file_instance.id))
+
+        file_instance.refresh_from_db()
+        self.assertEqual(file_instance.transcode_status, File.TRANSCODE_FAILED)
+        self.assertEqual(file_instance.rendition.name, "")
+
+    def test_without_ffmpeg(self):
+        with mock.patch("arsipUI.transcoding.get_binary", return_value=None) as get_binary:
+            # Queued without looking for ffmpeg in the web process
+            file_instance, submitted = self.upload_video()
+            self.assertEqual(submitted, 1)
+            get_binary.assert_not_called()
+
+            # Left pending by the worker
+            with self.assertLogs("arsipUI.transcoding", "WARNING"):
+                self.assertEqual(run_pending(), 1)
+            file_instance.refresh_from_db()
+            self.assertEqual(file_instance.transcode_status, File.TRANSCODE_PENDING)
+            with self.assertRaises(CommandError):
+                call_command("transcode_videos", stdout=StringIO())
+
+    @unittest.skipUnless(shutil.which("ffmpeg") and shutil.which("ffprobe"), "ffmpeg is not installed")
+    def test_real_ffmpeg(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "clip.avi")
+            subprocess.run(
+                ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=duration=2:size=320x240:rate=10", source],
+                check=True,
+            )
+            with open(source, "rb") as f:
+                content = f.read()
+
+        file_instance, submitted = self.upload_video(content)
+        output = StringIO()
+        call_command("transcode_videos", stdout=output)
+        self.assertIn("Transcoded 1 videos", output.getvalue())
+        file_instance.refresh_from_db()
+        self.assertAlmostEqual(file_instance.duration, 2, places=0)
+
+
+# Committed data, the status is read from another connection
+class TranscodingStatusTests(TransactionTestCase):
+    def setUp(self):
+        self.file_instance = File.objects.create(file="vid/1000/12/clip.avi", file_type="vid")
+        transcoding.transcode.enqueue(self.file_instance.id)
+
+    def read_status(self):
+        # From another thread, so another connection
+        statuses = []
+
+        def read():
+            try:
+                statuses.append(File.objects.get(id=self.file_instance.id).transcode_status)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        return statuses[0]
+
+    def test_status_visible_while_transcoding_and_after_failure(self):
+        seen = []
+
+        def crashing(*args):
+            seen.append(self.read_status())
+            raise RuntimeError("ffmpeg crashed")
+
+        with mock.patch("arsipUI.transcoding.get_binary", side_effect=lambda name: f"/usr/bin/{name}"), \
+                mock.patch("arsipUI.transcoding.run", side_effect=crashing):
+            with self.assertLogs("arsipUI.tasks", "WARNING"):
+                self.assertEqual(run_pending(), 1)
+
+        self.assertEqual(seen, [File.TRANSCODE_PROCESSING])
+        self.assertEqual(self.read_status(), File.TRANSCODE_FAILED)
+        # And queued for a retry
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+
+
+TASK_CALLS = []
+
+
+@tasks.task(retry_delay=60)
+def record_call(value, fail=False):
+    TASK_CALLS.append(value)
+    if fail:
+        raise RuntimeError(f"Failed {value}")
+
+
+@tasks.task(concurrency=1)
+def limited_call(value):
+    TASK_CALLS.append(value)
+
+
+@tasks.task(atomic=True)
+def create_category(name):
+    Event_Category.objects.create(name=name)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        TASK_CALLS.clear()
+
+    def test_priorities_and_order(self):
+        record_call.enqueue("low", priority=-1)
+        record_call.enqueue("first")
+        record_call.enqueue("second")
+        record_call.enqueue("urgent", priority=5)
+        record_call.enqueue("later", delay=60)
+
+        self.assertEqual(run_pending(), 4)
+        self.assertEqual(TASK_CALLS, ["urgent", "first", "second", "low"])
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 4)
+        self.assertEqual(Task.objects.get(status=Task.QUEUED).args, ["later"])
+
+    def test_retries_with_backoff(self):
+        queued = record_call.enqueue("broken", True)
+
+        for attempt in range(1, 4):
+            task = claim()
+            self.assertEqual(task.attempts, attempt)
+            with self.assertLogs("arsipUI.tasks", "WARNING"):
+                self.assertFalse(run(task))
+            # Not runnable again before its delay, doubled per attempt
+            self.assertIsNone(claim())
+            task.refresh_from_db()
+            if attempt < 3:
+                self.assertEqual(task.status, Task.QUEUED)
+                delay = (task.run_at - timezone.now()).total_seconds()
+                self.assertAlmostEqual(delay, 60 * 2 ** (attempt - 1), delta=5)
+                Task.objects.filter(id=queued.id).update(run_at=timezone.now())
+
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn("RuntimeError: Failed broken", task.last_error)
+        self.assertEqual(TASK_CALLS, ["broken"] * 3)
+
+    def test_concurrency_limit(self):
+        limited_call.enqueue(1)
+        limited_call.enqueue(2)
+        record_call.enqueue(3, priority=-1)
+
+        first = claim()
+        self.assertEqual(first.args, [1])
+        # The second call waits for the first, other tasks go ahead
+        self.assertEqual(claim().args, [3])
+        self.assertIsNone(claim())
+
+        run(first)
+        self.assertEqual(claim().args, [2])
+
+    def test_unknown_and_stale_tasks(self):
+        Task.objects.create(name="arsipUI.tests.missing")
+        with self.assertLogs("arsipUI.tasks", "ERROR"):
+            self.assertFalse(run(claim()))
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+        # Running tasks are requeued once their worker stops beating
+        record_call.enqueue("alive")
+        record_call.enqueue("stale")
+        claim("host:1:0")
+        claim("host:12:0")
+        self.assertEqual(tasks.requeue_stale(timeout=300), 0)
+        Task.objects.filter(status=Task.RUNNING).update(heartbeat=timezone.now() - timedelta(hours=2))
+        self.assertEqual(tasks.heartbeat("host:1"), 1)
+        self.assertEqual(tasks.requeue_stale(timeout=300), 1)
+        self.assertEqual(Task.objects.get(status=Task.QUEUED).args, ["stale"])
+        self.assertEqual(run_pending(), 1)
+
+    def test_done_with_its_work(self):
+        create_category.enqueue("kept")
+        self.assertTrue(run(claim()))
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+        # A run that was requeued and claimed again meanwhile is rolled back,
+        # the work is applied once, by the run that marks it done
+        queued = create_category.enqueue("once")
+        stale = claim()
+        Task.objects.filter(id=queued.id).update(status=Task.QUEUED)
+        current = claim()
+        with self.assertLogs("arsipUI.tasks", "WARNING"):
+            self.assertFalse(run(stale))
+        self.assertFalse(Event_Category.objects.filter(name="once").exists())
+        self.assertTrue(run(current))
+        self.assertEqual(Event_Category.objects.filter(name="once").count(), 1)
+
+    def test_worker_command_and_metrics(self):
+        for i in range(3):
+            record_call.enqueue(i)
+        record_call.enqueue("broken", True)
+
+        output = StringIO()
+        with self.assertLogs("arsipUI.tasks", "WARNING"):
+            call_command("run_tasks", "--burst", "--threads=1", stdout=output)
+        self.assertIn("Ran 4 tasks", output.getvalue())
+        self.assertEqual(sorted(TASK_CALLS[:3]), [0, 1, 2])
+
+        metrics = tasks.get_metrics()["arsipUI.tests.record_call"]
+        self.assertEqual(metrics["done"], 3)
+        self.assertEqual(metrics[Task.QUEUED], 1)
+        self.assertIsNotNone(metrics["run_p95"])
+
+        output = StringIO()
+        call_command("task_stats", stdout=output)
+        self.assertIn("arsipUI.tests.record_call", output.getvalue())
+
+    def test_single_thread_worker_maintenance(self):
+        for i in range(3):
+            record_call.enqueue(i)
+
+        # Not only at startup, between tasks too
+        with mock.patch("arsipUI.management.commands.run_tasks.MAINTENANCE_INTERVAL", 0), \
+                mock.patch("arsipUI.tasks.requeue_stale", wraps=tasks.requeue_stale) as requeue_stale:
+            call_command("run_tasks", "--burst", "--threads=1", stdout=StringIO())
+        self.assertEqual(TASK_CALLS, [0, 1, 2])
+        self.assertEqual(requeue_stale.call_count, 5)
+
+
+class AsyncReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reader_counter.reset()
+        self.contributor_user = create_contributor(
+            username="contributor", password="password123"
+        )
+        self.verificator_user = create_verificator(
+            username="verificator", password="password123"
+        )
+        self.event = Event.objects.create(
+            name="Test Event",
+            date="1000-12-01",
+            category=Event_Category.objects.create(name="Test"),
+        )
+        self.media_items = create_media_items(
+            5, self.event, self.contributor_user, self.verificator_user
+        )
+        self.client = APIClient()
+
+    def tearDown(self):
+        reader_counter.reset()
+
+    def assert_same(self, sync_url, async_url):
+        sync_response = self.client.get(sync_url)
+        async_response = self.client.get(async_url)
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        return async_response
+
+    def test_same_output_as_sync_views(self):
+        for query in ("", "?status=approved&sort_by_reader=1", "?limit=2", "?search=item"):
+            self.assert_same(reverse("media-list") + query, reverse("async-media-list") + query)
+        self.assert_same(reverse("events-list"), reverse("async-events-list"))
+        self.assert_same(reverse("category-list"), reverse("async-category-list"))
+
+    def test_pagination(self):
+        url = reverse("async-media-list") + "?page_size=2"
+        titles = []
+        while url:
+            data = self.client.get(url).json()
+            titles += [item["title"] for item in data["results"]]
+            url = data["next"]
+            if url:
+                self.assertIn("/arsip/async/", url)
+        self.assertEqual(len(titles), 5)
+
+        response = self.client.get(reverse("async-media-list") + "?cursor=broken")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_counts_reads(self):
+        media_item = self.media_items[0]
+        response = self.client.get(reverse("async-media-detail", args=[media_item.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["reader_count"], 1)
+
+        # Revalidated reads are counted too
+        response = self.client.get(
+            reverse("async-media-detail", args=[media_item.id]), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        reader_counter.flush()
+        run_pending()
+        self.assertEqual(MediaItem.objects.get(id=media_item.id).reader_count, 2)
+
+        response = self.client.get(reverse("async-media-detail", args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(reverse("async-media-list"))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_async_client(self):
+        response = await self.async_client.get(reverse("async-category-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([category["name"] for category in response.json()], ["Test"])
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    def test_compares_targets(self):
+        Event_Category.objects.create(name="Test")
+        output_path = os.path.join(tempfile.mkdtemp(), "results.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output_path))
+
+        output = StringIO()
+        call_command(
+            "loadtest",
+            f"--target=sync={self.live_server_url}/arsip/",
+            f"--target=async={self.live_server_url}/arsip/async/",
+            "--path=categories",
+            "--concurrency", "1", "4",
+            "--requests=20",
+            f"--output={output_path}",
+            stdout=output,
+        )
+        with open(output_path) as f:
+            results = json.load(f)
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertEqual(result["errors"], 0)
+            self.assertGreater(result["throughput"], 0)
+        self.assertIn("async", output.getvalue())
+
+
+# Committed data, the load generator's threads have their own connections
+class APIBenchmarkTests(TransactionTestCase):
+    def test_benchmark_command(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = os.path.join(directory.name, "baseline.json")
+        options = {
+            "items": 60, "repeat": 2, "concurrency": [2], "requests": 10,
+            "upload_size": 1024, "current_database": True, "yes_destroy": True,
+        }
+
+        errors = StringIO()
+        call_command(
+            "benchmark_api", baseline=baseline, save_baseline=True,
+            stdout=StringIO(), stderr=errors, **options
+        )
+        # Every route is driven and answers without an error
+        self.assertEqual(errors.getvalue(), "")
+        with open(baseline) as f:
+            results = json.load(f)
+        for label, stats in results["routes"].items():
+            self.assertLess(int(stats["status"]), 400, label)
+        self.assertEqual(results["routes"]["media-list?page"]["queries"], 4)
+        self.assertEqual(results["load"]["media-list@2"]["errors"], 0)
+
+        # The query counts do not change from run to run
+        MediaItem.objects.all().delete()
+        Event_Category.objects.all().delete()
+        User.objects.all().delete()
+        MediaItemRollup.objects.all().delete()
+        output = StringIO()
+        call_command("benchmark_api", baseline=baseline, tolerance=1000, stdout=output, **options)
+        self.assertIn("No regressions against the baseline", output.getvalue())
+
+    def test_current_database_and_cold_runs(self):
+        # Only on a confirmed disposable database
+        with self.assertRaisesMessage(CommandError, "--yes-destroy"):
+            call_command("benchmark_api", current_database=True, stdout=StringIO())
+        self.assertFalse(MediaItem.objects.exists())
+
+        # Cold runs only miss the response cache, the rest of the cache stays
+        cache.set("unrelated", 1)
+        with override_settings(RESPONSE_CACHE_ENABLED=True):
+            generation = response_cache.get_generation(cache)
+            call_command(
+                "benchmark_api", "--route=category-list", "--cold", items=10, repeat=2,
+                concurrency=[], current_database=True, yes_destroy=True, stdout=StringIO(),
+            )
+            self.assertGreater(response_cache.get_generation(cache), generation)
+        self.assertEqual(cache.get("unrelated"), 1)
+
+    def test_regressions(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        baseline = os.path.join(directory.name, "baseline.json")
+        with open(baseline, "w") as f:
+            json.dump({
+                "vendor": connection.vendor,
+                "items": 10,
+                "routes": {"category-list": {"p50": 1000.0, "queries": 0}},
+                "load": {},
+            }, f)
+
+        with self.assertRaisesMessage(CommandError, "category-list"):
+            call_command(
+                "benchmark_api", "--route=category-list", items=10, repeat=2,
+                concurrency=[], current_database=True, yes_destroy=True, baseline=baseline,
+                stdout=StringIO(),
+            )
@@ -0,0 +1,153 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from PIL import Image
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from .derivatives import PREVIEW_SIZE, THUMBNAIL_SIZE, derivative_name, render_webp
+from .models import File, ResourceVersion
+from .tasks import task
+
+
+logger = logging.getLogger(__name__)
+
+# Fits 720p, the rendition is meant for playback in the browser
+MAX_HEIGHT = 720
+VIDEO_CRF = 23
+AUDIO_BITRATE = "128k"
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def get_binary(name):
+    return shutil.which(getattr(settings, f"{name.upper()}_BINARY", name))
+
+
+def has_ffmpeg():
+    return get_binary("ffmpeg") is not None and get_binary("ffprobe") is not None
+
+
+def is_video(file_instance):
+    return file_instance.file_type == "vid" and bool(file_instance.file.name)
+
+
+def run(*args):
+    timeout = getattr(settings, "TRANSCODE_TIMEOUT", 3600)
+    try:
+        result = subprocess.run(args, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"{os.path.basename(args[0])} timed out after {timeout}s")
+    if result.returncode != 0:
+        stderr = result.stderr.decode(errors="replace").strip().splitlines()
+        raise TranscodeError(stderr[-1] if stderr else f"exit status {result.returncode}")
+    return result.stdout.decode()
+
+
+def probe_duration(path):
+    output = run(
+        get_binary("ffprobe"), "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        path,
+    )
+    try:
+        return float(output.strip())
+    except ValueError:
+        raise TranscodeError(f"Unknown duration {output.strip()!r}")
+
+
+def render_rendition(source, output):
+    # H.264 and AAC in an MP4 with the index up front, which every browser
+    # plays and can start before the download finishes
+    run(
+        get_binary("ffmpeg"), "-y", "-v", "error", "-i", source,
+        "-vf", f"scale=-2:'min({MAX_HEIGHT},ih)'",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(VIDEO_CRF),
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", AUDIO_BITRATE,
+        "-movflags", "+faststart",
+        output,
+    )
+
+
+def render_poster(source, output, duration):
+    # A frame a little into the video, the first one is often black
+    position = min(duration / 2, 1.0) if duration else 0
+    run(
+        get_binary("ffmpeg"), "-y", "-v", "error", "-ss", f"{position:.3f}", "-i", source,
+        "-frames:v", "1", output,
+    )
+
+
+# Below previews, one long video must not hold up the thumbnails of every
+# photo uploaded after it
+@task(priority=0, concurrency=lambda: getattr(settings, "TRANSCODE_WORKERS", 1))
+def transcode(file_id):
+    file_instance = File.objects.get(id=file_id)
+    if not is_video(file_instance):
+        return False
+    if not has_ffmpeg():
+        # Stays pending for the transcode_videos command
+        logger.warning(
+            "Cannot transcode %s: ffmpeg and ffprobe are not installed", file_instance.file.name
+        )
+        return False
+
+    File.objects.filter(id=file_id).update(transcode_status=File.TRANSCODE_PROCESSING)
+    name = file_instance.file.name
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            source = file_instance.file.path
+            rendition = os.path.join(directory, "rendition.mp4")
+            poster = os.path.join(directory, "poster.png")
+
+            duration = probe_duration(source)
+            render_rendition(source, rendition)
+            render_poster(source, poster, duration)
+
+            with open(rendition, "rb") as f:
+                file_instance.rendition.save(
+                    f"{os.path.splitext(name)[0]}_web.mp4", DjangoFile(f), save=False
+                )
+            with Image.open(poster) as image:
+                image.load()
+            file_instance.poster.save(
+                derivative_name(name, "poster"), render_webp(image, PREVIEW_SIZE), save=False
+            )
+            # Videos list with their poster like photos with their thumbnail
+            file_instance.thumbnail.save(
+                derivative_name(name, "thumb"), render_webp(image, THUMBNAIL_SIZE), save=False
+            )
+            file_instance.preview = file_instance.poster.name
+    except (TranscodeError, OSError) as e:
+        # ffmpeg would fail the same way again, not worth a retry
+        logger.warning("Cannot transcode %s: %s", name, e)
+        File.objects.filter(id=file_id).update(transcode_status=File.TRANSCODE_FAILED)
+        ResourceVersion.bump(ResourceVersion.MEDIA_ITEMS)
+        return False
+    except Exception:
+        # Anything else is retried by the task queue
+        File.objects.filter(id=file_id).update(transcode_status=File.TRANSCODE_FAILED)
+        raise
+
+    file_instance.duration = duration
+    file_instance.transcode_status = File.TRANSCODE_DONE
+    file_instance.save(update_fields=[
+        "rendition", "poster", "thumbnail", "preview", "duration", "transcode_status",
+    ])
+    return True
+
+
+def schedule_transcode(file_instance):
+    # Transcode videos on the task workers, which check for ffmpeg: it needn't
+    # be installed where the uploads are received
+    if not is_video(file_instance):
+        return
+
+    File.objects.filter(id=file_instance.id).update(transcode_status=File.TRANSCODE_PENDING)
+    file_instance.transcode_status = File.TRANSCODE_PENDING
+    transcode.enqueue(file_instance.id)
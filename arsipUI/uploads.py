@@ -0,0 +1,102 @@
+import hashlib
+import os
+from django.core.files import File as DjangoFile
+from .derivatives import schedule_derivatives
+from .transcoding import schedule_transcode
+from .models import File, UploadSession
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    pass
+
+
+class PartialUpload(DjangoFile):
+    # Lets the storage move the assembled file into place instead of copying
+    # it, and reuse its verified checksum
+    def __init__(self, file, name=None, checksum=None):
+        super().__init__(file, name)
+        self.checksum = checksum
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def start_upload(session):
+    os.makedirs(os.path.dirname(session.partial_path), exist_ok=True)
+    open(session.partial_path, "wb").close()
+
+
+def append_chunk(session, offset, chunk, checksum=None):
+    # Stream a chunk to the end of the partial file, hashing it on the way.
+    # Returns the new offset, the file is left untouched when the chunk is
+    # rejected
+    if session.status != UploadSession.UPLOADING:
+        raise UploadError("Upload is already complete.")
+    if offset != session.offset:
+        raise OffsetMismatch(f"Expected offset {session.offset}.")
+    if session.offset + chunk.size > session.size:
+        raise UploadError("Chunk exceeds the declared file size.")
+
+    digest = hashlib.sha256()
+    with open(session.partial_path, "r+b") as partial:
+        partial.seek(session.offset)
+        for data in chunk.chunks():
+            digest.update(data)
+            partial.write(data)
+
+        if checksum and digest.hexdigest() != checksum.lower():
+            partial.truncate(session.offset)
+            raise UploadError("Chunk checksum mismatch.")
+        partial.truncate()
+
+    return session.offset + chunk.size
+
+
+def file_checksum(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(session, media_item):
+    # Verify the assembled file and attach it to the media item as a File
+    if session.status != UploadSession.UPLOADING:
+        raise UploadError("Upload is already complete.")
+    if session.offset != session.size:
+        raise UploadError(f"Only {session.offset} of {session.size} bytes were uploaded.")
+    # The one pass over the whole file, the storage files it by this checksum
+    # instead of hashing it again
+    checksum = file_checksum(session.partial_path)
+    if checksum != session.checksum.lower():
+        raise UploadError("File checksum mismatch.")
+
+    # media_file_path files it by the media item's event date
+    file_instance = File.objects.create()
+    media_item.file_paths.add(file_instance)
+    with open(session.partial_path, "rb") as partial:
+        file_instance.file.save(
+            session.filename, PartialUpload(partial, checksum=checksum), save=True
+        )
+    # Left behind when the storage already had the same content
+    if os.path.exists(session.partial_path):
+        os.remove(session.partial_path)
+    schedule_derivatives(file_instance)
+    schedule_transcode(file_instance)
+
+    session.status = UploadSession.COMPLETE
+    session.file = file_instance
+    session.save()
+
+    return file_instance
+
+
+def discard_upload(session):
+    if os.path.exists(session.partial_path):
+        os.remove(session.partial_path)
+    session.delete()
@@ -1,7 +1,9 @@
 from django.urls import path
+from . import async_views
 from .views import MediaItemList, MediaItemDetail, MediaItemCreate, \
-    MediaItemApproveView, MediaItemRejectView, MediaItemCancelView, \
-    EventListView, CategoryListView, AuthenticatedMediaItemList, FakultasListView
+    MediaItemApproveView, MediaItemRejectView, MediaItemCancelView, MediaItemModerationView, MediaItemExportView, StatisticsView, \
+    EventListView, CategoryListView, AuthenticatedMediaItemList, FakultasListView, \
+    UploadSessionCreateView, UploadSessionDetailView, UploadSessionAppendView, UploadSessionCompleteView
 
 urlpatterns = [
     path("", MediaItemList.as_view(), name="media-list"),
@@ -14,4 +16,16 @@ urlpatterns = [
     path('<int:pk>/approve', MediaItemApproveView.as_view(), name='mediaitem-approve'),
     path('<int:pk>/reject', MediaItemRejectView.as_view(), name='mediaitem-reject'),
     path('<int:pk>/cancel', MediaItemCancelView.as_view(), name='mediaitem-cancel-approval'),
+    path('moderate', MediaItemModerationView.as_view(), name='mediaitem-moderate'),
+    path("export", MediaItemExportView.as_view(), name="media-export"),
+    path("statistics", StatisticsView.as_view(), name="media-statistics"),
+    # The public reads again as async views, for ASGI deployments
+    path("async/", async_views.media_list, name="async-media-list"),
+    path("async/<int:pk>", async_views.media_detail, name="async-media-detail"),
+    path("async/events", async_views.event_list, name="async-events-list"),
+    path("async/categories", async_views.category_list, name="async-category-list"),
+    path("uploads", UploadSessionCreateView.as_view(), name="upload-create"),
+    path("uploads/<uuid:pk>", UploadSessionDetailView.as_view(), name="upload-detail"),
+    path("uploads/<uuid:pk>/append", UploadSessionAppendView.as_view(), name="upload-append"),
+    path("uploads/<uuid:pk>/complete", UploadSessionCompleteView.as_view(), name="upload-complete"),
 ]
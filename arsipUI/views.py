@@ -1,38 +1,136 @@
-from django.http import JsonResponse
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views import View
-from rest_framework import generics, viewsets, filters
-from .models import MediaItem, Event, Event_Category
-from .serializers import MediaItemSerializer, MediaItemReadSerializer, EventSerializer, EventCategorySerializer
+from rest_framework import generics, viewsets
+from .models import MediaItem, Event, Event_Category, UploadSession, ResourceVersion
+from .serializers import MediaItemSerializer, MediaItemReadSerializer, EventSerializer, EventCategorySerializer, \
+    FileSerializer, UploadSessionSerializer, UploadChunkSerializer, UploadCompleteSerializer, \
+    MediaItemModerationSerializer, MediaItemCompactSerializer, MediaItemRowSerializer
 from .permissions import IsOwnerOrReadOnly, IsObjectVerificator
+from .pagination import MediaItemCursorPagination
+from .search import MediaItemSearchFilter
+from .renderers import FastJSONRenderer
+from .export import CONTENT_TYPES, RENDERERS, iter_records
+from .counters import count_read
+from .statistics import build_statistics
+from .conditional import conditional, get_validators, not_modified, add_validators
+from . import response_cache
+from .uploads import UploadError, OffsetMismatch, start_upload, append_chunk, complete_upload, discard_upload
+from users.authentication import get_user_type
 from users.permissions import IsContributor, IsVerificator
-from rest_framework import permissions
+from rest_framework import permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
 
 
-class MediaItemList(generics.ListAPIView):
+# Resources nested in a serialized MediaItem
+MEDIA_ITEM_RESOURCES = (
+    ResourceVersion.MEDIA_ITEMS,
+    ResourceVersion.EVENTS,
+    ResourceVersion.CATEGORIES,
+    ResourceVersion.TAGS,
+)
+
+
+class SparseFieldsMixin:
+    # ?fields=title,thumbnail picks the fields of the item and ?expand=event
+    # nests relations otherwise given as ids, using the compact serializer.
+    # Without either, items keep their full representation
+    def get_sparse_fields(self):
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = self.parse_sparse_fields()
+        return self._sparse_fields
+
+    def parse_sparse_fields(self):
+        params = self.request.query_params
+        if "fields" not in params and "expand" not in params:
+            return None
+
+        def split(value):
+            return [name.strip() for name in value.split(",") if name.strip()]
+
+        fields = split(params.get("fields", "")) or MediaItemCompactSerializer.DEFAULT_FIELDS
+        expand = split(params.get("expand", ""))
+
+        unknown = set(fields) - set(MediaItemCompactSerializer.Meta.fields)
+        unknown |= set(expand) - set(MediaItemCompactSerializer.EXPANDABLE_FIELDS)
+        if unknown:
+            raise ValidationError({"detail": f"Unknown fields: {', '.join(sorted(unknown))}"})
+
+        # Expanding a field implies selecting it
+        fields = list(dict.fromkeys(fields + expand))
+        return fields, expand
+
+    def get_read_queryset(self):
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is None:
+            return MediaItem.objects.for_read()
+        return MediaItem.objects.for_fields(*sparse_fields)
+
+    def get_read_serializer(self, *args, **kwargs):
+        kwargs.setdefault("context", self.get_serializer_context())
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is None:
+            return MediaItemReadSerializer(*args, **kwargs)
+
+        fields, expand = sparse_fields
+        return MediaItemCompactSerializer(*args, fields=fields, expand=expand, **kwargs)
+
+
+class MediaItemList(SparseFieldsMixin, generics.ListAPIView):
     serializer_class = MediaItemReadSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = [
-        "title",
-        "description",
-        "tags__name",
-        "tag_names",
-        "event_date",
-        "event__name",
-    ]
+    pagination_class = MediaItemCursorPagination
+    filter_backends = [MediaItemSearchFilter]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    # Builds the full representation from values() rows, None serializes
+    # model instances with MediaItemReadSerializer instead
+    row_serializer_class = MediaItemRowSerializer
+
+    @conditional(*MEDIA_ITEM_RESOURCES)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # The anonymous feed is the same for every visitor, serve it from the
+        # response cache until the next write to the archive
+        if request.user.is_authenticated:
+            return self.build_list(request, *args, **kwargs)
+
+        data = response_cache.lookup(request)
+        if data is not None:
+            return Response(data)
+
+        response = self.build_list(request, *args, **kwargs)
+        response_cache.store(request, response.data)
+        return response
+
+    def build_list(self, request, *args, **kwargs):
+        if self.row_serializer_class is None or self.get_sparse_fields() is not None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.row_serializer_class.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = self.row_serializer_class(rows, context=self.get_serializer_context()).data
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
 
     # def create(self, request, *args, **kwargs):
     def get_queryset(self):
-        # Get the limit parameter from the query parameters
-        limit = self.request.query_params.get("limit", None)
         # Get the sort parameter from the query parameters
         sort_by_reader = self.request.query_params.get("sort_by_reader", False)
         # Get the status parameter from the query parameters
         status = self.request.query_params.get("status", None)
 
         # Get all MediaItems and order them by upload_date in descending order
-        queryset = MediaItem.objects.all().order_by("-upload_date")
+        queryset = self.get_read_queryset().order_by("-upload_date")
         
         # classify the response by 'status'
         
@@ -43,7 +141,17 @@ class MediaItemList(generics.ListAPIView):
         if sort_by_reader:
             queryset = queryset.order_by("-reader_count")
 
-        if limit:
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        # Get the limit parameter from the query parameters, the slice is taken
+        # last since a sliced queryset can no longer be searched
+        limit = self.request.query_params.get("limit", None)
+
+        # A paginated feed is sliced by its cursor instead
+        if limit and not self.paginator.is_active(self.request):
             try:
                 limit = int(limit)
                 queryset = queryset[:limit]
@@ -53,9 +161,12 @@ class MediaItemList(generics.ListAPIView):
 
         return queryset
 
+    def get_serializer(self, *args, **kwargs):
+        return self.get_read_serializer(*args, **kwargs)
+
     def perform_create(self, serializer):
         # Attach the current user as the contributor
-        serializer.save(contributor=self.request.user, status="waitlist")
+        serializer.save(contributor_id=self.request.user.id, status="waitlist")
 
 
 class MediaItemCreate(generics.CreateAPIView):
@@ -65,33 +176,51 @@ class MediaItemCreate(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         # Attach the current user as the contributor
-        serializer.save(contributor=self.request.user)
+        serializer.save(contributor_id=self.request.user.id)
 
 
-class MediaItemDetail(generics.RetrieveUpdateDestroyAPIView):
+class MediaItemDetail(SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsOwnerOrReadOnly]
     serializer_class = MediaItemSerializer
     queryset = MediaItem.objects.all()
 
+    def get_queryset(self):
+        # Reads are serialized with MediaItemReadSerializer, load its relations
+        if self.request.method == "GET":
+            return self.get_read_queryset()
+        return super().get_queryset()
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = get_validators(request, MEDIA_ITEM_RESOURCES)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            # The client still read the item, from its own copy. Validators
+            # are shared by every item, "If-None-Match: *" matches any id
+            if MediaItem.objects.filter(id=kwargs["pk"]).exists():
+                count_read(request, kwargs["pk"])
+        else:
+            response = super().get(request, *args, **kwargs)
+        return add_validators(response, etag, last_modified)
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        # Increment the reader count
-        instance.reader_count += 1
-        instance.save()
+        # Increment the reader count, buffered and written in bulk later
+        if count_read(request, instance.id):
+            instance.reader_count += 1
 
-        serializer = MediaItemReadSerializer(instance, context={'request': request})
+        serializer = self.get_read_serializer(instance)
         return Response(serializer.data)
 
 class MediaItemApproveView(generics.RetrieveAPIView):
-    queryset = MediaItem.objects.all()
+    queryset = MediaItem.objects.for_read()
     serializer_class = MediaItemReadSerializer
     permission_classes = [permissions.IsAuthenticated, IsVerificator]
     
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.status = "approved"
-        instance.verificator = request.user
+        instance.verificator_id = request.user.id
         instance.save()
         
         serializer = self.get_serializer(instance)
@@ -106,7 +235,7 @@ class MediaItemRejectView(generics.UpdateAPIView):
     def patch(self, request, pk):
         instance = self.get_object()
         instance.status = "rejected"
-        instance.verificator = request.user
+        instance.verificator_id = request.user.id
         
         instance.save()
         
@@ -118,7 +247,7 @@ class MediaItemRejectView(generics.UpdateAPIView):
         return Response(serializer.data)
 
 class MediaItemCancelView(generics.RetrieveAPIView):
-    queryset = MediaItem.objects.all()
+    queryset = MediaItem.objects.for_read()
     serializer_class = MediaItemReadSerializer
     permission_classes = [permissions.IsAuthenticated, IsVerificator, IsObjectVerificator]
 
@@ -132,14 +261,71 @@ class MediaItemCancelView(generics.RetrieveAPIView):
         
         return Response(serializer.data)
 
+class MediaItemModerationView(generics.GenericAPIView):
+    # Approve, reject or cancel many items at once, answering per item
+    serializer_class = MediaItemModerationSerializer
+    permission_classes = [permissions.IsAuthenticated, IsVerificator]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = MediaItem.objects.moderate(user=request.user, **serializer.validated_data)
+
+        return Response({
+            "action": serializer.validated_data["action"],
+            "updated": sum(result == "updated" for result in results.values()),
+            "results": [
+                {"id": media_item_id, "result": result}
+                for media_item_id, result in results.items()
+            ],
+        })
+
+class MediaItemExportView(generics.GenericAPIView):
+    # Streams the approved catalogue as ?output=ndjson (default) or csv, not
+    # ?format which DRF reserves to pick a renderer
+    def get(self, request):
+        output = request.query_params.get("output", "ndjson")
+        if output not in RENDERERS:
+            return Response(
+                {"detail": f"Unknown output, expected one of: {', '.join(RENDERERS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        records = iter_records(
+            MediaItem.objects.filter(status=MediaItem.APPROVED), context={'request': request}
+        )
+        response = StreamingHttpResponse(
+            RENDERERS[output](records), content_type=CONTENT_TYPES[output]
+        )
+        response["Content-Disposition"] = f'attachment; filename="arsip.{output}"'
+        return response
+
+class StatisticsView(generics.GenericAPIView):
+    # Dashboard counts per status, fakultas, event category and month, read
+    # from the rollups instead of aggregating every item
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    @conditional(*MEDIA_ITEM_RESOURCES)
+    def get(self, request):
+        return Response(build_statistics())
+
 class EventListView(generics.ListAPIView):
-    queryset = Event.objects.all()
+    queryset = Event.objects.select_related("category")
     serializer_class = EventSerializer
 
+    @conditional(ResourceVersion.EVENTS, ResourceVersion.CATEGORIES)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 class CategoryListView(generics.ListAPIView):
     queryset = Event_Category.objects.all()
     serializer_class = EventCategorySerializer
 
+    @conditional(ResourceVersion.CATEGORIES)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 class FakultasListView(generics.ListAPIView):
     def get(self, request, *args, **kwargs):
         fakultas_choices = MediaItem.FAKULTAS_CHOICES
@@ -151,41 +337,176 @@ class FakultasListView(generics.ListAPIView):
 
 class AuthenticatedMediaItemList(generics.ListAPIView):
     serializer_class = MediaItemReadSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = [
-        "title",
-        "description",
-        "tags__name",
-        "tag_names",
-        "event_date",
-        "event__name",
-    ]
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [MediaItemSearchFilter]
+    page_size_query_param = "page_size"
+    page_size = 20
+    max_page_size = 100
 
     def get_queryset(self):
         queryset = MediaItem.objects.all().order_by("-upload_date")
         
         return queryset
+
+    def get_page_size(self):
+        try:
+            page_size = int(self.request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
         
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if request.user.userprofile.user_type == 'contributor':
-            queryset = queryset.filter(contributor = request.user)
-        
-        waitlist = queryset.filter(status="waitlist")
-        if request.user.userprofile.user_type == 'verificator':
-            queryset = queryset.filter(verificator = request.user)
+        queryset = self.filter_queryset(self.get_queryset())
 
-        approved = queryset.filter(status="approved")
-        rejected = queryset.filter(status="rejected")
-        
-        waitlist_serializer = MediaItemReadSerializer(waitlist, many=True, context={'request': request})
-        approved_serializer = MediaItemReadSerializer(approved, many=True, context={'request': request})
-        rejected_serializer = MediaItemReadSerializer(rejected, many=True, context={'request': request})
+        # Contributors see their own items, verificators see the whole waitlist
+        # and the items they approved or rejected, users without a profile
+        # see nothing
+        user_type = get_user_type(request.user)
+        if user_type == 'contributor':
+            queryset = queryset.filter(contributor_id=request.user.id)
+        elif user_type == 'verificator':
+            queryset = queryset.filter(
+                Q(status=MediaItem.WAITLIST) | Q(verificator_id=request.user.id)
+            )
+        else:
+            queryset = queryset.none()
+
+        # The size of every status in one aggregate query
+        statuses = [status for status, label in MediaItem.STATUS_CHOICES]
+        counts = dict.fromkeys(statuses, 0)
+        rows = queryset.order_by().values("status").annotate(n=Count("id"))
+        counts.update((row["status"], row["n"]) for row in rows)
+
+        # Every item of every status, unless the client pages them: each status
+        # on its own with ?<status>_page= and ?page_size=, cut from its rows
+        # numbered in the database
+        items = queryset.for_read()
+        paged = self.page_size_query_param in request.query_params or any(
+            f"{status}_page" in request.query_params for status in statuses
+        )
+        if paged:
+            page_size = self.get_page_size()
+            pages = {
+                status: Paginator(range(counts[status]), page_size).get_page(
+                    request.query_params.get(f"{status}_page")
+                )
+                for status in statuses
+            }
+            items = items.annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by="status",
+                    order_by=[*queryset.query.order_by, "-id"],
+                )
+            ).filter(
+                Q(*[
+                    Q(
+                        status=status,
+                        position__gte=page.start_index(),
+                        position__lte=page.end_index(),
+                    )
+                    for status, page in pages.items()
+                ], _connector=Q.OR)
+            )
+
+        buckets = {status: [] for status in statuses}
+        for media_item in items:
+            buckets[media_item.status].append(media_item)
 
         data = {
-            'waitlist': waitlist_serializer.data,
-            'approved': approved_serializer.data,
-            'rejected': rejected_serializer.data
+            status: MediaItemReadSerializer(
+                media_items, many=True, context={'request': request}
+            ).data
+            for status, media_items in buckets.items()
         }
-        
+        data['counts'] = counts
+        if paged:
+            data['pages'] = {
+                status: {'page': page.number, 'num_pages': page.paginator.num_pages}
+                for status, page in pages.items()
+            }
+
         return Response(data)
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated, IsContributor]
+
+    def perform_create(self, serializer):
+        session = serializer.save(user_id=self.request.user.id)
+        start_upload(session)
+
+
+class UploadSessionMixin:
+    permission_classes = [permissions.IsAuthenticated, IsContributor]
+
+    def get_queryset(self):
+        # Uploads are only visible to the user who started them
+        return UploadSession.objects.filter(user_id=self.request.user.id)
+
+
+class UploadSessionDetailView(UploadSessionMixin, generics.RetrieveDestroyAPIView):
+    # Clients resume an interrupted upload from the returned offset
+    serializer_class = UploadSessionSerializer
+
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+
+
+class UploadSessionAppendView(UploadSessionMixin, generics.GenericAPIView):
+    serializer_class = UploadChunkSerializer
+
+    def post(self, request, pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            # Lock the session so concurrent chunks are applied one at a time
+            self.queryset = self.get_queryset().select_for_update()
+            session = self.get_object()
+            try:
+                session.offset = append_chunk(session, **serializer.validated_data)
+            except OffsetMismatch as e:
+                return Response(
+                    {"detail": str(e), "offset": session.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            except UploadError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            session.save()
+
+        return Response(UploadSessionSerializer(session, context={'request': request}).data)
+
+
+class UploadSessionCompleteView(UploadSessionMixin, generics.GenericAPIView):
+    serializer_class = UploadCompleteSerializer
+
+    def post(self, request, pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        media_item = serializer.validated_data["media_item"]
+
+        if media_item.contributor_id != request.user.id:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+        if not media_item.event_id:
+            return Response(
+                {"detail": "Media item has no event to file the upload under."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            self.queryset = self.get_queryset().select_for_update()
+            session = self.get_object()
+            try:
+                file_instance = complete_upload(session, media_item)
+            except UploadError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            FileSerializer(file_instance, context={'request': request}).data,
+            status=status.HTTP_201_CREATED,
+        )
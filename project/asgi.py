@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_asgi_application()
+
+# Flush the buffered reader counts of this server's workers on a timer
+from arsipUI.counters import reader_counter
+
+reader_counter.start()
@@ -141,15 +141,82 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploads are stored once per distinct content, see arsipUI/storage.py
+STORAGES = {
+    "default": {
+        "BACKEND": "arsipUI.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Uploads are served by arsipUI/media.py. Behind nginx or Apache set
+# MEDIA_SENDFILE to "x-accel-redirect" or "x-sendfile" so the proxy sends the
+# files; for nginx, MEDIA_SENDFILE_PREFIX is an internal location aliased to
+# MEDIA_ROOT. Files other than blobs are cached for MEDIA_CACHE_MAX_AGE seconds
+MEDIA_SENDFILE = env('MEDIA_SENDFILE', default='')
+MEDIA_SENDFILE_PREFIX = env('MEDIA_SENDFILE_PREFIX', default='/protected-media/')
+MEDIA_CACHE_MAX_AGE = env.int('MEDIA_CACHE_MAX_AGE', default=3600)
+
+# Chunked uploads are assembled here before being moved into MEDIA_ROOT
+UPLOAD_PARTIAL_ROOT = MEDIA_ROOT / "partial"
+
+UPLOAD_CHUNK_MAX_SIZE = env.int('UPLOAD_CHUNK_MAX_SIZE', default=16 * 1024 * 1024)
+
+# Background work runs on the run_tasks command, see arsipUI/tasks.py. Each
+# worker process runs TASK_WORKER_THREADS tasks at once. Workers report on
+# their running tasks every TASK_HEARTBEAT_INTERVAL seconds, tasks without a
+# report for TASK_HEARTBEAT_TIMEOUT seconds are assumed lost with their worker
+# and queued again. Finished ones are kept TASK_RETENTION seconds for task_stats
+TASK_WORKER_THREADS = env.int('TASK_WORKER_THREADS', default=2)
+TASK_HEARTBEAT_INTERVAL = env.int('TASK_HEARTBEAT_INTERVAL', default=30)
+TASK_HEARTBEAT_TIMEOUT = env.int('TASK_HEARTBEAT_TIMEOUT', default=5 * 60)
+TASK_RETENTION = env.int('TASK_RETENTION', default=7 * 24 * 60 * 60)
+
+# Thumbnails and previews of uploaded files generated at once over all workers
+DERIVATIVE_WORKERS = env.int('DERIVATIVE_WORKERS', default=2)
+
+# Videos transcoded at once over all workers with ffmpeg, see
+# arsipUI/transcoding.py. Videos are left untouched when ffmpeg is missing
+TRANSCODE_WORKERS = env.int('TRANSCODE_WORKERS', default=1)
+TRANSCODE_TIMEOUT = env.int('TRANSCODE_TIMEOUT', default=3600)
+FFMPEG_BINARY = env('FFMPEG_BINARY', default='ffmpeg')
+FFPROBE_BINARY = env('FFPROBE_BINARY', default='ffprobe')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Reader counts are buffered per worker and written every
+# READER_COUNT_FLUSH_INTERVAL seconds or READER_COUNT_FLUSH_SIZE items.
+# Repeated reads by the same reader within READER_COUNT_DEDUP_WINDOW seconds
+# are only counted once (0 counts every read).
+READER_COUNT_FLUSH_INTERVAL = env.int('READER_COUNT_FLUSH_INTERVAL', default=10)
+READER_COUNT_FLUSH_SIZE = env.int('READER_COUNT_FLUSH_SIZE', default=500)
+READER_COUNT_DEDUP_WINDOW = env.int('READER_COUNT_DEDUP_WINDOW', default=0)
+
+# Cache backend from CACHE_URL, e.g. "rediscache://127.0.0.1:6379/1" so every
+# worker shares it. Local memory is only shared within one process
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Anonymous media list responses are cached for RESPONSE_CACHE_TIMEOUT seconds,
+# or until the archive changes. Only with a shared CACHE_URL, the processes
+# must see each other's invalidations, unless RESPONSE_CACHE_ENABLED is set
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=300)
+RESPONSE_CACHE_ENABLED = env.bool('RESPONSE_CACHE_ENABLED', default=None)
+
+# How long get_user_type() caches the type of users whose token lacks the claim
+USER_TYPE_CACHE_TIMEOUT = env.int('USER_TYPE_CACHE_TIMEOUT', default=300)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication without the user lookups, see users/authentication.py
+        'users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Optional: If you also want to support session-based authentication
     ],
 }
\ No newline at end of file
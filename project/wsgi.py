@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
 application = get_wsgi_application()
+
+# Flush the buffered reader counts of this server's workers on a timer
+from arsipUI.counters import reader_counter
+
+reader_counter.start()
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from .models import UserProfile, user_type_cache_key
+
+
+USER_TYPE_CLAIM = "user_type"
+
+
+def get_user_type(user):
+    # The user type of an authenticated user, from its token claims when it
+    # has them, else from its profile, cached for USER_TYPE_CACHE_TIMEOUT
+    if not user or not user.is_authenticated:
+        return None
+
+    user_type = getattr(user, "claimed_user_type", None)
+    if user_type:
+        return user_type
+    # Session authenticated users may have their profile loaded already
+    if isinstance(user, User) and User.userprofile.is_cached(user):
+        return user.userprofile.user_type
+
+    key = user_type_cache_key(user.id)
+    user_type = cache.get(key)
+    if user_type is None:
+        user_type = (
+            UserProfile.objects.filter(user_id=user.id)
+            .values_list("user_type", flat=True)
+            .first()
+        ) or ""
+        cache.set(key, user_type, getattr(settings, "USER_TYPE_CACHE_TIMEOUT", 300))
+    return user_type or None
+
+
+class ClaimsUser(TokenUser):
+    # The user of a request, built from its access token alone. Views assign
+    # it to foreign keys by id, e.g. contributor_id=request.user.id
+
+    @cached_property
+    def claimed_user_type(self):
+        return self.token.get(USER_TYPE_CLAIM)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    # Authenticates JWTs without loading the user, the claims carry what
+    # authorization needs. Tokens issued before the user_type claim existed
+    # get it through get_user_type()'s cache instead. As with any stateless
+    # token, a deactivated user keeps access until the access token expires,
+    # refreshing it reloads the user, see CustomTokenRefreshSerializer
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        return ClaimsUser(validated_token)
@@ -1,7 +1,12 @@
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth.models import User
 
 
+def user_type_cache_key(user_id):
+    return f"user-type:{user_id}"
+
+
 class UserProfile(models.Model):
     CONTRIBUTOR = "contributor"
     VERIFICATOR = "verificator"
@@ -15,3 +20,13 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return self.user.username
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Drop the type get_user_type() may have cached
+        cache.delete(user_type_cache_key(self.user_id))
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        cache.delete(user_type_cache_key(self.user_id))
+        return result
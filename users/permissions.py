@@ -1,11 +1,13 @@
 from rest_framework import permissions
+from .authentication import get_user_type
+from .models import UserProfile
 
 
 class IsContributor(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.userprofile.user_type == "contributor"
+        return get_user_type(request.user) == UserProfile.CONTRIBUTOR
 
 
 class IsVerificator(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.userprofile.user_type == "verificator"
+        return get_user_type(request.user) == UserProfile.VERIFICATOR
@@ -1,6 +1,9 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .authentication import USER_TYPE_CLAIM
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,6 +17,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
         # Add custom claims to the token payload
         token['username'] = user.username
+        # Lets ClaimsJWTAuthentication authorize requests without a query,
+        # refreshed access tokens keep it
+        token[USER_TYPE_CLAIM] = user.userprofile.user_type
         # Add any other user information you want to include
 
         return token
@@ -33,3 +39,29 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     
             return data
 
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    # The stock serializer copies the claims of the refresh token as they were
+    # at login. Reload the user, so deactivated and deleted users can't
+    # refresh and a changed user type reaches the new access token
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = (
+            User.objects.select_related("userprofile")
+            .filter(**{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)})
+            .first()
+        )
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                TokenObtainPairSerializer.default_error_messages["no_active_account"],
+                "no_active_account",
+            )
+
+        refresh["username"] = user.username
+        if hasattr(user, "userprofile"):
+            refresh[USER_TYPE_CLAIM] = user.userprofile.user_type
+        else:
+            # get_user_type() looks it up, there is none
+            refresh.payload.pop(USER_TYPE_CLAIM, None)
+
+        return super().validate({**attrs, "refresh": str(refresh)})
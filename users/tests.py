@@ -1,5 +1,12 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from arsipUI.models import MediaItem
 from .models import UserProfile
 
 
@@ -14,3 +21,110 @@ def create_verificator(username, password):
     contributor = UserProfile.objects.create(user=user, user_type="verificator")
 
     return user
+
+
+class ClaimsJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.contributor = create_contributor("contributor", "password123")
+        self.verificator = create_verificator("verificator", "password123")
+        self.client = APIClient()
+        cache.clear()
+
+    def login(self, username):
+        response = self.client.post(
+            reverse("token_obtain_pair"), {"username": username, "password": "password123"}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data["access"]
+
+    def user_queries(self, url, token, **kwargs):
+        # Queries that loaded a user or a profile
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}", **kwargs)
+        queries = [
+            query["sql"] for query in context.captured_queries
+            if 'FROM "auth_user"' in query["sql"] or 'FROM "users_userprofile"' in query["sql"]
+        ]
+        return response, queries
+
+    def test_user_type_claim(self):
+        token = self.login("verificator")
+        self.assertEqual(AccessToken(token)["user_type"], "verificator")
+
+        response, queries = self.user_queries(reverse("user-media-list"), token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_permissions_from_claims(self):
+        media_item = MediaItem.objects.create(title="Item", description="")
+        url = reverse("mediaitem-approve", args=[media_item.id])
+
+        response, queries = self.user_queries(url, self.login("contributor"))
+        self.assertEqual(response.status_code, 403)
+
+        response, queries = self.user_queries(url, self.login("verificator"))
+        self.assertEqual(response.status_code, 200)
+        media_item.refresh_from_db()
+        self.assertEqual(media_item.verificator, self.verificator)
+
+    def test_tokens_without_the_claim(self):
+        # Issued before the claim existed
+        token = str(RefreshToken.for_user(self.contributor).access_token)
+
+        response, queries = self.user_queries(reverse("user-media-list"), token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        response, queries = self.user_queries(reverse("user-media-list"), token)
+        self.assertEqual(queries, [])
+
+        # A changed profile is picked up
+        profile = self.contributor.userprofile
+        profile.user_type = UserProfile.VERIFICATOR
+        profile.save()
+        response, queries = self.user_queries(reverse("upload-create"), token)
+        self.assertEqual(len(queries), 1)
+
+    def refresh(self, username):
+        response = self.client.post(
+            reverse("token_obtain_pair"), {"username": username, "password": "password123"}
+        )
+        return response.data["refresh"]
+
+    def test_refresh_reloads_the_user(self):
+        refresh = self.refresh("verificator")
+        profile = self.verificator.userprofile
+        profile.user_type = UserProfile.CONTRIBUTOR
+        profile.save()
+
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh})
+        self.assertEqual(response.status_code, 200)
+        access = AccessToken(response.data["access"])
+        self.assertEqual(access["user_type"], UserProfile.CONTRIBUTOR)
+        response, queries = self.user_queries(reverse("mediaitem-moderate"), response.data["access"])
+        self.assertEqual(response.status_code, 403)
+
+    def test_refresh_rejects_inactive_and_deleted_users(self):
+        refresh = self.refresh("contributor")
+        self.contributor.is_active = False
+        self.contributor.save()
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+        refresh = self.refresh("verificator")
+        self.verificator.delete()
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalid_token(self):
+        response = self.client.get(
+            reverse("user-media-list"), HTTP_AUTHORIZATION="Bearer invalid"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_profile(self):
+        self.client.force_login(self.contributor)
+        response = self.client.get(reverse("profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"user": "contributor", "user_profile": "contributor"}
+        )
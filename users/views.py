@@ -1,18 +1,23 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import CustomTokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .authentication import get_user_type
+from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
 
 
 @login_required
 def my_view(request):
     # Access the user and user profile information
     user = request.user
-    user_profile = user.user_type
+    user_profile = get_user_type(user)
 
-    return JsonResponse({"user": user, "user_profile": user_profile})
+    return JsonResponse({"user": user.username, "user_profile": user_profile})
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
-    serializer_class = CustomTokenObtainPairSerializer
\ No newline at end of file
+    serializer_class = CustomTokenObtainPairSerializer
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer